@@ -0,0 +1,995 @@
+"""Benchmark harness for the game engine.
+
+Every benchmark is a scenario registered in SCENARIOS. A scenario takes the size of the synthetic world
+or workload it runs on and returns named metrics where lower is better, such as seconds per command or
+bytes per game. Results can be saved as JSON and compared against an earlier run, which flags every
+metric that got worse by more than a threshold.
+
+Usage:
+    python benchmarks.py list
+    python benchmarks.py run [SCENARIO ...] [--size N] [--repeat N] [--output FILE]
+    python benchmarks.py compare BASELINE_FILE CURRENT_FILE [--threshold FRACTION]"""
+
+import argparse
+import asyncio
+import datetime
+import difflib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from typing import *
+from items_npc import Item
+from item_index import ItemIndex
+from project2game import Game
+import project2game
+import command_parser
+import load_client
+import metrics
+import replay
+import scheduler
+import server
+import sharded_server
+import solver
+import telemetry
+import world
+import world_loader
+import world_pages
+import worldgen
+
+COMMAND_CYCLE = ["look", "items", "go north", "go east", "talk elf", "meet elf", "go south", "go west",
+                 "take pepsi", "give pepsi", "rob", "teleport"]
+DIRECTIONS = ["north", "south", "east", "west"]
+# Lines players type, in full, shortened, with direction shortcuts, several per line and not commands at all.
+PARSE_VOCABULARY = ["look", "l", "items", "i", "go north", "n", "e", "sw", "take pepsi", "ta pepsi", "tel",
+                    "give small rock", "travel dark cave", "trav dark cave", "talk elf", "meet elf; look", "dance",
+                    "take pepsi; go west; look", "  Go   NORTH  ", ""]
+DEFAULT_THRESHOLD = 0.10
+
+# Registered scenarios, keyed by name, as (function, default size, description) tuples.
+SCENARIOS = {}
+
+
+def scenario(name: str, default_size: int, description: str) -> Callable:
+    """Returns a decorator that registers a benchmark function as a scenario.
+
+    Params:
+        name (str): The name of the scenario on the command line.
+        default_size (int): The size the scenario runs with when no size is given.
+        description (str): A one line description for the list command."""
+    def register(function: Callable[[int], Dict[str, float]]) -> Callable[[int], Dict[str, float]]:
+        SCENARIOS[name] = (function, default_size, description)
+        return function
+    return register
+
+
+def timed(function: Callable[[], Any], repeat: int = 1) -> float:
+    """Returns the average time in seconds of one call to function, over repeat calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def synthetic_world(num_locations: int, seed: int = 0, hub_exits: int = 0, hub_npcs: int = 0) -> dict:
+    """Returns a world file with num_locations locations laid out on a grid, with a few items in each.
+
+    Params:
+        num_locations (int): The number of locations in the world.
+        seed (int): The seed that decides the items in each location.
+        hub_exits (int): The number of extra exits from the first location to other locations.
+        hub_npcs (int): The number of NPCs in the first location."""
+    rng = random.Random(seed)
+    width = max(1, int(num_locations ** 0.5))
+    locations = []
+    for index in range(num_locations):
+        exits = {}
+        for direction, neighbor in zip(DIRECTIONS, (index - width, index + width, index + 1, index - 1)):
+            same_row = direction in ("north", "south") or neighbor // width == index // width
+            if 0 <= neighbor < num_locations and same_row:
+                exits[direction] = f"room{neighbor}"
+        items = [{"name": f"item {rng.randint(0, 999)}", "description": "Something lying on the ground.",
+                  "calories": rng.randint(0, 100), "weight": rng.randint(1, 10)} for _ in range(rng.randint(0, 4))]
+        location = {"id": f"room{index}", "name": f"Room {index}", "description": "A room in a big world.",
+                    "exits": exits, "items": items, "npcs": []}
+        if index % 50 == 0:
+            location["npcs"].append(synthetic_npc(f"npc{index}"))
+        locations.append(location)
+    for hub_exit in range(hub_exits):
+        locations[0]["exits"][f"path {hub_exit}"] = f"room{rng.randrange(num_locations)}"
+    for hub_npc in range(hub_npcs):
+        locations[0]["npcs"].append(synthetic_npc(f"hub npc{hub_npc}"))
+    return {"calories_needed": 500, "elf_location": "room0", "locations": locations}
+
+
+def synthetic_npc(key: str) -> dict:
+    """Returns an NPC for a world file that has a prize food and can be robbed."""
+    return {"key": key, "name": key.capitalize(), "description": "Someone.", "messages": ["Hello", "Goodbye"],
+            "high_value": True, "prize_food": {"name": "prize", "description": "A prize.", "calories": 100,
+                                               "weight": 5}}
+
+
+def write_world(directory: str, source: dict) -> str:
+    """Writes a world file into directory and returns its path."""
+    path = os.path.join(directory, "world.json")
+    with open(path, "w") as file:
+        json.dump(source, file)
+    return path
+
+
+def forget_worlds() -> None:
+    """Makes world_loader and world forget every world they loaded, like a fresh process."""
+    world_loader.clear_cache()
+    world.clear_cache()
+
+
+@scenario("execute", 20000, "seconds per command through Game.execute, headless and rendered")
+def bench_execute(num_commands: int) -> Dict[str, float]:
+    """Runs num_commands commands through a single game, with and without rendering the text of each result
+    the same way the console prints it."""
+    results = {}
+    for name, render in (("headless", False), ("rendered", True)):
+        game = Game(0)
+        sink = io.StringIO()
+        commands = [COMMAND_CYCLE[i % len(COMMAND_CYCLE)] for i in range(num_commands)]
+        start = time.perf_counter()
+        for command in commands:
+            result = game.execute(command)
+            if render:
+                print(result.get_text(), file=sink)
+        results[name] = (time.perf_counter() - start) / num_commands
+    return results
+
+
+@scenario("dispatch", 100000, "seconds per command spent parsing and dispatching, and building the command table")
+def bench_dispatch(num_commands: int) -> Dict[str, float]:
+    """Times the cheapest commands, so what is measured is mostly Game.execute parsing the line and
+    looking up the handler built by setup_commands."""
+    game = Game(0)
+    invalid = timed(lambda: game.execute("dance"), num_commands)
+    items = timed(lambda: game.execute("items"), num_commands)
+    return {"invalid_command": invalid, "items_command": items,
+            "setup_commands": timed(game.setup_commands, num_commands // 10)}
+
+
+@scenario("parse", 200000, "seconds per line parsed from a corpus of N lines typed over and over and of N different "
+                           "lines, and to compile the grammar")
+def bench_parse(num_lines: int) -> Dict[str, float]:
+    """Parses a corpus of num_lines lines drawn from a small vocabulary, the way players and bots repeat the same
+    commands, and a corpus where every line is different, so no line is parsed from the grammar's memory of the
+    lines it parsed last. split_lookup splits every line and looks its first word up in the command table, the
+    way lines were parsed before there was a grammar, and only understands whole command words."""
+    game = Game(0)
+    commands = game.setup_commands()
+    rng = random.Random(0)
+    repeated = [rng.choice(PARSE_VOCABULARY) for _ in range(num_lines)]
+    different = [f"{line} {index}" for index, line in enumerate(repeated)]
+
+    def split_lookup():
+        for line in repeated:
+            tokens = line.lower().split()
+            command = tokens.pop(0) if tokens else ""
+            " ".join(tokens)
+            command in commands
+
+    def parse(lines: List[str]) -> Callable[[], None]:
+        def run():
+            grammar = command_parser.CommandGrammar(commands)
+            for line in lines:
+                grammar.parse(line)
+        return run
+
+    return {"repeated": timed(parse(repeated)) / num_lines, "different": timed(parse(different)) / num_lines,
+            "split_lookup": timed(split_lookup) / num_lines,
+            "compile": timed(lambda: command_parser.CommandGrammar(commands), 100)}
+
+
+@scenario("metrics", 100000, "seconds per command with metrics disabled and enabled")
+def bench_metrics(num_commands: int) -> Dict[str, float]:
+    """Times a cheap command with metrics disabled and enabled.
+
+    disabled: A game without metrics, which only pays for checking that its metrics are None.
+    enabled: A game that records every command into a Metrics object that isn't exported.
+    check: The check a game without metrics does, on its own, for comparison with disabled."""
+    disabled = Game(0)
+    enabled = Game(0, metrics=metrics.Metrics())
+    results = {"disabled": timed(lambda: disabled.execute("items"), num_commands),
+               "enabled": timed(lambda: enabled.execute("items"), num_commands)}
+    # An object with the game's metrics as an attribute, so checking it costs what the game's own check does.
+    held = types.SimpleNamespace(metrics=disabled.get_metrics())
+    start = time.perf_counter()
+    for _ in range(num_commands):
+        if held.metrics is not None:
+            pass
+        if held.metrics is not None:
+            pass
+    results["check"] = (time.perf_counter() - start) / num_commands
+    return results
+
+
+@scenario("telemetry", 20000, "seconds per command without and with a telemetry sink, also while its database is "
+                               "locked, and seconds per record written")
+def bench_telemetry(num_commands: int, stalled_queue: int = 1024) -> Dict[str, float]:
+    """Runs num_commands commands through a game without a sink, with a sink and with a sink whose database
+    another connection holds locked the whole time, the way a disk that stopped answering would. A command
+    must cost the same in the last two, since the sink never waits for its writer thread.
+
+    The locked sink only has room for stalled_queue records, so dropped_fraction and sampled_fraction are
+    the shares of the commands it dropped and sampled away. write_seconds is how long the writer took per
+    record to save the queue of the unlocked sink when it was closed."""
+    commands = [COMMAND_CYCLE[i % len(COMMAND_CYCLE)] for i in range(num_commands)]
+
+    def run(game: Game) -> float:
+        start = time.perf_counter()
+        for command in commands:
+            game.execute(command)
+        return (time.perf_counter() - start) / num_commands
+
+    results = {"disabled": run(Game(0))}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "telemetry.db")
+        sink = telemetry.TelemetrySink(path)
+        results["enabled"] = run(Game(0, telemetry=sink))
+        sink.close()
+        # The writer only wakes up for a full batch, so with a batch larger than the run it writes when closed.
+        idle = telemetry.TelemetrySink(path, batch_size=num_commands + 1, flush_interval=60.0)
+        run(Game(0, telemetry=idle))
+        idle.batch_size = telemetry.BATCH_SIZE
+        queued = len(idle.queue)
+        start = time.perf_counter()
+        idle.close()
+        results["write_seconds"] = (time.perf_counter() - start) / queued
+        lock = telemetry.connect(path)
+        lock.execute("BEGIN EXCLUSIVE")
+        stalled = telemetry.TelemetrySink(path, max_queue=stalled_queue, batch_size=stalled_queue // 4)
+        results["locked"] = run(Game(0, telemetry=stalled))
+        lock.execute("COMMIT")
+        lock.close()
+        stalled.close()
+        results["dropped_fraction"] = stalled.dropped / stalled.emitted
+        results["sampled_fraction"] = stalled.sampled / stalled.emitted
+    return results
+
+
+@scenario("init", 10000, "seconds per Game() for a world of N locations: cold, from cache and warm")
+def bench_init(num_locations: int) -> Dict[str, float]:
+    """Times creating a Game when the world was never loaded, when only its compiled cache file exists and
+    when the process already built its template."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(num_locations))
+        forget_worlds()
+        results["cold"] = timed(lambda: Game(0, path))
+        forget_worlds()
+        results["cached"] = timed(lambda: Game(0, path))
+        results["warm"] = timed(lambda: Game(0, path), 100)
+        forget_worlds()
+    return results
+
+
+@scenario("world", 10000, "seconds to build every object of a world of N locations from source, cache and memory")
+def bench_world_load(num_locations: int) -> Dict[str, float]:
+    """Times loading a synthetic world and building its Location, Item and NPC objects.
+
+    source: Parse, validate and build the objects, the way every Game used to build its world.
+    cache: Read the compiled world from the cache file and build the objects, like a fresh process does.
+    memory: Build the objects from the compiled world this process already loaded."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(num_locations))
+
+        def from_source():
+            with open(path) as file:
+                world_loader.build_world(world_loader.compile_world(json.load(file)))
+
+        def from_cache():
+            world_loader.clear_cache()
+            world_loader.build_world(world_loader.load_world(path))
+
+        results = {"source": timed(from_source)}
+        world_loader.load_world(path)
+        results["cache"] = timed(from_cache)
+        results["memory"] = timed(lambda: world_loader.build_world(world_loader.load_world(path)))
+        forget_worlds()
+    return results
+
+
+@scenario("take_give", 10000, "seconds per take and per give in a room holding N items")
+def bench_take_give(num_items: int) -> Dict[str, float]:
+    """Drops num_items items into the player's room, then times taking and giving back items from
+    anywhere in the room."""
+    game = Game(0)
+    # Quiet Town, where giving an item drops it instead of feeding the elf
+    location = game.get_locations()[0]
+    game.set_current_location(location)
+    names = [f"junk {index}" for index in range(num_items)]
+    for name in names:
+        location.add_item(Item(name, "Some junk.", 0, 1))
+    rng = random.Random(0)
+    picks = [rng.choice(names) for _ in range(1000)]
+    take = give = 0.0
+    for name in picks:
+        take += timed(lambda: game.take(name))
+        give += timed(lambda: game.give(name))
+    game.discard_output()
+    return {"take": take / len(picks), "give": give / len(picks)}
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """Returns name with one character of its longest word dropped, the way a player mistypes it."""
+    words = name.split()
+    longest = max(range(len(words)), key=lambda index: len(words[index]))
+    word = words[longest]
+    position = rng.randrange(len(word))
+    words[longest] = word[:position] + word[position + 1:]
+    return " ".join(words)
+
+
+@scenario("fuzzy", 5000, "seconds to find an item among N by its exact name and by a misspelled one, to index the "
+                         "names, to scan them with difflib instead, and to find an NPC among N by a misspelled key")
+def bench_fuzzy(num_items: int, queries: int = 1000) -> Dict[str, float]:
+    """Fills an ItemIndex with num_items items with different generated names, then finds random items by their
+    exact and by a misspelled name. The first misspelled name builds the trigram index of the names, which is
+    timed on its own. difflib_scan is what comparing the name with every name in the room would cost. Then finds
+    NPCs by a misspelled key in a hub room with num_items NPCs."""
+    rng = random.Random(0)
+    names = [f"{rng.choice(worldgen.ADJECTIVES).lower()} {rng.choice(worldgen.ITEMS)[0]} {index}"
+             for index in range(num_items)]
+    picks = [rng.choice(names) for _ in range(queries)]
+    typos = [misspell(name, rng) for name in picks]
+    results = {"index_build": timed(lambda: ItemIndex(Item(name, "Some junk.", 0, 1) for name in names).match("x"))}
+    items = ItemIndex(Item(name, "Some junk.", 0, 1) for name in names)
+    items.match(typos[0])
+    results["exact"] = timed(lambda: [items.match(name) for name in picks]) / queries
+    results["misspelled"] = timed(lambda: [items.match(name) for name in typos]) / queries
+    scan = typos[:max(1, queries * 1000 // num_items // 10)]
+    results["difflib_scan"] = timed(lambda: [difflib.get_close_matches(name, names, 1) for name in scan]) / len(scan)
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(100, hub_npcs=num_items))
+        game = Game(0, path)
+        npcs = game.get_world().npcs
+        keys = [misspell(f"hub npc{rng.randrange(num_items)}", rng) for _ in range(queries)]
+        npcs.match(keys[0], 0)
+        results["npc_misspelled"] = timed(lambda: [npcs.match(key, 0) for key in keys]) / queries
+        forget_worlds()
+    return results
+
+
+@scenario("look", 500, "seconds per look in a room with N exits and N NPCs")
+def bench_look(size: int) -> Dict[str, float]:
+    """Times rendering look in a hub room that has size extra exits and size NPCs, with and without the
+    neighboring rooms visited."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(max(size, 4), hub_exits=size, hub_npcs=size))
+        game = Game(0, path)
+        game.set_current_location(game.get_locations()[0])
+        results = {"unvisited": timed(lambda: game.execute("look"), 200)}
+        for location in game.get_current_location().get_locations().values():
+            location.set_visited()
+        results["visited"] = timed(lambda: game.execute("look"), 200)
+        forget_worlds()
+    return results
+
+
+class CountingStream(io.RawIOBase):
+    """A binary stream that throws away what is written to it and counts the writes, the way the terminal under
+    sys.stdout would see them.
+
+    Attributes:
+        writes (int): The number of writes.
+        bytes (int): The number of bytes written.
+    """
+    def __init__(self):
+        """Initializes class CountingStream with nothing written."""
+        super().__init__()
+        self.writes = 0
+        self.bytes = 0
+
+    def writable(self) -> bool:
+        """Returns True, the stream can be written to."""
+        return True
+
+    def write(self, data: bytes) -> int:
+        """Counts a write and returns the number of bytes written."""
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+
+class CountingTransport:
+    """The part of a transport GameServer uses, which does nothing."""
+    def set_write_buffer_limits(self, high: int) -> None:
+        """Does nothing, there is no buffer."""
+
+
+class CountingWriter:
+    """A stream writer that throws away what is written to it and counts the writes, each of which would be a
+    send on the socket of a real connection.
+
+    Attributes:
+        transport (CountingTransport): The transport of the writer.
+        writes (int): The number of writes.
+        bytes (int): The number of bytes written.
+    """
+    def __init__(self):
+        """Initializes class CountingWriter with nothing written."""
+        self.transport = CountingTransport()
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, data: bytes) -> None:
+        """Counts a write."""
+        self.writes += 1
+        self.bytes += len(data)
+
+    async def drain(self) -> None:
+        """Returns at once, there is no buffer to wait for."""
+
+    def close(self) -> None:
+        """Does nothing, there is no connection."""
+
+    async def wait_closed(self) -> None:
+        """Returns at once, there is no connection."""
+
+
+async def serve_commands(commands: List[str]) -> CountingWriter:
+    """Plays commands through one GameServer session and returns the writer that counted its output."""
+    reader = asyncio.StreamReader()
+    reader.feed_data("".join(f"{command}\n" for command in commands).encode())
+    reader.feed_eof()
+    writer = CountingWriter()
+    await server.GameServer().handle_session(reader, writer)
+    return writer
+
+
+@scenario("render", 500, "seconds per look in a room with N exits and N NPCs when it changed and when it didn't, "
+                         "and writes and bytes per command on the console and the server")
+def bench_render(size: int, num_commands: int = 1200) -> Dict[str, float]:
+    """Times look in a hub room when something in the room changed before every look, so its lines are built
+    again, and when nothing did. Then plays num_commands commands on the console and through a server session
+    and counts the writes and bytes each command costs, including the intro and the prompt after each result."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(max(size, 4), hub_exits=size, hub_npcs=size))
+        game = Game(0, path)
+        game.set_current_location(game.get_locations()[0])
+        state = game.get_world()
+
+        def changed():
+            state.touch(0)
+            game.execute("look")
+
+        results = {"look_changed": timed(changed, 200), "look_unchanged": timed(lambda: game.execute("look"), 200)}
+        forget_worlds()
+    commands = [COMMAND_CYCLE[i % len(COMMAND_CYCLE)] for i in range(num_commands)] + ["quit"]
+    stream = CountingStream()
+    console = io.TextIOWrapper(stream, line_buffering=True)
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin, sys.stdout = io.StringIO("".join(f"{command}\n" for command in commands)), console
+    try:
+        Game(0).play()
+    finally:
+        console.flush()
+        sys.stdin, sys.stdout = stdin, stdout
+    results["console_writes"] = stream.writes / len(commands)
+    results["console_bytes"] = stream.bytes / len(commands)
+    writer = asyncio.run(serve_commands(commands))
+    results["server_writes"] = writer.writes / len(commands)
+    results["server_bytes"] = writer.bytes / len(commands)
+    return results
+
+
+@scenario("npcs", 10000, "seconds per talk, meet and rob in a room with N NPCs, and per NPC moved between rooms")
+def bench_npcs(num_npcs: int, num_commands: int = 10000) -> Dict[str, float]:
+    """Talks to and meets the last NPC of a hub room crowded with num_npcs NPCs, robs the first one, and moves
+    NPCs in and out of the hub."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(100, hub_npcs=num_npcs))
+        game = Game(0, path)
+        game.set_current_location(game.get_locations()[0])
+        last = f"hub npc{num_npcs - 1}"
+        npcs = game.get_world().npcs
+        hub = npcs.at(0)
+
+        def move():
+            npc = hub[len(hub) // 2]
+            npcs.move(npc, 1)
+            npcs.move(npc, 0)
+
+        results = {"talk": timed(lambda: game.execute(f"talk {last}"), num_commands),
+                   "meet": timed(lambda: game.execute(f"meet {last}"), num_commands),
+                   "rob": timed(lambda: game.execute("rob"), num_commands),
+                   "move": timed(move, num_commands) / 2}
+        forget_worlds()
+    return results
+
+
+@scenario("rob_teleport", 20000, "seconds per rob and per teleport in a world of N locations")
+def bench_rob_teleport(num_locations: int) -> Dict[str, float]:
+    """Times robbing an NPC that always has its prize food back and teleporting around a large world."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(num_locations))
+        game = Game(0, path)
+        game.set_current_location(game.get_locations()[0])
+        npc = game.get_current_location().get_npcs()[0]
+
+        def rob():
+            npc.high_val = True
+            game.execute("rob")
+
+        results = {"rob": timed(rob, 10000), "teleport": timed(lambda: game.execute("teleport"), 10000)}
+        forget_worlds()
+    return results
+
+
+class DictItem:
+    """The Item class as it was before it had __slots__, kept to compare against."""
+    def __init__(self, name: str, description: str, num_calories: int, weight: int):
+        """Initializes DictItem with the values from the input parameters."""
+        self.name = name
+        self.description = description
+        self.num_calories = num_calories
+        self.weight = weight
+
+    def get_weight(self) -> int:
+        """Returns the integer representing the weight of this item."""
+        return self.weight
+
+
+@scenario("entities", 200000, "bytes per item and seconds per get_weight() for dict, slots and column storage")
+def bench_entities(num_items: int) -> Dict[str, float]:
+    """Measures the memory per item and the time of one get_weight call.
+
+    dict: Items are objects with a __dict__, like the original Item class.
+    slots: Items are Item objects, which use __slots__.
+    columns: Items are stored in the columns of a WorldTemplate and read through StoredItem views.
+        The memory only counts the columns, since views are only created for items a game touches."""
+    locations = [{"id": f"room{number}", "name": f"Room {number}", "description": "A room.",
+                  "items": [{"name": f"item {index % 5000}", "description": f"Description {index % 100}.",
+                             "calories": index % 1000, "weight": index % 500}
+                            for index in range(number * 100, min(num_items, number * 100 + 100))]}
+                 for number in range(num_items // 100 + 1)]
+    # Compiled by world_loader, so the columns always have the layout WorldTemplate expects.
+    compiled = world_loader.compile_world({"elf_location": "room0", "locations": locations})
+    rows = compiled[4]
+    results = {}
+    for name in ("dict", "slots", "columns"):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        if name == "dict":
+            items = [DictItem(*row[:4]) for row in rows]
+        elif name == "slots":
+            items = [Item(*row[:4]) for row in rows]
+        else:
+            template = world.WorldTemplate(compiled)
+        results[f"{name}_bytes"] = (tracemalloc.get_traced_memory()[0] - before) / num_items
+        tracemalloc.stop()
+        if name == "columns":
+            items = [template.item(index) for index in range(num_items)]
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for item in items:
+                item.get_weight()
+            best = min(best, time.perf_counter() - start)
+        results[f"{name}_access"] = best / num_items
+    return results
+
+
+@scenario("routes", 100000, "seconds to compile routes and answer first and cached queries on N locations")
+def bench_routes(num_locations: int, queries: int = 10000) -> Dict[str, float]:
+    """Times shortest path queries on a synthetic grid world.
+
+    compile: Building the RouteGraph from the template's exits.
+    first_query: The first query for a destination, which runs the search.
+    cached_query: The average of queries for the same destination from random locations.
+    add_exit: Adding an exit, which drops the cached searches it makes out of date."""
+    template = world.WorldTemplate(world_loader.compile_world(synthetic_world(num_locations)))
+    rng = random.Random(0)
+    results = {"compile": timed(template.get_routes)}
+    routes = template.get_routes()
+    results["first_query"] = timed(lambda: routes.path(0, num_locations - 1))
+    sources = [rng.randrange(num_locations) for _ in range(queries)]
+    start = time.perf_counter()
+    for source in sources:
+        routes.path(source, num_locations - 1)
+    results["cached_query"] = (time.perf_counter() - start) / queries
+    results["add_exit"] = timed(lambda: routes.copy().add_exit(0, "portal", num_locations - 1))
+    return results
+
+
+@scenario("memory", 10000, "bytes per game for a world of N locations, own objects against a shared template")
+def bench_session_memory(num_locations: int, sessions: int = 20) -> Dict[str, float]:
+    """Measures the memory that one game needs, averaged over a number of games.
+
+    objects: Every game builds its own Location, Item and NPC objects, the way Game used to.
+    template: Every game is a Game that shares one WorldTemplate and only keeps a WorldState."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(num_locations)) if num_locations else world_loader.DEFAULT_WORLD
+        compiled = world_loader.load_world(path)
+        world.get_template(path)
+        results = {}
+        for name, create in (("objects", lambda: world_loader.build_world(compiled)),
+                             ("template", lambda: Game(0, path))):
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            games = [create() for _ in range(sessions)]
+            results[name] = (tracemalloc.get_traced_memory()[0] - before) / sessions
+            tracemalloc.stop()
+            del games
+        forget_worlds()
+    return results
+
+
+@scenario("snapshot", 100000, "seconds to save and load a game on N locations, and per command with a journal")
+def bench_snapshot(num_locations: int, num_commands: int = 5000) -> Dict[str, float]:
+    """Visits every location of a synthetic world and moves an item out of every tenth one, then times saving
+    a snapshot and loading it into a new game, and the cost of each command with and without a journal."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(num_locations))
+        game = Game(0, path)
+        for index, location in enumerate(game.get_locations()):
+            location.set_visited()
+            items = list(location.get_items())
+            if index % 10 == 0 and items:
+                location.remove_item(items[0])
+                game.get_locations()[(index + 1) % num_locations].add_item(items[0])
+        snapshot_path = os.path.join(directory, "game.snap")
+        results["save_seconds"] = timed(lambda: game.save(snapshot_path), 3)
+        results["snapshot_bytes"] = os.path.getsize(snapshot_path)
+        results["load_seconds"] = timed(lambda: Game(0, path).load(snapshot_path), 3)
+        commands = [COMMAND_CYCLE[i % len(COMMAND_CYCLE)] for i in range(num_commands)]
+        for command in commands:
+            game.execute(command)
+        results["plain_seconds"] = timed(lambda: [game.execute(command) for command in commands]) / num_commands
+        game.start_journal(snapshot_path, 0)
+        results["journal_seconds"] = timed(lambda: [game.execute(command) for command in commands]) / num_commands
+        game.stop_journal()
+        forget_worlds()
+    return results
+
+
+@scenario("replay", 20000, "seconds per command to record and replay N commands, and to seek to a turn")
+def bench_replay(num_commands: int, seeks: int = 20) -> Dict[str, float]:
+    """Records num_commands commands on a synthetic world, then times replaying all of them and seeking to
+    random turns, which only replays the commands after the checkpoint before each turn."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_world(directory, synthetic_world(1000))
+        commands = [COMMAND_CYCLE[i % len(COMMAND_CYCLE)] for i in range(num_commands)]
+        game = Game(0, path)
+        results["plain_seconds"] = timed(lambda: [game.execute(command) for command in commands]) / num_commands
+        recording_path = os.path.join(directory, "game.rec")
+        game.start_recording(recording_path)
+        results["record_seconds"] = timed(lambda: [game.execute(command) for command in commands]) / num_commands
+        game.stop_recording()
+        replayer = replay.Replayer(recording_path)
+        results["replay_seconds"] = timed(lambda: sum(1 for _ in replayer.replay())) / num_commands
+        rng = random.Random(0)
+        turns = [rng.randint(replayer.first_turn, replayer.last_turn) for _ in range(seeks)]
+        results["seek_seconds"] = timed(lambda: [replayer.seek(turn) for turn in turns]) / seeks
+        replayer.close()
+        forget_worlds()
+    return results
+
+
+@scenario("solver", 10000, "seconds to solve world.json, also with teleports one chance node deep, and a "
+                            "generated world of N locations, and per state searched")
+def bench_solver(num_locations: int) -> Dict[str, float]:
+    """Finds the fewest commands that win world.json, whose few locations have many items to choose between, and
+    a generated world with num_locations locations, where most of the work is walking to the elf. dense_chance
+    solves world.json again with teleports, and giving the elf food without calories, evaluated one chance node
+    deep."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "world.json")
+        with open(path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(num_locations))
+        for name, world_path, chance_depth in (("dense", world_loader.DEFAULT_WORLD, 0),
+                                               ("dense_chance", world_loader.DEFAULT_WORLD, 1),
+                                               ("generated", path, 0)):
+            game = Game(0, world_path)
+            start = time.perf_counter()
+            search = solver.Solver(game, chance_depth=chance_depth)
+            search.solve()
+            elapsed = time.perf_counter() - start
+            results[f"{name}_seconds"] = elapsed
+            results[f"{name}_state_seconds"] = elapsed / max(search.expanded, 1)
+        forget_worlds()
+    return results
+
+
+@scenario("worldgen", 100000, "seconds per location and peak bytes to generate a world of N locations")
+def bench_worldgen(num_locations: int) -> Dict[str, float]:
+    """Generates a world of num_locations locations into a file and measures the time per location and the
+    most memory the generator used at once, which should stay the same for any number of locations."""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "world.json"), "w") as file:
+            tracemalloc.start()
+            start = time.perf_counter()
+            worldgen.write_world(file, worldgen.WorldGenerator(num_locations))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return {"seconds": elapsed / num_locations, "peak_bytes": peak}
+
+
+@scenario("paging", 100000, "seconds per command and bytes in memory while wandering a paged world of N locations")
+def bench_paging(num_locations: int, num_commands: int = 5000) -> Dict[str, float]:
+    """Wanders a generated world with go, look and teleport, once loaded whole, once paged with a small
+    memory budget and once paged with NPCs in a fifth of the locations, half of which wander, and measures the
+    time per command, the regions read per command and the memory the world and the game use."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "world.json")
+        with open(json_path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(num_locations))
+        pages_path = os.path.join(directory, f"world{world.PAGED_SUFFIX}")
+        world_pages.compile_pages(json_path, pages_path, 256)
+        wandering_json = os.path.join(directory, "wandering.json")
+        with open(wandering_json, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(num_locations, npc_density=0.2, wander_chance=0.5))
+        wandering_path = os.path.join(directory, f"wandering{world.PAGED_SUFFIX}")
+        world_pages.compile_pages(wandering_json, wandering_path, 256)
+        for name, path in (("whole", json_path), ("paged", pages_path), ("wandering", wandering_path)):
+            rng = random.Random(0)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            game = Game(0, path)
+            template = world.get_template(path, 1 << 20)
+            loads = getattr(template, "loads", 0)
+            start = time.perf_counter()
+            for step in range(num_commands):
+                if step % 50 == 0:
+                    game.execute("teleport")
+                elif step % 5 == 0:
+                    game.execute("look")
+                else:
+                    game.execute(f"go {rng.choice(list(game.get_current_location().get_locations()))}")
+            results[f"{name}_seconds"] = (time.perf_counter() - start) / num_commands
+            results[f"{name}_bytes"] = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            if path.endswith(world.PAGED_SUFFIX):
+                results[f"{name}_loads"] = (template.loads - loads) / num_commands
+            del game
+        forget_worlds()
+    return results
+
+
+@scenario("scheduler", 100000, "seconds per tick of a timer wheel holding N/100, N/10 and N timers, per timer that "
+                              "went off, and per command of a game whose NPCs wander")
+def bench_scheduler(num_timers: int, num_ticks: int = 2000, num_commands: int = 2000) -> Dict[str, float]:
+    """Runs a TimerWheel the way a game runs its wandering NPCs, with each timer scheduled again when it goes off,
+    holding a hundredth, a tenth and all of num_timers timers. Every timer goes off every 1 to 1000 ticks, so the
+    time per tick grows with the timers that go off and the time per timer that went off shouldn't grow at all.
+    Then plays a generated world of num_timers / 10 locations, one NPC in each, with and without wanderers."""
+    results = {}
+    for count in (num_timers // 100, num_timers // 10, num_timers):
+        every = [1 + key * 7919 % 1000 for key in range(count)]
+        wheel = scheduler.TimerWheel(0, ((key, every[key]) for key in range(count)))
+        woken = 0
+        start = time.perf_counter()
+        for _ in range(num_ticks):
+            keys = wheel.advance()
+            woken += len(keys)
+            for key in keys:
+                wheel.schedule(key, wheel.now + every[key])
+        elapsed = time.perf_counter() - start
+        results[f"tick_seconds_{count}"] = elapsed / num_ticks
+        results[f"timer_seconds_{count}"] = elapsed / max(woken, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, wander_chance in (("static", 0.0), ("wandering", 1.0)):
+            path = os.path.join(directory, f"{name}.json")
+            with open(path, "w") as file:
+                worldgen.write_world(file, worldgen.WorldGenerator(max(1, num_timers // 10), npc_density=1.0,
+                                                                   wander_chance=wander_chance))
+            game = Game(0, path)
+            results[f"{name}_command_seconds"] = timed(lambda: game.execute("items"), num_commands)
+        forget_worlds()
+    return results
+
+
+def launch_seconds(arguments: List[str], runs: int = 1) -> float:
+    """Returns the fewest seconds it took to run a new Python interpreter with the given arguments and no input."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], input=b"", stdout=subprocess.DEVNULL, check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@scenario("startup", 100000, "seconds to launch project2game.py with world.json and with a world of N locations, "
+                             "before and after its image exists, and to import the game")
+def bench_startup(num_locations: int, runs: int = 5) -> Dict[str, float]:
+    """Launches the game in batch mode with no commands, the way a bot starts a short lived game, and measures the
+    wall time of the whole process. interpreter is the time of an interpreter that does nothing, which every
+    launch pays. cold is the first launch of a new world, which compiles it and writes its image, and warm is
+    every launch after that. imports is the time importing project2game takes in a new interpreter."""
+    results = {"interpreter": launch_seconds(["-c", "pass"], runs),
+               "imports": min(project2game.import_times()[0] for _ in range(runs))}
+    launch_seconds(["project2game.py", "--batch"])
+    results["default_world"] = launch_seconds(["project2game.py", "--batch"], runs)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "world.json")
+        with open(path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(num_locations))
+        results["cold"] = launch_seconds(["project2game.py", "--batch", "--world", path])
+        results["warm"] = launch_seconds(["project2game.py", "--batch", "--world", path], runs)
+    return results
+
+
+def private_bytes(pid: int) -> Optional[int]:
+    """Returns the bytes of memory only the process with the given pid uses, or None where /proc can't tell."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            fields = dict(line.split(":", 1) for line in file if ":" in line)
+    except OSError:
+        return None
+    return sum(int(fields[name].split()[0]) << 10 for name in ("Private_Clean", "Private_Dirty"))
+
+
+async def serve_load(path: str, num_workers: int, clients: int, num_commands: int) -> Tuple[float, Optional[float]]:
+    """Starts a ShardedServer with num_workers workers on a free port, plays num_commands commands on each of
+    clients connections and returns the seconds per command and the mean private bytes of a worker after it."""
+    server = sharded_server.ShardedServer(path, num_workers, port=0, memory_budget=1 << 20)
+    await server.start()
+    serving = asyncio.create_task(server.serve_forever())
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(load_client.run_client("127.0.0.1", server.port, num_commands, latencies)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    sizes = [private_bytes(process.pid) for process in server.processes.values()]
+    serving.cancel()
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    return elapsed / len(latencies), None if None in sizes else sum(sizes) / len(sizes)
+
+
+@scenario("sharded", 20000, "seconds per command served by 1, 2, 4 and 8 worker processes, and private bytes per "
+                            "worker for worlds of N / 10 and N locations")
+def bench_sharded(num_locations: int, clients: int = 64, num_commands: int = 50) -> Dict[str, float]:
+    """Load tests a sharded server on a generated world of num_locations locations with 1, 2, 4 and 8 workers,
+    from clients connections in this process. Throughput can only grow with the workers while there are idle
+    cores, so the report's meta has the number of cores. Then measures the private memory of one worker for a
+    world a tenth as big, which should be the same, since the world is in shared memory."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for name, size in (("small", max(1, num_locations // 10)), ("large", num_locations)):
+            paths[name] = os.path.join(directory, f"{name}.json")
+            with open(paths[name], "w") as file:
+                worldgen.write_world(file, worldgen.WorldGenerator(size))
+        for num_workers in (1, 2, 4, 8):
+            seconds, worker_bytes = asyncio.run(serve_load(paths["large"], num_workers, clients, num_commands))
+            results[f"seconds_{num_workers}_workers"] = seconds
+            if num_workers == 1 and worker_bytes is not None:
+                results["worker_bytes_large"] = worker_bytes
+        worker_bytes = asyncio.run(serve_load(paths["small"], 1, clients, num_commands))[1]
+        if worker_bytes is not None:
+            results["worker_bytes_small"] = worker_bytes
+    return results
+
+
+def run(names: List[str], size: Optional[int] = None, repeat: int = 1) -> Dict[str, Any]:
+    """Runs scenarios and returns a report with the best value of each metric over repeat runs.
+
+    Params:
+        names (list[str]): The scenarios to run, every scenario if the list is empty.
+        size (int): The size every scenario runs with, each scenario's default size when None.
+        repeat (int): The number of times each scenario runs."""
+    report = {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "repeat": repeat},
+              "results": {}}
+    for name in names or list(SCENARIOS):
+        function, default_size, description = SCENARIOS[name]
+        scenario_size = size or default_size
+        best = {}
+        for _ in range(repeat):
+            for metric, value in function(scenario_size).items():
+                best[metric] = min(value, best.get(metric, value))
+        report["results"][name] = {"size": scenario_size, "metrics": best}
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) \
+        -> List[Tuple[str, str, float, float, bool]]:
+    """Compares two reports metric by metric.
+
+    Only scenarios that ran with the same size in both reports are compared.
+
+    Returns:
+        rows (list[tuple]): The scenario, metric, baseline value, current value and whether the current value
+            is worse than the baseline by more than threshold, for every metric in both reports."""
+    rows = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or old["size"] != result["size"]:
+            continue
+        for metric, value in result["metrics"].items():
+            if metric in old["metrics"]:
+                before = old["metrics"][metric]
+                rows.append((name, metric, before, value, value > before * (1 + threshold)))
+    return rows
+
+
+def format_value(metric: str, value: float) -> str:
+    """Returns a metric value with a readable unit, bytes for memory metrics and time for the others."""
+    if "bytes" in metric or metric in ("objects", "template"):
+        return f"{value:,.1f} B"
+    if "writes" in metric:
+        return f"{value:,.2f} writes"
+    if "loads" in metric:
+        return f"{value:,.2f} loads"
+    if "fraction" in metric:
+        return f"{value:.1%}"
+    if value >= 1:
+        return f"{value:,.3f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:,.3f} ms"
+    return f"{value * 1e6:,.3f} us"
+
+
+def main():
+    """Function that parses the command line and lists, runs or compares benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark the game engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the scenarios")
+    run_parser = commands.add_parser("run", help="run scenarios")
+    run_parser.add_argument("scenarios", nargs="*", help="scenarios to run, all of them by default")
+    run_parser.add_argument("--size", type=int, default=None, help="size of every scenario")
+    run_parser.add_argument("--repeat", type=int, default=1, help="runs per scenario, the best run is kept")
+    run_parser.add_argument("--output", help="save the results as JSON to this file")
+    compare_parser = commands.add_parser("compare", help="compare two saved results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="fraction a metric may get worse before it counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, (function, default_size, description) in SCENARIOS.items():
+            print(f"{name} (size {default_size:,}): {description}")
+        return
+    if args.command == "run":
+        unknown = [name for name in args.scenarios if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario {', '.join(unknown)}, choose from {', '.join(SCENARIOS)}")
+        report = run(args.scenarios, args.size, args.repeat)
+        for name, result in report["results"].items():
+            print(f"{name} (size {result['size']:,})")
+            for metric, value in result["metrics"].items():
+                print(f"    {metric}: {format_value(metric, value)}")
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    regressions = 0
+    for name, metric, before, after, regressed in compare(baseline, current, args.threshold):
+        regressions += regressed
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{'REGRESSION ' if regressed else ''}{name}.{metric}: {format_value(metric, before)} -> "
+              f"{format_value(metric, after)} ({change:+.1f}%)")
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Class CommandGrammar, which turns the lines players type into the commands of a game.
+
+The command words are put in a prefix trie once per process. Every prefix that leads to a single command, like
+"l" for look or "tel" for teleport, is then compiled into one dictionary together with the command words
+themselves and the direction shortcuts, like "n" for "go north". Parsing a command is a single dictionary
+lookup, whatever the length of the word or the number of commands. The trie is kept to tell the player which
+commands a prefix that is too short could mean.
+
+A line can hold several commands separated by semicolons, like "take pepsi; go west", which run one after the
+other as separate turns. Players type the same few lines over and over, so the commands of the lines parsed last
+are kept and a line that was seen before isn't parsed again."""
+
+from typing import *
+
+SEPARATOR = ";"
+# The number of lines a grammar keeps parsed, players send the same few lines over and over.
+MAX_PARSED_LINES = 4096
+# Words that move the player, as the direction they go in.
+DIRECTION_ALIASES = {"n": "north", "s": "south", "e": "east", "w": "west", "u": "up", "d": "down",
+                     "ne": "northeast", "nw": "northwest", "se": "southeast", "sw": "southwest",
+                     "north": "north", "south": "south", "east": "east", "west": "west", "up": "up", "down": "down",
+                     "northeast": "northeast", "northwest": "northwest", "southeast": "southeast",
+                     "southwest": "southwest"}
+# The command direction aliases run.
+MOVE_COMMAND = "go"
+# Grammars that were already compiled by this process, keyed by their command words.
+_grammars = {}
+
+
+class Command:
+    """One command of a line, parsed.
+
+    Attributes:
+        word (str): The command word as it was typed, in lower case. Ex: "tel"
+        name (str): The command the word stands for, None if it doesn't stand for exactly one. Ex: "teleport"
+        target (str): Everything typed after the command word, lower case and with single spaces. For direction
+            aliases this starts with the direction. Ex: "pepsi"
+        text (str): The part of the line this command was parsed from, as it was typed.
+    """
+    __slots__ = ("word", "name", "target", "text")
+
+    def __init__(self, word: str, name: Optional[str], target: str, text: str):
+        """Initializes class Command with the values from the input parameters."""
+        self.word = word
+        self.name = name
+        self.target = target
+        self.text = text
+
+
+class TrieNode:
+    """A node of the command trie, for one prefix.
+
+    Attributes:
+        children (dict[str, TrieNode]): The node for each character that can follow the prefix.
+        command (str): The command whose word is the prefix, None if there is none.
+        commands (list[str]): Every command whose word starts with the prefix, sorted.
+    """
+    __slots__ = ("children", "command", "commands")
+
+    def __init__(self):
+        """Initializes class TrieNode with no commands."""
+        self.children = {}
+        self.command = None
+        self.commands = []
+
+
+class CommandGrammar:
+    """The words a game understands and the commands they stand for.
+
+    Attributes:
+        root (TrieNode): The trie of the command words.
+        words (dict[str, tuple[str, str]]): The command and the start of its target for every word that stands
+            for exactly one command: the command words, their unambiguous prefixes and the direction aliases.
+        parsed (dict[str, tuple[Command, ...]]): The commands of the lines parsed last, emptied when it holds
+            max_parsed lines.
+        max_parsed (int): The number of lines to keep parsed.
+    """
+    def __init__(self, names: Iterable[str], aliases: Dict[str, str] = DIRECTION_ALIASES,
+                 max_parsed: int = MAX_PARSED_LINES):
+        """Initializes class CommandGrammar by building the trie of the command words and compiling it.
+
+        Params:
+            names (Iterable[str]): The command words.
+            aliases (dict[str, str]): Words that stand for moving in a direction, as the direction. They are
+                only used if there is a go command, and only when they are typed in full.
+            max_parsed (int): The number of lines to keep parsed."""
+        self.root = TrieNode()
+        for name in sorted(set(names)):
+            node = self.root
+            node.commands.append(name)
+            for character in name:
+                node = node.children.setdefault(character, TrieNode())
+                node.commands.append(name)
+            node.command = name
+        self.words = {}
+        self._compile(self.root, "")
+        if MOVE_COMMAND in self.root.commands:
+            for alias, direction in aliases.items():
+                node = self.find(alias)
+                if node is None or node.command is None:
+                    self.words[alias] = (MOVE_COMMAND, direction)
+        self.parsed = {}
+        self.max_parsed = max_parsed
+
+    def _compile(self, node: TrieNode, prefix: str) -> None:
+        """Adds prefix and every longer prefix under node that stands for exactly one command to words."""
+        if node.command is not None:
+            self.words[prefix] = (node.command, "")
+        elif len(node.commands) == 1 and prefix:
+            self.words[prefix] = (node.commands[0], "")
+        for character, child in node.children.items():
+            self._compile(child, prefix + character)
+
+    def find(self, prefix: str) -> Optional[TrieNode]:
+        """Returns the trie node of prefix, or None if no command word starts with it."""
+        node = self.root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return None
+        return node
+
+    def candidates(self, word: str) -> List[str]:
+        """Returns the commands whose word starts with word, sorted."""
+        node = self.find(word) if word else None
+        return [] if node is None else list(node.commands)
+
+    def parse(self, line: str) -> Tuple[Command, ...]:
+        """Returns the commands of a line, in the order they were typed. Empty commands between separators are
+        left out, but a line with no command at all is a single empty command. The commands must not be changed,
+        since they are shared by every time the line is parsed.
+
+        Params:
+            line (str): The raw line the player typed. Ex: "take pepsi; go west"
+        """
+        commands = self.parsed.get(line)
+        if commands is not None:
+            return commands
+        if SEPARATOR not in line:
+            commands = (self.parse_command(line),)
+        else:
+            commands = tuple(self.parse_command(text) for text in line.split(SEPARATOR) if text.strip())
+            if not commands:
+                commands = (Command("", None, "", line),)
+        if len(self.parsed) >= self.max_parsed:
+            self.parsed.clear()
+        self.parsed[line] = commands
+        return commands
+
+    def parse_command(self, text: str) -> Command:
+        """Returns a single command parsed from text, which holds no separator."""
+        tokens = text.lower().split()
+        if not tokens:
+            return Command("", None, "", text)
+        word = tokens[0]
+        target = " ".join(tokens[1:]) if len(tokens) > 1 else ""
+        found = self.words.get(word)
+        if found is None:
+            return Command(word, None, target, text)
+        name, start = found
+        if start:
+            target = f"{start} {target}" if target else start
+        return Command(word, name, target, text)
+
+
+def get_grammar(names: Iterable[str]) -> CommandGrammar:
+    """Returns the grammar of the given command words, compiling it only the first time it's needed."""
+    key = tuple(names)
+    grammar = _grammars.get(key)
+    if grammar is None:
+        grammar = _grammars[key] = CommandGrammar(key)
+    return grammar
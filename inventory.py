@@ -0,0 +1,121 @@
+"""Class Inventory, the items the player is carrying.
+
+The inventory keeps running totals of the weight, calories and capability tags of the items it holds,
+so checks like "is the player too heavy to move" or "is the player armed" don't have to look at every
+item."""
+
+from typing import *
+from items_npc import Item
+from item_index import ItemIndex
+
+
+class Inventory:
+    """The items the player is carrying, with totals that are updated as items are added and removed.
+
+    Attributes:
+        items (ItemIndex): The items, in the order they were picked up, indexed by name.
+        weight (int): The total weight of the items.
+        calories (int): The total number of calories of the items.
+        tag_counts (dict[str, int]): The number of items that have each capability tag.
+    """
+    __slots__ = ("_items", "_weight", "_calories", "_tag_counts")
+
+    def __init__(self):
+        """Initializes class Inventory with no items."""
+        self._items = ItemIndex()
+        self._weight = 0
+        self._calories = 0
+        self._tag_counts = {}
+
+    def add(self, item: Item) -> None:
+        """Adds an item to the inventory and to the totals.
+
+        Params:
+            item (Item): An Item object.
+
+        Raises:
+            ValueError: If the item is already in the inventory."""
+        self._items.add(item)
+        self._weight += item.weight
+        self._calories += item.num_calories
+        for tag in item.tags:
+            self._tag_counts[tag] = self._tag_counts.get(tag, 0) + 1
+
+    def remove(self, item: Item) -> None:
+        """Removes an item from the inventory and from the totals.
+
+        Params:
+            item (Item): An Item object.
+
+        Raises:
+            ValueError: If the item isn't in the inventory."""
+        self._items.remove(item)
+        self._weight -= item.weight
+        self._calories -= item.num_calories
+        for tag in item.tags:
+            count = self._tag_counts[tag] - 1
+            if count:
+                self._tag_counts[tag] = count
+            else:
+                del self._tag_counts[tag]
+
+    def find(self, name: str) -> Optional[Item]:
+        """Returns the first item that was picked up with the given name, or None if there is no such item.
+
+        Params:
+            name (str): The name of the item."""
+        return self._items.find(name)
+
+    def match(self, name: str) -> Optional[Item]:
+        """Returns the first item that was picked up with the given name, or with the name that best matches it if
+        there is none, or None if no name matches.
+
+        Params:
+            name (str): What the player typed for the name of the item."""
+        return self._items.match(name)
+
+    def get_weight(self) -> int:
+        """Returns the total weight of the items in the inventory."""
+        return self._weight
+
+    def get_calories(self) -> int:
+        """Returns the total number of calories of the items in the inventory."""
+        return self._calories
+
+    def has_tag(self, tag: str) -> bool:
+        """Returns True if any item in the inventory has the given capability tag. Ex: "armed"
+
+        Params:
+            tag (str): The name of the capability."""
+        return tag in self._tag_counts
+
+    def get_tag_count(self, tag: str) -> int:
+        """Returns the number of items added with the given capability tag and not removed since.
+
+        Params:
+            tag (str): The name of the capability."""
+        return self._tag_counts.get(tag, 0)
+
+    def check_totals(self) -> bool:
+        """Returns True if the running totals match a full recount of the items.
+
+        This looks at every item, so it is meant for tests and debugging, not for the game itself."""
+        tag_counts = {}
+        for item in self._items:
+            for tag in item.tags:
+                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        return (self._weight == sum(item.weight for item in self._items)
+                and self._calories == sum(item.num_calories for item in self._items)
+                and self._tag_counts == tag_counts)
+
+    def __contains__(self, item: object) -> bool:
+        """Returns True if the item is in the inventory."""
+        return item in self._items
+
+    def __iter__(self) -> Iterator[Item]:
+        """Iterates over the items in the order they were picked up."""
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        """Returns the number of items in the inventory."""
+        return len(self._items)
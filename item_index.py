@@ -0,0 +1,182 @@
+"""Class ItemIndex, a collection of items that can be looked up by name.
+
+Locations can hold thousands of items once players start dropping things, so finding, adding and
+removing an item must not scan the whole collection, and neither must finding one by a partial or misspelled
+name."""
+
+from typing import *
+from items_npc import Item
+from trigram_index import TrigramIndex
+
+
+class ItemIndex:
+    """A collection of items that keeps the order items were added in and indexes them by name.
+
+    Several items can have the same name, like the small rocks in the cave and the mountains. Looking up
+    a name returns the item with that name that was added first, which is the same item a scan from the
+    start of a list would find. Finding, adding and removing an item all take constant time.
+
+    Attributes:
+        order (dict[Item, None]): Every item, in the order they were added.
+        by_name (dict[str, dict[Item, None]]): The items with each name, in the order they were added.
+        names (TrigramIndex): The names of the items, built the first time an item isn't found by its exact name.
+    """
+    __slots__ = ("_order", "_by_name", "_names")
+
+    def __init__(self, items: Iterable[Item] = ()):
+        """Initializes class ItemIndex with the items from the input parameter.
+
+        Params:
+            items (Iterable[Item]): The items the collection starts with."""
+        self._order = dict.fromkeys(items)
+        self._by_name = {}
+        self._names = None
+        for item in self._order:
+            bucket = self._by_name.get(item.name)
+            if bucket is None:
+                self._by_name[item.name] = {item: None}
+            else:
+                bucket[item] = None
+
+    def add(self, item: Item) -> None:
+        """Adds an item to the end of the collection.
+
+        Params:
+            item (Item): An Item object.
+
+        Raises:
+            ValueError: If the item is already in the collection."""
+        if item in self._order:
+            raise ValueError("The item is already in this collection")
+        self._order[item] = None
+        bucket = self._by_name.get(item.name)
+        if bucket is None:
+            self._by_name[item.name] = {item: None}
+            if self._names is not None:
+                self._names.add(item.name)
+        else:
+            bucket[item] = None
+
+    def remove(self, item: Item) -> None:
+        """Removes an item from the collection.
+
+        Params:
+            item (Item): An Item object.
+
+        Raises:
+            ValueError: If the item isn't in the collection."""
+        if item not in self._order:
+            raise ValueError("The item is not in this collection")
+        del self._order[item]
+        bucket = self._by_name[item.name]
+        del bucket[item]
+        if not bucket:
+            del self._by_name[item.name]
+            if self._names is not None:
+                self._names.remove(item.name)
+
+    def find(self, name: str) -> Optional[Item]:
+        """Returns the first item that was added with the given name, or None if there is no such item.
+
+        Params:
+            name (str): The name of the item."""
+        bucket = self._by_name.get(name)
+        if bucket is None:
+            return None
+        return next(iter(bucket))
+
+    def match(self, name: str) -> Optional[Item]:
+        """Returns the first item with the given name, or if there is none, the first item with the name that
+        best matches it, like "burger" for "15 day old burger". Returns None if no name matches.
+
+        Params:
+            name (str): What the player typed for the name of the item."""
+        item = self.find(name)
+        if item is not None or not self._by_name:
+            return item
+        if self._names is None:
+            self._names = TrigramIndex(self._by_name)
+        best = self._names.best(name)
+        return None if best is None else self.find(best)
+
+    def find_all(self, name: str) -> List[Item]:
+        """Returns every item with the given name, in the order they were added."""
+        return list(self._by_name.get(name, ()))
+
+    def copy(self) -> 'ItemIndex':
+        """Returns a new ItemIndex with the same items in the same order."""
+        copy = ItemIndex()
+        copy._order = self._order.copy()
+        copy._by_name = {name: bucket.copy() for name, bucket in self._by_name.items()}
+        return copy
+
+    def __contains__(self, item: object) -> bool:
+        """Returns True if the item is in the collection."""
+        return item in self._order
+
+    def __iter__(self) -> Iterator[Item]:
+        """Iterates over the items in the order they were added."""
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        """Returns the number of items in the collection."""
+        return len(self._order)
+
+    def __str__(self) -> str:
+        """
+        Returns:
+            The names of the items, separated by commas.
+        """
+        return ", ".join(item.name for item in self._order)
+
+
+class ItemView:
+    """A read-only view of an ItemIndex, for items that may only be changed through the object that owns them.
+
+    A room of a game keeps text that describes it, and records what changed for the journal, every time its
+    items change, so its items are handed out as a view without add and remove.
+    """
+    __slots__ = ("_items",)
+
+    def __init__(self, items: ItemIndex):
+        """Initializes class ItemView.
+
+        Params:
+            items (ItemIndex): The items the view shows, which it doesn't copy."""
+        self._items = items
+
+    def find(self, name: str) -> Optional[Item]:
+        """Returns the first item that was added with the given name, or None if there is no such item."""
+        return self._items.find(name)
+
+    def match(self, name: str) -> Optional[Item]:
+        """Returns the first item that was added with the given name, or with the name that best matches it if
+        there is none, or None if no name matches."""
+        return self._items.match(name)
+
+    def find_all(self, name: str) -> List[Item]:
+        """Returns every item with the given name, in the order they were added."""
+        return self._items.find_all(name)
+
+    def copy(self) -> ItemIndex:
+        """Returns a new ItemIndex with the same items in the same order, which can be changed."""
+        return self._items.copy()
+
+    def __contains__(self, item: object) -> bool:
+        """Returns True if the item is in the collection."""
+        return item in self._items
+
+    def __iter__(self) -> Iterator[Item]:
+        """Iterates over the items in the order they were added."""
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        """Returns the number of items in the collection."""
+        return len(self._items)
+
+    def __str__(self) -> str:
+        """
+        Returns:
+            The names of the items, separated by commas.
+        """
+        return str(self._items)
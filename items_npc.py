@@ -8,6 +8,9 @@ Date: 02/15/2023"""
 
 from typing import *
 
+# Shared by every item without tags, so those items don't each need their own empty set.
+NO_TAGS = frozenset()
+
 
 class Item:
     """
@@ -18,8 +21,11 @@ class Item:
         description (str): The description of the item, cannot be blank.
         num_calories (int): The number of calories an item has, must be between 0-1000.
         weight (int): How much an item weighs, must be between 0-500.
+        tags (frozenset[str]): The capabilities the item gives the player who carries it. Ex: "armed"
     """
-    def __init__(self, name: str, description: str, num_calories: int, weight: int):
+    __slots__ = ("name", "description", "num_calories", "weight", "tags")
+
+    def __init__(self, name: str, description: str, num_calories: int, weight: int, tags: Iterable[str] = ()):
         """Initializes Item class with the corresponding values from the input parameters.
 
         Params:
@@ -27,6 +33,7 @@ class Item:
             description (str): A string representing the description of this item.
             num_calories (int): an integer representing the number of calories this item has.
             weight (int): An integer representing the weight of this Item.
+            tags (Iterable[str]): The capabilities this Item gives the player who carries it.
 
         Raises:
             ValueError: If any of the following occur:
@@ -46,6 +53,7 @@ class Item:
         if weight not in range(0, 501) or not isinstance(weight, int):
             raise ValueError('Weight must be an integer between 0-500!')
         self.weight = weight
+        self.tags = frozenset(tags) if tags else NO_TAGS
 
     def __str__(self) -> str:
         """
@@ -66,6 +74,10 @@ class Item:
         """Returns an integer representing the number of calories this item has"""
         return self.num_calories
 
+    def get_tags(self) -> frozenset:
+        """Returns the set of capabilities this item gives the player who carries it."""
+        return self.tags
+
 
 class NPC:
     """
@@ -80,6 +92,8 @@ class NPC:
             is what indicates if that NPC can be robbed or not.
         prize_food (Item): An Item object representing the high value food item that an NPC has.
     """
+    __slots__ = ("name", "description", "message", "message_num", "high_val", "prize_food")
+
     def __init__(self, name: str, description: str, message: list, has_high_value_food: bool, prize_food: Item):
         """Initializes NPC class with the corresponding values from the input parameters.
 
@@ -0,0 +1,82 @@
+"""Load testing client for server.py.
+
+Opens many connections to a running server, sends the same list of commands on each of them and
+reports the p50 and p99 latency of a command, measured from sending the line until the next prompt
+arrives.
+
+Usage:
+    python load_client.py [--host HOST] [--port PORT] [--clients N] [--commands N]
+    python load_client.py --local --clients 2000"""
+
+import argparse
+import asyncio
+import time
+from server import GameServer, PROMPT
+
+COMMANDS = ["look", "items", "go north", "talk elf", "go south", "take pepsi", "give pepsi", "teleport"]
+
+
+async def run_client(host: str, port: int, num_commands: int, latencies: list) -> None:
+    """Plays num_commands commands over one connection and appends each command's latency to latencies."""
+    prompt = PROMPT.replace("\n", "\r\n").encode()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await reader.readuntil(prompt)
+        for i in range(num_commands):
+            command = COMMANDS[i % len(COMMANDS)]
+            start = time.perf_counter()
+            writer.write(command.encode() + b"\n")
+            await writer.drain()
+            await reader.readuntil(prompt)
+            latencies.append(time.perf_counter() - start)
+        writer.write(b"quit\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Returns the value at the given fraction of the sorted values list."""
+    index = min(len(values) - 1, int(len(values) * fraction))
+    return values[index]
+
+
+async def load_test(host: str, port: int, clients: int, num_commands: int, local: bool) -> None:
+    """Runs the clients concurrently and prints the latency report.
+
+    Params:
+        local (bool): If True, a server is started in this process on a free port instead of using host and port."""
+    server = None
+    if local:
+        server = GameServer(host, 0)
+        await server.start()
+        port = server.port
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_client(host, port, num_commands, latencies) for _ in range(clients)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        await server.close()
+    failures = sum(1 for result in results if isinstance(result, BaseException))
+    latencies.sort()
+    print(f"clients: {clients}, failed: {failures}, commands: {len(latencies)}, "
+          f"throughput: {len(latencies) / elapsed:,.0f} commands/s")
+    if latencies:
+        print(f"p50: {percentile(latencies, 0.50) * 1000:.2f} ms, p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+
+def main():
+    """Function that parses the command line and runs the load test."""
+    parser = argparse.ArgumentParser(description="Load test the game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--commands", type=int, default=20)
+    parser.add_argument("--local", action="store_true", help="start a server in this process")
+    args = parser.parse_args()
+    asyncio.run(load_test(args.host, args.port, args.clients, args.commands, args.local))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Date: 02/14/2023"""
 from typing import *
 from items_npc import Item
 from items_npc import NPC
+from item_index import ItemIndex
 
 
 class Location:
@@ -22,8 +23,10 @@ class Location:
         directions (dict[str, Location): A dictionary that holds the nearby locations of this Location instance.
             The key is a string and the value is a Location object.
         npc (list[NPC]): Stores a list of NPC objects at this location instance.
-        items (list[Item]): Stores a list of Item objects in this location instance.
+        items (ItemIndex): Stores the Item objects in this location instance, indexed by name.
     """
+    __slots__ = ("name", "description", "visited", "directions", "npc", "items")
+
     def __init__(self, name: str, description: str):
         """Initializes class Location with the correct starting data.
 
@@ -36,7 +39,7 @@ class Location:
         self.visited = False
         self.directions: dict[str, Location] = {}
         self.npc: List[NPC] = []
-        self.items: List[Item] = []
+        self.items = ItemIndex()
 
     def get_locations(self) -> dict[str, 'Location']:
         """
@@ -119,13 +122,12 @@ class Location:
 
     def add_item(self, item: Item) -> None:
         """
-        Adds the item parameter to the items list attribute.
+        Adds the item parameter to the items attribute.
 
         Params:
             item (Item): an Item object.
         """
-        add_item = item
-        self.items.append(add_item)
+        self.items.add(item)
 
     def remove_item(self, item: Item) -> None:
         """
@@ -134,15 +136,38 @@ class Location:
         Parameters:
             item (Item): An Item object.
         """
-        remv_item = item
-        self.items.remove(remv_item)
+        self.items.remove(item)
+
+    def find_item(self, name: str) -> Optional[Item]:
+        """
+        Finds an item at this location by its name.
+
+        Params:
+            name (str): The name of the item.
+
+        Returns:
+            item (Item): The first item with that name that was added to this location, or None if there is none.
+        """
+        return self.items.find(name)
+
+    def match_item(self, name: str) -> Optional[Item]:
+        """
+        Finds an item at this location by its name, or by the name that best matches it if no item has that name.
+
+        Params:
+            name (str): What the player typed for the name of the item.
+
+        Returns:
+            item (Item): The first item with that name or the best matching name, or None if no name matches.
+        """
+        return self.items.match(name)
 
-    def get_items(self) -> list[Item]:
+    def get_items(self) -> ItemIndex:
         """
         The getter for the attribute items.
 
         Returns:
-            items (Item): A list of Item objects at this location.
+            items (ItemIndex): The Item objects at this location, in the order they were added.
         """
         return self.items
 
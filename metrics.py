@@ -0,0 +1,226 @@
+"""Opt-in instrumentation for the game's command dispatch.
+
+A Game that is given a Metrics object records how long each command handler took, how often each
+command was called and failed, and counters of what happened in the game such as moves, robberies
+and teleports. Games that aren't given one skip all of this. The metrics can be written to a file in
+the Prometheus text format or as JSON, every few seconds while commands are being recorded.
+
+Latencies go into a LatencyHistogram, which works like an HDR histogram: buckets are grouped by
+powers of two and each group is split into the same number of linear sub buckets, so every recorded
+value is off by at most 1 / SUB_BUCKETS of itself and recording is a few integer operations."""
+
+import os
+import time
+from typing import *
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+EXPORT_INTERVAL = 10.0
+# The clock is only read every this many records to see if it's time to export.
+CLOCK_CHECK_EVERY = 64
+
+# The session counter each event increases, as (counter, event value index, value) tuples. A counter
+# with no value index is increased by every event of that kind.
+EVENT_COUNTERS = {"moved": (("moves", None, None),),
+                  "traveled": (("travels", None, None),),
+                  "blocked": (("blocked_moves", None, None),),
+                  "took": (("items_taken", None, None),),
+                  "dropped": (("items_dropped", None, None),),
+                  "fed": (("items_fed", None, None),),
+                  "talked": (("talks", None, None),),
+                  "robbed": (("robberies", None, None), ("robberies_successful", 2, True),
+                             ("robberies_armed", 3, True)),
+                  "teleported": (("teleports", None, None), ("elf_teleports", 2, "elf")),
+                  "quit": (("games_quit", None, None),),
+                  "won": (("games_won", None, None),)}
+
+
+class LatencyHistogram:
+    """A log-linear histogram of latencies in nanoseconds.
+
+    Attributes:
+        counts (dict[int, int]): The number of values recorded in each bucket that has any.
+        count (int): The number of values recorded.
+        total (int): The sum of every value recorded.
+        minimum (int): The smallest value recorded.
+        maximum (int): The largest value recorded.
+    """
+    __slots__ = ("counts", "count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        """Initializes class LatencyHistogram with nothing recorded."""
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.minimum = 0
+        self.maximum = 0
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        """Returns the index of the bucket a value in nanoseconds belongs in."""
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return ((shift + 1) << SUB_BUCKET_BITS) | ((value >> shift) & (SUB_BUCKETS - 1))
+
+    @staticmethod
+    def bucket_limit(bucket: int) -> int:
+        """Returns the largest value in nanoseconds that belongs in a bucket."""
+        if bucket < SUB_BUCKETS:
+            return bucket
+        shift = (bucket >> SUB_BUCKET_BITS) - 1
+        return ((SUB_BUCKETS | (bucket & (SUB_BUCKETS - 1))) + 1 << shift) - 1
+
+    def record(self, value: int) -> None:
+        """Adds a latency in nanoseconds to the histogram."""
+        bucket = self.bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        if self.count == 0 or value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, fraction: float) -> int:
+        """Returns the latency in nanoseconds that the given fraction of the recorded values are at or below."""
+        if self.count == 0:
+            return 0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= wanted:
+                return min(self.bucket_limit(bucket), self.maximum)
+        return self.maximum
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Adds every value recorded in other to this histogram."""
+        if other.count == 0:
+            return
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.minimum = other.minimum if self.count == 0 else min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.count += other.count
+        self.total += other.total
+
+
+class Metrics:
+    """Per command and per session metrics, shared by every Game that records into it.
+
+    Attributes:
+        calls (dict[str, int]): The number of times each command was called.
+        errors (dict[str, int]): The number of times each command raised an exception.
+        latencies (dict[str, LatencyHistogram]): The latency of each command's handler.
+        counters (dict[str, int]): Totals of what happened in the games, such as moves and robberies.
+        path (str): The file the metrics are exported to, None to never export.
+        export_format (str): "prometheus" or "json".
+        interval (float): The number of seconds between exports.
+        last_export (float): The time.monotonic() of the last export.
+        records_since_check (int): The number of records since the clock was last read.
+    """
+    def __init__(self, path: Optional[str] = None, export_format: str = "prometheus",
+                 interval: float = EXPORT_INTERVAL):
+        """Initializes class Metrics with nothing recorded.
+
+        Params:
+            path (str): The file the metrics are exported to, None to never export.
+            export_format (str): "prometheus" for the Prometheus text format or "json".
+            interval (float): The number of seconds between exports."""
+        if export_format not in ("prometheus", "json"):
+            raise ValueError("The export format must be prometheus or json")
+        self.calls = {}
+        self.errors = {}
+        self.latencies = {}
+        self.counters = {}
+        self.path = path
+        self.export_format = export_format
+        self.interval = interval
+        self.last_export = time.monotonic()
+        self._records_since_check = 0
+
+    def record(self, command: str, nanoseconds: int, events: List[tuple]) -> None:
+        """Records one call of a command and the events it produced.
+
+        Params:
+            command (str): The command word, or "invalid" for commands that don't exist.
+            nanoseconds (int): How long the command's handler took.
+            events (list[tuple]): The events the command produced."""
+        self.calls[command] = self.calls.get(command, 0) + 1
+        histogram = self.latencies.get(command)
+        if histogram is None:
+            histogram = self.latencies[command] = LatencyHistogram()
+        histogram.record(nanoseconds)
+        for event in events:
+            for counter, index, value in EVENT_COUNTERS.get(event[0], ()):
+                if index is None or event[index] == value:
+                    self.counters[counter] = self.counters.get(counter, 0) + 1
+        if self.path is not None:
+            self._records_since_check += 1
+            if self._records_since_check >= CLOCK_CHECK_EVERY:
+                self._records_since_check = 0
+                if time.monotonic() - self.last_export >= self.interval:
+                    self.export()
+
+    def record_error(self, command: str) -> None:
+        """Records that a command's handler raised an exception."""
+        self.errors[command] = self.errors.get(command, 0) + 1
+
+    def count_session(self) -> None:
+        """Records that a new game was started."""
+        self.counters["sessions"] = self.counters.get("sessions", 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the metrics as a dictionary that can be written as JSON."""
+        commands = {}
+        for command, histogram in self.latencies.items():
+            commands[command] = {"calls": self.calls.get(command, 0), "errors": self.errors.get(command, 0),
+                                 "latency_ns": {"min": histogram.minimum, "max": histogram.maximum,
+                                                "mean": histogram.total / histogram.count,
+                                                "p50": histogram.percentile(0.50),
+                                                "p90": histogram.percentile(0.90),
+                                                "p99": histogram.percentile(0.99)}}
+        for command, errors in self.errors.items():
+            if command not in commands:
+                commands[command] = {"calls": self.calls.get(command, 0), "errors": errors}
+        return {"commands": commands, "counters": dict(self.counters)}
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = ["# TYPE zork_command_calls_total counter"]
+        lines += [f'zork_command_calls_total{{command="{command}"}} {calls}' for command, calls in self.calls.items()]
+        lines.append("# TYPE zork_command_errors_total counter")
+        lines += [f'zork_command_errors_total{{command="{command}"}} {errors}'
+                  for command, errors in self.errors.items()]
+        lines.append("# TYPE zork_command_latency_seconds histogram")
+        for command, histogram in self.latencies.items():
+            seen = 0
+            for bucket in sorted(histogram.counts):
+                seen += histogram.counts[bucket]
+                limit = (LatencyHistogram.bucket_limit(bucket) + 1) / 1e9
+                lines.append(f'zork_command_latency_seconds_bucket{{command="{command}",le="{limit:.9g}"}} {seen}')
+            lines.append(f'zork_command_latency_seconds_bucket{{command="{command}",le="+Inf"}} {histogram.count}')
+            lines.append(f'zork_command_latency_seconds_sum{{command="{command}"}} {histogram.total / 1e9:.9g}')
+            lines.append(f'zork_command_latency_seconds_count{{command="{command}"}} {histogram.count}')
+        for counter, value in self.counters.items():
+            lines.append(f"# TYPE zork_{counter}_total counter")
+            lines.append(f"zork_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> None:
+        """Writes the metrics to the export file, replacing it in one step so readers never see half a file."""
+        self.last_export = time.monotonic()
+        self._records_since_check = 0
+        if self.path is None:
+            return
+        if self.export_format == "json":
+            # Imported here, since most processes only export Prometheus text or nothing at all.
+            import json
+            text = json.dumps(self.to_dict(), indent=2)
+        else:
+            text = self.to_prometheus()
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(text)
+        os.replace(temp_path, self.path)
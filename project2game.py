@@ -5,214 +5,193 @@ Class game holds the data and methods that enable the game to run.
 Author: Alec Mirambeau
 Date: 02/12/2023"""
 
-import datetime
+import argparse
+import os
 import random
+import sys
+import time
 from typing import *
 from items_npc import Item, NPC
 from locations_zork import Location
+from inventory import Inventory
+from metrics import EXPORT_INTERVAL, Metrics
+import command_parser
+import render
+import scheduler
+import world
+import world_loader
+
+
+INTRO_TEXT = ("\nWelcome to the magical world of Ireland! A once lively and joyful area, "
+              "has now become\nvery grim and depressing. Why you may ask? Well unfortunately, the dragon Alduin\n"
+              "has taken over the area. He flies around and eats people who are happy. What makes matters worse\n"
+              "is that our hero elf is too drunk to do anything about the dragon. Please hero, feed the elf\n"
+              "some food to help sober him up. Please save us from this dragon.\n")
+PROMPT = "\nWhat is your command? (Type 'help' for instructions) "
+# The time help tells in script and batch mode, so running a script twice prints the same text.
+SCRIPT_CLOCK = time.gmtime(0)
+
+
+class Result:
+    """Holds what happened when the game ran a single command.
+
+    Attributes:
+        command (str): The command that ran, or the command word that was entered if it isn't one. Ex: "take"
+        target (str): Everything typed after the command word. Ex: "pepsi"
+        valid (bool): A boolean representing if the command was a known command or not.
+        lines (list[str]): The messages the command produced, in the order they were produced.
+        events (list[tuple]): Structured events where the first value is the event name. Ex: ("moved", "Dark Cave")
+            The events are moved, traveled, blocked, took, dropped, fed, talked, robbed, teleported, quit and won,
+            and npc_left, npc_arrived, restocked and announced for what the world clock did where the player is.
+        game_over (bool): A boolean representing if the game ended because of this command.
+    """
+    def __init__(self, command: str, target: str, valid: bool, lines: List[str], events: List[tuple],
+                 game_over: bool):
+        """Initializes class Result with the values from the input parameters."""
+        self.command = command
+        self.target = target
+        self.valid = valid
+        self.lines = lines
+        self.events = events
+        self.game_over = game_over
+
+    def get_text(self) -> str:
+        """Returns all the messages joined together the same way the console prints them."""
+        return "\n".join(self.lines)
+
+    def __str__(self) -> str:
+        """
+        Returns:
+            The text of this result.
+        """
+        return self.get_text()
+
+
+class GameRandom(random.Random):
+    """A Random that counts the numbers it draws, so a journal only saves its state after it changed.
+
+    Attributes:
+        draws (int): The number of numbers drawn so far.
+    """
+    def __init__(self, seed: Optional[int] = None):
+        """Initializes class GameRandom with the given seed and no numbers drawn."""
+        super().__init__(seed)
+        self.draws = 0
+
+    def random(self) -> float:
+        """Returns the next random float and counts it."""
+        self.draws += 1
+        return super().random()
+
+    def getrandbits(self, k: int) -> int:
+        """Returns the next k random bits and counts them."""
+        self.draws += 1
+        return super().getrandbits(k)
 
 
 class Game:
     """Class that will hold the game logic for the game.
 
     Attributes:
-        locations (list): A list holding objects of the locations class.
-        npc_dict (dict): A dictionary where a string representing the NPC name is the key, and
-            the value is the object of that NPC.
-        inventory (list): A list holding various food objects from the items class that the user
-            currently has in their inventory.
-        weight (int): An integer representing the weight of the player.
+        locations (Sequence): A list holding objects of the locations class.
+        npcs (NpcRegistry): A dictionary where a string representing the NPC name is the key, and
+            the value is the object of that NPC. It also knows which location each NPC is in.
+        inventory (Inventory): The food objects from the items class that the user currently has in their
+            inventory, along with their total weight.
         calories_needed (int): An integer representing the number of calories needed before the game ends
         run_game (bool): A boolean representing if the game is still currently being played or not.
         commands (dict): A dictionary where the key is a string representing the command a user may enter.
             The value is the method that corresponds to that method.
         current_location (Location): A location object that represents where the player is currently within
             the game.
+        output (list): The lines of text produced by the command that is currently running.
+        events (list): The structured events produced by the command that is currently running.
+        rng (GameRandom): The random number generator used for teleporting and robbing.
+        world_path (str): The path of the JSON file the world is loaded from.
+        elf_location (Location): The location where the elf is waiting for food.
+        world (WorldState): The changes this game made to the shared world.
+        turns (int): The number of commands this game ran.
+        journal (Journal): Where the changes of each command are saved, None if they aren't.
+        recording (Recording): Where every command is recorded so it can be replayed, None if they aren't.
+        metrics (Metrics): Where command latencies and game counters are recorded, None if they aren't.
+        telemetry (TelemetrySink): Where every command and its events are saved for analytics, None if they aren't.
+        session (int): The session number of this game in the telemetry, None without telemetry.
+        clock (Callable[[], time.struct_time]): Returns the time help tells.
     """
 
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None, world_path: str = world_loader.DEFAULT_WORLD,
+                 metrics: Optional[Metrics] = None, telemetry: Optional['telemetry.TelemetrySink'] = None,
+                 clock: Callable[[], time.struct_time] = time.localtime):
         """Initializes class game by creating each of the attributes and calling the create world function.
 
         The attributes get updated from these default values as the other methods are called.
+
+        Params:
+            seed (int): An optional seed for the random number generator so a game can be played the same
+                way twice. When it is None the game is random.
+            world_path (str): The path of the JSON file that describes the world.
+            metrics (Metrics): Where to record the latency of each command and what happened in the game.
+                When it is None nothing is recorded.
+            telemetry (TelemetrySink): Where to save every command and its events. When it is None nothing is
+                saved.
+            clock (Callable[[], time.struct_time]): Returns the time help tells, the local time by default.
         """
+        self._rng = GameRandom(seed)
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.count_session()
+        self._telemetry = telemetry
+        self._session = None if telemetry is None else telemetry.start_session(world_path)
+        self._clock = clock
+        self._world_path = world_path
+        self._elf_location = None
+        self._world = None
         self._locations = []
-        self._npc_dict = {}
-        self._inventory = []
-        self._weight = 0
+        self._npcs = {}
+        self._inventory = Inventory()
         self._calories_needed = 500
         self._run_game = True
+        self._output = []
+        self._events = []
+        self._turns = 0
+        self._journal = None
+        self._recording = None
         self.create_world()
         self._commands = self.setup_commands()
+        self._grammar = command_parser.get_grammar(self._commands)
         self._current_location = self.random_location()
 
     def create_world(self) -> None:
         """Creates the world that this game takes place in.
 
-        Sets up all the Locations through the Locations class, sets up all the items
-        through the items class, and sets up all the NPCs through the NPC class,
-        and puts the NPCs and Items in their correct locations."""
-        # Set up code for the town.
-        town = Location("Quiet Town", "A town full of buildings, but everyone seems to be inside.")
-        # Creation and addition of the food items
-        bottle = Item("pepsi", "A half drunken bottle of soda", 58, 1)
-        town.add_item(bottle)
-
-        # Setting up Lake Laogai
-        lake_laogai = Location("Lake Laogai", "A beautiful lake that is a bright shade of blue.")
-        # Creating the elf and adding him to Lake Laogai.
-        elf_messages = ["Gwt me somrthkng fof this hangoger dude", "Uah, H-hey thefe...",
-                        "Ugh, my head", "I don't feel so good"]
-        elf_holder = Item("holder", "This is a holder for the elf", 10, 1)
-        elf = NPC("elf", "A funny looking elf who could definitely use a bath.", elf_messages, False, elf_holder)
-        lake_laogai.add_npc(elf)
-        # Create and add the food to Lake Laogai
-        sushi = Item("sushi roll", "A single California roll of sushi", 38, 1)
-        lake_laogai.add_item(sushi)
-        seaweed = Item("bundle of seaweed", "Green, mean, and lean they say", 50, 1)
-        lake_laogai.add_item(seaweed)
-        seashells = Item("sea shells", "Some pretty looking sea shells", 0, 2)
-        lake_laogai.add_item(seashells)
-
-        # Set up for the witch house
-        witch_house = Location("Witch House", "A spooky scary house, what could be inside?")
-        # creating the witch NPC and putting her in the house
-        witch_messages = ["What do you need?",
-                          "Hello stranger, I think your leg is all I need left for his next potion.",
-                          "Have you seen my cat? She's a real cutie.",
-                          "I'm getting impatient, give me your leg or leave me alone.",
-                          "You're annoying me, I need to focus on my brew."]
-        calorie_potion = Item("calorie potion", "This potion is sure to hold lots of calories", 190, 13)
-
-        witch = NPC("Witch", "A short witch with an ugly mole on her nose.", witch_messages, True, calorie_potion)
-        witch_house.add_npc(witch)
-        # Creation and addition of food to the witch house
-        no_calorie_potion = Item("zero calorie potion", "A blue potion which yields no calories.", 0, 3)
-        witch_house.add_item(no_calorie_potion)
-        frog_legs = Item("frog legs", "A plate of frog legs.", 90, 5)
-        witch_house.add_item(frog_legs)
-        chicken_head = Item("chicken head", "The head of a chicken. Looks fresh, but smells bad.", 115, 8)
-        witch_house.add_item(chicken_head)
-
-        # Set up the magic forest.
-        magic_forest = Location("Magic Forest.", "A thick, green forest. Big enough for one to get lost in.")
-        # Setting up the fairy NPC
-        fairy_messages = ["Hello Wanderer, I hope you're not lost.",
-                          "*sings*",
-                          "I like your outfit!",
-                          "I'll help in any way I can",
-                          "I can't wait until the dragon finally leaves us all alone.",
-                          "I can't fly freely with the dragon around. :("]
-        magical_mushrooms = Item("magical mushrooms", "These mushrooms sure do have an interesting look to them.",
-                                 185, 11)
-        fairy = NPC("Fairy", "A small, sparkly, pretty fairy.", fairy_messages, True, magical_mushrooms)
-        magic_forest.add_npc(fairy)
-        # Creation and addtion of food to the magic forest.
-        green_apple = Item("green apple", "A round, clean green apple hanging from a tree.", 50, 1)
-        magic_forest.add_item(green_apple)
-        pear = Item("pear", "A tasty green fruit, the elf is sure to love this.", 74, 1)
-        magic_forest.add_item(pear)
-        stick = Item("stick", "A long, skinny, stick. Doesn't look very tasty.", 0, 2)
-        magic_forest.add_item(stick)
-
-        # Set up for the cave
-        cave = Location("Dark Cave", "A big, spooky, and dark cave.")
-        # creation and addition of food in the cave
-        magical_crystal = Item("magical crystal", "A shiny, reflective crystal, looks mysterious", 0, 3)
-        cave.add_item(magical_crystal)
-        old_burger = Item("15 day old burger",
-                          "An old, moldy, dirt covered burger. Probably wouldn't taste good.", 0, 2)
-        cave.add_item(old_burger)
-        rock = Item("small rock", "Just a plain old rock.", 0, 2)
-        cave.add_item(rock)
-
-        # set up for tavern
-        tavern = Location("Thorfin's Tavern", "The most famous tavern in this town. "
-                                              "They serve all kinds of drinks and food.")
-        # set up the Troll NPC
-        troll_messages = ["OOGA BOOGA CHOOGA",
-                          "*Burps in your face*",
-                          "BUN DUN DITTY DUM",
-                          "*Grunts with hints of annoyance*",
-                          "*farts and then walks away from you*"]
-        troll_holder = Item("holder for troll", "This is a holder", 10, 1)
-        troll = NPC("Troll", "A troll who definitely isn't your average fellow. "
-        
-                                   "Who knows what goes on in his head", troll_messages, False, troll_holder)
-        tavern.add_npc(troll)
-        # set up the food in the tavern
-        chair = Item("small chair", "A sturdy, wooden chair.", 0, 9)
-        tavern.add_item(chair)
-        root_beer = Item("root beer", "A tasty, fizzy drink.", 84, 4)
-        tavern.add_item(root_beer)
-        turkey_leg = Item("turkey leg", "A big piece of meat. Best food item sold at this tavern", 111, 12)
-        tavern.add_item(turkey_leg)
-        cow_heart = Item("cow heart", "A cow heart cooked to perfection.", 120, 13)
-        tavern.add_item(cow_heart)
-
-        # set up for the mountain area
-        mountains = Location("Mountain area", "Lot's of high mountains all clumped together. better watch your step!")
-        # set up the mountain food
-        boulder = Item("boulder", "A really really big rock", 0, 25)
-        mountains.add_item(boulder)
-        rock2 = Item("small rock", "Just a plain old rock.", 0, 5)
-        mountains.add_item(rock2)
-        caterpillar = Item("caterpillar", "it's still moving and crawling around", 7, 1)
-        mountains.add_item(caterpillar)
-        cockroach = Item("cockroach", "A small, creepy looking cockroach", 11, 1)
-        mountains.add_item(cockroach)
-
-        # set up the castle
-        castle = Location("A really big castle", "A creepy looking castle. It's the only building in these mountains")
-        # set up gandalf
-        gandalf_messages = ["You shall not pass any farther than this",
-                            "The glock is for display purposes only",
-                            "I hope you find your way back home safe"]
-        gandalf_holder = Item("Gandalf Holder", "This is a holder for Gandalf", 10, 1)
-        gandalf = NPC("Gandalf", "Really old, wise guy with a long beard. Seems pretty strong.", gandalf_messages,
-                      False, gandalf_holder)
-        castle.add_npc(gandalf)
-        # set up the items in the castle
-        glock = Item("glock", "A gun. Seems like an intimidating weapon.", 0, 8)
-        castle.add_item(glock)
-        blueberry_pie = Item("blueberry pie", "The best pie flavor out there.", 125, 10)
-        castle.add_item(blueberry_pie)
-        trail_mix = Item("trail mix bag", "A bag of assorted snacks", 83, 6)
-        castle.add_item(trail_mix)
-        smoothie = Item("strawberry smoothie", "A very tasty pink liquid.", 94, 9)
-        castle.add_item(smoothie)
-
-        # set up all the neighbor dictionaries
-        # Making the town neighbor locations dictionary.
-        town.add_location("east", tavern)
-        town.add_location("west", lake_laogai)
-        town.add_location("south", mountains)
-        # making the lake laogai neighbor locations dictionary.
-        lake_laogai.add_location("east", town)
-        lake_laogai.add_location("north", witch_house)
-        # making witch neighbor locations dictionary
-        witch_house.add_location("east", magic_forest)
-        witch_house.add_location("south", lake_laogai)
-        # setting up the magic forest neighbors dictionary
-        magic_forest.add_location("east", cave)
-        magic_forest.add_location("south", tavern)
-        magic_forest.add_location("west", witch_house)
-        # make the cave neighbors dictionary.
-        cave.add_location("west", magic_forest)
-        # creating the tavern neighbors dictionary
-        tavern.add_location("north", magic_forest)
-        tavern.add_location("west", town)
-        # set up the mountains neighbor dictionary.
-        mountains.add_location("south", castle)
-        mountains.add_location("north", town)
-        # set up the neighbors dictionary
-        castle.add_location("north", mountains)
-
-        self._locations = [town, lake_laogai, witch_house, magic_forest, cave, tavern, mountains, castle]
-        self._npc_dict = {"elf": elf,
-                          "witch": witch,
-                          "fairy": fairy,
-                          "troll": troll,
-                          "gandalf": gandalf}
+        The Locations, Items and NPCs are described in the world file, which is compiled once and
+        shared by every game in this process as a read-only WorldTemplate. This game only gets a
+        WorldState that records what it changes, such as items that were moved and visited locations."""
+        template = world.get_template(self._world_path)
+        self._set_world(template.new_state())
+        self._calories_needed = template.calories_needed
+        self._start_clock()
+
+    def _start_clock(self) -> None:
+        """Starts the world clock and schedules the first move of every NPC that wanders and every timed event,
+        if the world has any. Wanderers that move as often as each other are spread over the ticks by index."""
+        template = self._world.template
+        if template.is_static():
+            return
+        state = self._world
+        state.start_timers(self._turns)
+        for npc, every in template.wanderers:
+            state.schedule(scheduler.timer_key(scheduler.WANDER, npc), self._turns + every - npc % every)
+        for index, (start, every, message, location) in enumerate(template.events):
+            state.schedule(scheduler.timer_key(scheduler.EVENT, index), self._turns + start)
+
+    def _set_world(self, state: world.WorldState) -> None:
+        """Makes state the WorldState of this game."""
+        self._world = state
+        self._locations = state.locations
+        self._npcs = state.npcs
+        self._elf_location = self._locations[state.template.elf_index]
+        self._views = render.RoomViews(state)
 
     def setup_commands(self) -> Dict[str, 'function']:
         """Method to set up the commands dictionary
@@ -232,153 +211,486 @@ class Game:
                           "quit": self.quit,
                           "q": self.quit,
                           "rob": self.rob,
-                          "teleport": self.teleport}
+                          "teleport": self.teleport,
+                          "travel": self.travel}
         return commands
 
     def random_location(self) -> Location:
         """Returns a random location from the locations list."""
-        random_index = random.randint(0, len(self._locations) - 1)
+        random_index = self._rng.randint(0, len(self._locations) - 1)
         return self._locations[random_index]
 
+    def get_current_location(self) -> Location:
+        """Returns the Location the player is currently in."""
+        return self._current_location
+
+    def set_current_location(self, location: Location) -> None:
+        """Puts the player in location without running a command, which takes no turn.
+
+        Params:
+            location (Location): A Location of this game's world."""
+        self._current_location = location
+
+    def get_locations(self) -> List[Location]:
+        """Returns the Locations of this game's world, in the order of their index."""
+        return self._locations
+
+    def get_elf_location(self) -> Location:
+        """Returns the Location the elf is waiting in."""
+        return self._elf_location
+
+    def get_world(self) -> world.WorldState:
+        """Returns the WorldState that holds what this game changed in its world."""
+        return self._world
+
+    def get_metrics(self) -> Optional[Metrics]:
+        """Returns the Metrics this game records into, or None if it records nothing."""
+        return self._metrics
+
+    def get_inventory(self) -> Inventory:
+        """Returns the Inventory of Items the player is carrying."""
+        return self._inventory
+
+    def get_weight(self) -> int:
+        """Returns the integer representing the weight the player is carrying."""
+        return self._inventory.get_weight()
+
+    def get_calories_needed(self) -> int:
+        """Returns the number of calories the elf still needs."""
+        return self._calories_needed
+
+    def get_turns(self) -> int:
+        """Returns the number of commands this game ran."""
+        return self._turns
+
+    def get_draws(self) -> int:
+        """Returns the number of random numbers this game drew."""
+        return self._rng.draws
+
+    def is_running(self) -> bool:
+        """Returns True until the game was won or the player quit."""
+        return self._run_game
+
+    def save(self, path: str) -> None:
+        """Method to save everything this game changed to a snapshot file.
+
+        If the game is journaling to this snapshot, the journal starts again after the new snapshot.
+
+        Params:
+            path (str): Where the snapshot is written."""
+        saved = self.get_snapshot(int.from_bytes(os.urandom(8), "little"))
+        saved.write(path)
+        if self._journal is not None and self._journal.snapshot_path == path:
+            self._journal.restart(saved.snapshot_id, saved.inventory, self._rng.draws)
+            self._world.changes.clear()
+
+    def load(self, path: str) -> None:
+        """Method to continue a game from a snapshot file and the journal written after it, if there is one.
+
+        Params:
+            path (str): The snapshot file, which must have been saved from a game of the same world.
+
+        Raises:
+            ValueError: If the file isn't a snapshot or was saved from a different world."""
+        import snapshot
+        saved = snapshot.SessionSnapshot.read(path)
+        self.restore(saved, snapshot.read_journal(path + snapshot.JOURNAL_SUFFIX, saved.snapshot_id))
+
+    def get_snapshot(self, snapshot_id: int = 0) -> 'snapshot.SessionSnapshot':
+        """Returns a snapshot of everything this game changed, without writing it anywhere.
+
+        Params:
+            snapshot_id (int): The id the snapshot is saved with."""
+        # snapshot is only imported by games that save, load or record, so starting a game doesn't import it.
+        import snapshot
+        return snapshot.SessionSnapshot.capture(self._world, snapshot_id, self._turns,
+                                                self._current_location.get_index(), self._inventory,
+                                                self._calories_needed, self._run_game, self._rng.getstate())
+
+    def restore(self, saved: 'snapshot.SessionSnapshot', records: Iterable[tuple] = ()) -> None:
+        """Method to put this game back in the state of a snapshot, with journal records applied after it.
+
+        Params:
+            saved (SessionSnapshot): A snapshot of a game of the same world.
+            records (Iterable[tuple]): The journal records written after the snapshot, in order.
+
+        Raises:
+            ValueError: If the snapshot was saved from a different world."""
+        import snapshot
+        template = world.get_template(self._world_path)
+        state = template.new_state()
+        saved.restore(state)
+        for record in records:
+            saved.apply(record, state)
+        self._set_world(state)
+        self._inventory = Inventory()
+        for code in saved.inventory:
+            self._inventory.add(snapshot.decode_item(template, code))
+        self._current_location = self._locations[saved.location]
+        self._calories_needed = saved.calories_needed
+        self._run_game = saved.run_game
+        self._rng.setstate(saved.rng_state)
+        self._turns = saved.turns
+        if not template.is_static():
+            state.timers = scheduler.TimerWheel(self._turns, saved.timers.items())
+        if self._journal is not None:
+            state.changes = world.StateChanges()
+            self.save(self._journal.snapshot_path)
+
+    def start_journal(self, path: str, snapshot_every: Optional[int] = None) -> None:
+        """Method to save the game to a snapshot and then save the changes of every command to its journal.
+
+        Params:
+            path (str): The snapshot file. The journal is written next to it.
+            snapshot_every (int): The number of commands after which a new snapshot is written and the journal
+                starts again, None for snapshot.SNAPSHOT_EVERY and 0 for never."""
+        import snapshot
+        self.stop_journal()
+        if snapshot_every is None:
+            snapshot_every = snapshot.SNAPSHOT_EVERY
+        self._journal = snapshot.Journal(path, snapshot_every)
+        self._world.changes = world.StateChanges()
+        self.save(path)
+
+    def stop_journal(self) -> None:
+        """Method to stop saving the changes of every command."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._world.changes = None
+
+    def start_recording(self, path: str, checkpoint_every: Optional[int] = None) -> None:
+        """Method to record every command from now on, so the game can be replayed with replay.py.
+
+        Params:
+            path (str): The recording file, replaced if it exists.
+            checkpoint_every (int): The number of commands after which a checkpoint is written, None for
+                replay.CHECKPOINT_EVERY and 0 for only the one at the start."""
+        import replay
+        self.stop_recording()
+        if checkpoint_every is None:
+            checkpoint_every = replay.CHECKPOINT_EVERY
+        self._recording = replay.Recording(path, self._world_path, checkpoint_every,
+                                           self._world.template.wander_region())
+        self._recording.checkpoint(self.get_snapshot(), self._rng.draws)
+
+    def stop_recording(self) -> None:
+        """Method to stop recording commands."""
+        if self._recording is not None:
+            self._recording.close()
+            self._recording = None
+
     def play(self) -> None:
-        """Method That is the core loop used to run the game."""
-        print("\nWelcome to the magical world of Ireland! A once lively and joyful area, "
-              "has now become\nvery grim and depressing. Why you may ask? Well unfortunately, the dragon Alduin\n"
-              "has taken over the area. He flies around and eats people who are happy. What makes matters worse\n"
-              "is that our hero elf is too drunk to do anything about the dragon. Please hero, feed the elf\n"
-              "some food to help sober him up. Please save us from this dragon.\n")
-        self.show_help()
+        """Method That is the core loop used to run the game.
+
+        This is the console adapter on top of execute, it only reads lines from the terminal and
+        prints the text of each Result. The text of a Result and the prompt after it are written together,
+        so each command costs a single write to the terminal."""
+        pending = f"{INTRO_TEXT}\n{self.execute('help').get_text()}\n"
 
         # begin game loop
         while self._run_game:
+            sys.stdout.write(pending + PROMPT)
+            sys.stdout.flush()
+            result = self.execute(input())
+            pending = f"{result.get_text()}\n" if result.lines else ""
+            if result.game_over:
+                break
+        sys.stdout.write(pending)
+        sys.stdout.flush()
+
+    def execute(self, command_line: str) -> 'Result':
+        """Method to run a command line without touching the terminal.
 
-            # Get the input as lower case letters and make the list of tokens
-            tokens = input("\nWhat is your command? (Type 'help' for instructions) ").lower().split()
-            # Separate the command from the target
-            command = tokens.pop(0)
-            target = " ".join(tokens)
-            # make sure the user entered a valid command and keep asking the user for a command
-            # until a valid command is entered
-            if command not in self._commands:
-                print("Invalid command! Try again")
-                continue
-            self._commands[command](target)
-
-            # check if the elf has enough calories.
-            if self._calories_needed <= 0:
+        A command can be shortened to any prefix that only one command starts with, like "l" for look, and
+        "n", "north" and the other directions move the player. A line can hold several commands separated by
+        semicolons, which run as separate turns until one of them ends the game.
+
+        Params:
+            command_line (str): The raw line the player typed. Ex: "take pepsi; go west"
+
+        Returns:
+            result (Result): The text and events the commands produced. When the line held several commands,
+                the lines and events of all of them, with the command word and target of the last one."""
+        commands = self._grammar.parse(command_line)
+        if len(commands) == 1:
+            return self._run(commands[0], command_line)
+        lines = []
+        events = []
+        valid = True
+        for command in commands:
+            result = self._run(command, command.text)
+            lines.extend(result.lines)
+            events.extend(result.events)
+            valid = valid and result.valid
+            if result.game_over:
                 break
+        return Result(result.command, result.target, valid, lines, events, result.game_over)
+
+    def _run(self, command: command_parser.Command, command_line: str) -> 'Result':
+        """Runs a single parsed command as one turn.
 
+        Params:
+            command (Command): The command, parsed by the game's grammar.
+            command_line (str): The text of the command the turn is recorded with."""
+        name = command.name
+        target = command.target
+        # make sure the user entered a valid command
+        if name is None:
+            candidates = self._grammar.candidates(command.word)
+            if len(candidates) > 1:
+                self._say(f"Invalid command! Did you mean {', '.join(candidates[:-1])} or {candidates[-1]}?")
+            else:
+                self._say("Invalid command! Try again")
+            if self._metrics is not None:
+                self._metrics.record("invalid", 0, self._events)
+            self._end_turn(command_line)
+            if self._telemetry is not None:
+                self._telemetry.record(self._session, self._turns, command.word, target, False, 0, self._events)
+            return Result(command.word, target, False, self._flush_output(), self._flush_events(), False)
+        if self._metrics is None and self._telemetry is None:
+            self._commands[name](target)
+        else:
+            start = time.perf_counter_ns()
+            try:
+                self._commands[name](target)
+            except Exception:
+                if self._metrics is not None:
+                    self._metrics.record_error(name)
+                raise
+            elapsed = time.perf_counter_ns() - start
+
+        # check if the elf has enough calories.
         if self._calories_needed <= 0:
-            print("Congratulations hero! You gave the elf enough food to cure his hangover"
-                  " and he slayed the dragon! "
-                  "We are very grateful for what you've done.")
+            self._run_game = False
+            self._emit("won")
+            self._say("Congratulations hero! You gave the elf enough food to cure his hangover"
+                      " and he slayed the dragon! "
+                      "We are very grateful for what you've done.")
+        if self._metrics is not None:
+            self._metrics.record(name, elapsed, self._events)
+        self._end_turn(command_line)
+        if self._telemetry is not None:
+            # After the turn ended, so the events of the world clock are saved with the command too.
+            self._telemetry.record(self._session, self._turns, name, target, True, elapsed, self._events)
+        return Result(name, target, True, self._flush_output(), self._flush_events(), not self._run_game)
+
+    def _end_turn(self, command_line: str) -> None:
+        """Counts a finished command, runs the world clock for its tick, saves what changed to the journal and
+        records it, if the game has a world clock and is journaling and recording."""
+        self._turns += 1
+        if self._world.timers is not None:
+            self._run_clock()
+        journal = self._journal
+        if journal is not None:
+            journal.record(self._world, self._turns, self._current_location.get_index(), self._inventory,
+                           self._calories_needed, self._run_game, self._rng.draws, self._rng.getstate)
+            if journal.snapshot_every and journal.records >= journal.snapshot_every:
+                self.save(journal.snapshot_path)
+        recording = self._recording
+        if recording is not None:
+            recording.record(command_line, self._rng.draws, render.output_crc(self._output))
+            if recording.checkpoint_every and recording.records >= recording.checkpoint_every:
+                recording.checkpoint(self.get_snapshot(), self._rng.draws)
+
+    def _run_clock(self) -> None:
+        """Moves the world clock on by one tick and wakes the NPCs and timed events that are due. The player is
+        only told about what happens where they are."""
+        here = self._current_location.get_index()
+        for key in self._world.advance_timers():
+            kind = scheduler.timer_kind(key)
+            index = scheduler.timer_index(key)
+            if kind == scheduler.WANDER:
+                self._wander(index, here)
+            elif kind == scheduler.RESTOCK:
+                npc = self._world.npc(index)
+                npc.high_val = True
+                if self._npcs.is_at(index, here):
+                    self._say(f"\n{npc.get_name()} found some more food.")
+                    self._emit("restocked", npc.get_name())
+            else:
+                start, every, message, location = self._world.template.events[index]
+                if location < 0 or location == here:
+                    self._say(f"\n{message}")
+                    self._emit("announced", message)
+                if every:
+                    self._world.schedule(key, self._turns + every)
+
+    def _wander(self, npc: int, here: int) -> None:
+        """Moves an NPC that wanders through a random exit of its location, unless the world doesn't simulate the
+        NPCs there while the player is here, and schedules its next move.
+
+        Params:
+            npc (int): The index of the NPC.
+            here (int): The index of the location the player is in."""
+        state = self._world
+        source = self._npcs.location_of(npc)
+        exits = state.exits_of(source) if state.simulates(source, here) else None
+        if exits:
+            directions = list(exits)
+            direction = directions[self._rng.randrange(len(directions))]
+            target = exits[direction]
+            self._npcs.move(npc, target)
+            if here in (source, target) and source != target:
+                name = state.npc(npc).get_name()
+                if source == here:
+                    self._say(f"\n{name} went {direction}.")
+                    self._emit("npc_left", name, direction)
+                else:
+                    self._say(f"\n{name} arrived.")
+                    self._emit("npc_arrived", name)
+        state.schedule(scheduler.timer_key(scheduler.WANDER, npc),
+                       self._turns + state.template.npc_wander_every[npc])
+
+    def _restock_later(self, npc: NPC) -> None:
+        """Schedules a robbed NPC to get its prize food back, if it ever does."""
+        template = self._world.template
+        index = npc.get_index()
+        if template.restocking and template.npc_restock_after[index]:
+            # The command that robbed it ends at the next tick.
+            self._world.schedule(scheduler.timer_key(scheduler.RESTOCK, index),
+                                 self._turns + 1 + template.npc_restock_after[index])
+
+    def _take_prize_food(self, npc: NPC) -> Item:
+        """Takes the prize food of an NPC that is being robbed and returns it.
+
+        The first prize of an NPC is the item from the world. Every prize it got back after that is a new item
+        with the same values, so the player can carry it next to the first one, which may still be in the
+        inventory or lying in a room."""
+        restocked = npc.get_index() in self._world.high_value
+        food = npc.get_prize_food()
+        if restocked:
+            food = Item(food.get_name(), food.description, food.get_calories(), food.get_weight(), food.get_tags())
+        return food
+
+    def _say(self, text: str) -> None:
+        """Adds a line of text to the output of the command currently running.
+
+        Params:
+            text (str): The message for the player."""
+        self._output.append(text)
+
+    def _emit(self, kind: str, *data) -> None:
+        """Records a structured event for the command currently running.
+
+        Params:
+            kind (str): The name of the event. Ex: "moved"
+            data: Any values that describe the event."""
+        self._events.append((kind,) + data)
+
+    def _flush_output(self) -> List[str]:
+        """Returns the pending output lines and starts a new list."""
+        lines = self._output
+        self._output = []
+        return lines
+
+    def _flush_events(self) -> List[tuple]:
+        """Returns the pending events and starts a new list."""
+        events = self._events
+        self._events = []
+        return events
+
+    def discard_output(self) -> None:
+        """Drops the output lines and events of commands that were called as methods instead of through execute,
+        which would otherwise be returned by the next execute."""
+        self._output = []
+        self._events = []
 
     def show_help(self, arg: str = "") -> None:
         """Method to show the current time and all the possible commands a user can execute.
 
         Params:
             arg (str): An empty string."""
-        time_obj = datetime.datetime.now()
-        print(f"It is currently {time_obj.hour}:{time_obj.minute}:{time_obj.second}")
-        print("Valid commands are:\n"
-              "\n- help"
-              "\n- ?"
-              "\n- talk (put the npc name you want to talk to after this word. Ex: talk elf)"
-              "\n- meet (put the npc name you want to talk to after this word. Ex: meet elf)"
-              "\n- take (put the item name you want to take after this word. Ex: take pepsi)"
-              "\n- give (put the item name you want to give/drop after this word. Ex: give pepsi)"
-              "\n- go (put the direction you want to go after this word. Ex: go North)"
-              "\n- items (lists the items you currently are holding)"
-              "\n- look (allows you to see what is around you)"
-              "\n- quit"
-              "\n - q"
-              "\n- rob"
-              "\n- teleport")
+        time_obj = self._clock()
+        self._say(render.ClockText(f"It is currently {time_obj.tm_hour}:{time_obj.tm_min}:{time_obj.tm_sec}"))
+        self._say(render.HELP_TEXT)
 
     def talk(self, target: str) -> None:
         """Method to talk with an NPC as long as it's in the same area as the user.
 
         Params:
-            target (str): A string representing the NPC the user wishes to talk to. """
-        if target in self._npc_dict:
-            if self._npc_dict[target] in self._current_location.get_npcs():
-                print(self._npc_dict[target].get_message())
+            target (str): A string representing the NPC the user wishes to talk to. Ex: "elf" or "elv" """
+        index = self._npcs.match(target, self._current_location.get_index())
+        if index is not None:
+            if self._npcs.is_at(index, self._current_location.get_index()):
+                self._say(self._world.npc(index).get_message())
+                self._emit("talked", self._world.template.npc_keys[index])
             else:
-                print("There's no one in this room")
+                self._say("There's no one in this room")
         else:
-            print("That creature doesn't exist.")
+            self._say("That creature doesn't exist.")
 
     def meet(self, target: str) -> None:
         """Method to meet an NPC as long as it's in the same area as the user.
 
         Params:
             target (str): A string representing the NPC that the player wishes to meet."""
-        if target in self._npc_dict:
-            if self._npc_dict[target] in self._current_location.get_npcs():
-                print(self._npc_dict[target].get_description())
+        index = self._npcs.match(target, self._current_location.get_index())
+        if index is not None:
+            if self._npcs.is_at(index, self._current_location.get_index()):
+                self._say(self._world.npc(index).get_description())
             else:
-                print("There's no one in this room")
+                self._say("There's no one in this room")
         else:
-            print("That creature doesn't exist")
+            self._say("That creature doesn't exist")
 
     def take(self, target: str) -> None:
         """Method to add an item to the user's inventory.
 
         This method removes the target item from the location that the player is in and then adds
         that item to the player's inventory. The player's weight is increased by the item's weight.
+        The name can be partial or misspelled, the item whose name matches it best is taken.
 
         Params:
             target (str): A string representing the item the user wishes to add to their inventory."""
-        for item in self._current_location.get_items():
-            if item.get_name() == target:
-                self._current_location.remove_item(item)
-                self._inventory.append(item)
-                self._weight += item.get_weight()
-                print(f"You took the {item}")
-                return
-        print("That item doesn't exist.")
+        item = self._current_location.match_item(target)
+        if item is None:
+            self._say("That item doesn't exist.")
+            return
+        self._current_location.remove_item(item)
+        self._inventory.add(item)
+        self._say(f"You took the {item}")
+        self._emit("took", item.get_name())
 
     def give(self, target: str) -> None:
         """Method to drop/give an item in an area or to the elf
 
+        The name can be partial or misspelled, the item in the inventory whose name matches it best is given.
+
         Params:
             target (str): A string representing the item that the user wants to drop."""
 
-        # Loop through all the items in the inventory
-        for item in self._inventory:
-            # Item matches the item the user wants to drop execute the following
-            if item.get_name() == target:
-                # Check if the player is in the same location as the elf
-                if self._current_location == self._locations[1]:
-                    # Checks if the item was edible or not and execute the corresponding outcome
-                    if item.get_calories() > 0:
-                        self._calories_needed -= item.get_calories()
-                        self._inventory.remove(item)
-                        self._weight -= item.get_weight()
-                        if self._calories_needed > 0:
-                            print(f"\nYummy food, more please. How about you bring me "
-                                  f"{self._calories_needed} more calories worth in food.")
-                        return
-                    else:
-                        self._inventory.remove(item)
-                        self._weight -= item.get_weight()
-                        print("\nTHAT TASTED HORRIBLE, BE GONE FROM MY SIGHT!")
-                        print("\nThe elf didn't like that item.")
-                        self._current_location = self.random_location()
-                        print(f"The elf teleported you to a new location: "
-                              f"{self._current_location.get_name().capitalize()}")
-                        return
-                # If the player isn't near the elf then just add the dropped item to this location.
-                else:
-                    print(f"\nYou dropped {item}")
-                    self._current_location.add_item(item)
-                    self._weight -= item.get_weight()
-                    self._inventory.remove(item)
-                    return
-        if len(self._inventory) > 0:
-            print("\nThat item is not in your inventory")
+        item = self._inventory.match(target)
+        if item is None:
+            if len(self._inventory) > 0:
+                self._say("\nThat item is not in your inventory")
+            else:
+                self._say("\nYour inventory is empty.")
+            return
+        # Check if the player is in the same location as the elf
+        if self._current_location == self._elf_location:
+            self._inventory.remove(item)
+            # Checks if the item was edible or not and execute the corresponding outcome
+            if item.get_calories() > 0:
+                self._calories_needed -= item.get_calories()
+                self._emit("fed", item.get_name(), item.get_calories())
+                if self._calories_needed > 0:
+                    self._say(f"\nYummy food, more please. How about you bring me "
+                              f"{self._calories_needed} more calories worth in food.")
+            else:
+                self._say("\nTHAT TASTED HORRIBLE, BE GONE FROM MY SIGHT!")
+                self._say("\nThe elf didn't like that item.")
+                self._current_location = self.random_location()
+                self._emit("fed", item.get_name(), 0)
+                self._emit("teleported", self._current_location.get_name(), "elf")
+                self._say(f"The elf teleported you to a new location: "
+                          f"{self._current_location.get_name().capitalize()}")
+        # If the player isn't near the elf then just add the dropped item to this location.
         else:
-            print("\nYour inventory is empty.")
+            self._say(f"\nYou dropped {item}")
+            self._emit("dropped", item.get_name())
+            self._current_location.add_item(item)
+            self._inventory.remove(item)
 
     def go(self, target: str) -> None:
         """Method to change the current location to a new one as long as the direction exists.
@@ -387,28 +699,64 @@ class Game:
             target (str): A string representing the direction a player wants to go.
         """
         self._current_location.set_visited()
-        if self._weight > 30:
-            print(f"You're carrying too much stuff. You currently weigh {self._weight} pounds."
-                  f"You need to drop some items to get below 30 pounds to move")
+        weight = self._inventory.get_weight()
+        if weight > 30:
+            self._say(f"You're carrying too much stuff. You currently weigh {weight} pounds."
+                      f"You need to drop some items to get below 30 pounds to move")
+            self._emit("blocked", weight)
             return
 
         if target in self._current_location.get_locations():
             self._current_location = self._current_location.get_locations()[target]
-            print(f"\nYou are in {self._current_location}")
+            self._say(f"\nYou are in {self._current_location}")
+            self._emit("moved", self._current_location.get_name())
         else:
-            print("\nYou can't go that direction.")
+            self._say("\nYou can't go that direction.")
+
+    def travel(self, target: str) -> None:
+        """Method to move the player along the shortest path to a location, as long as there is one.
+
+        Every location on the way counts as visited, the same as if the player walked there with go.
+
+        Params:
+            target (str): A string representing the name of the location the player wants to travel to.
+        """
+        destination = self._world.template.find_location(target)
+        if destination is None:
+            self._say("\nThere's no place with that name.")
+            return
+        path = self._world.get_routes().path(self._current_location.get_index(), destination)
+        if path is None:
+            self._say("\nYou can't find a way there from here.")
+            return
+        if not path:
+            self._say(f"\nYou are already in {self._current_location}")
+            return
+        weight = self._inventory.get_weight()
+        if weight > 30:
+            self._current_location.set_visited()
+            self._say(f"You're carrying too much stuff. You currently weigh {weight} pounds."
+                      f"You need to drop some items to get below 30 pounds to move")
+            self._emit("blocked", weight)
+            return
+        for direction, location in path:
+            self._current_location.set_visited()
+            self._current_location = self._locations[location]
+        self._say(f"\nYou traveled {', '.join(direction for direction, location in path)}.")
+        self._say(f"\nYou are in {self._current_location}")
+        self._emit("traveled", self._current_location.get_name(), len(path))
 
     def show_items(self, args: str = "") -> None:
         """Method to print the weight of player and print their inventory.
 
         Params:
             args (str): An empty string."""
-        print(f"\nYour weight in pounds is: {self._weight}.\n"
-              f"The items in your inventory are:")
+        self._say(f"\nYour weight in pounds is: {self._inventory.get_weight()}.\n"
+                  f"The items in your inventory are:")
         if len(self._inventory) == 0:
-            print("\nYou are not carrying any items.")
+            self._say("\nYou are not carrying any items.")
         for item in self._inventory:
-            print(f"\n- {item}")
+            self._say(f"\n- {item}")
 
     def look(self, args: str = "") -> None:
         """Method for user to see what objects and NPCs are near them.
@@ -418,38 +766,23 @@ class Game:
         Params:
             args (str): An empty string.
         """
-        # Print what is in the room
-        print(f"\nYou are located in: {self._current_location}")
-        print("\nYou see:")
-
-        # print what items are in the room
-        if not self._current_location.get_items():
-            print("No items here of use.")
-        for item in self._current_location.get_items():
-            print(f"- {item}")
-
-        print("\nand")
-
-        # print the npcs in the room.
-        if not self._current_location.get_npcs():
-            print("You are alone.")
-        for character in self._current_location.get_npcs():
-            print(f"{character.get_name()}")
-
-        # Print the possible directions someone can go from here
-        print(f'\nFrom here you may go:')
-        for dir in self._current_location.get_locations():
-            if self._current_location.get_locations()[dir].get_visited():
-                print(f"- {dir} - {self._current_location.get_locations()[dir]}")
-            else:
-                print(f"- {dir}")
+        # The lines that describe the room are only built again when something in it changed
+        self._output.extend(self._views.lines(self._current_location.get_index()))
+
+        # Tell the player how far the elf is once they know where he is
+        if self._elf_location.get_visited() and self._current_location != self._elf_location:
+            moves = self._world.get_routes().distance(self._current_location.get_index(),
+                                                      self._elf_location.get_index())
+            if moves > 0:
+                self._say(f"\n{moves} move{'s' if moves > 1 else ''} to {self._elf_location.get_name()}")
 
     def quit(self, args: str = "") -> None:
         """Method to print that the player failed.
 
         Params:
             args (str): An empty string"""
-        print("You failed to save Ireland. :(")
+        self._say("You failed to save Ireland. :(")
+        self._emit("quit")
         self._run_game = False
 
     def rob(self, args: str = "") -> None:
@@ -460,43 +793,48 @@ class Game:
 
         Params:
             args (str): An empty string. """
-        has_glock = False
-        for npc in self._current_location.get_npcs():
-            current_npc = npc
-            chance = random.randint(0, 100)
-            # check if the npc can be robbed (if it has a prize food item)
-            for item in self._inventory:
-                if item.get_name() == "glock":
-                    has_glock = True
-            if current_npc.has_prize_food():
-                # Check if glock is in the user's inventory
-                if has_glock:
-                    # If glock is in inventory then these are the odds of success
-                    if chance < 87:
-                        print(f"You successfully robbed {current_npc}")
-                        print(f"You acquired {current_npc.get_prize_food()}")
-                        self._inventory.append(current_npc.get_prize_food())
-                        self._weight += current_npc.get_prize_food().get_weight()
-                        return
-                    else:
-                        print(f"You weren't successful in robbing {current_npc}.")
-                        return
-                # If glock is not in the user's inventory then these are the odds of success
+        has_glock = self._inventory.has_tag("armed")
+        index = self._npcs.first_at(self._current_location.get_index())
+        if index is None:
+            self._say("You can't rob the air.")
+            return
+        # Only the first NPC in the room is ever robbed, so the others aren't looked at.
+        current_npc = self._world.npc(index)
+        chance = self._rng.randint(0, 100)
+        # check if the npc can be robbed (if it has a prize food item)
+        if current_npc.has_prize_food():
+            # Check if glock is in the user's inventory
+            if has_glock:
+                # If glock is in inventory then these are the odds of success
+                if chance < 87:
+                    food = self._take_prize_food(current_npc)
+                    self._say(f"You successfully robbed {current_npc}")
+                    self._say(f"You acquired {food}")
+                    self._emit("robbed", current_npc.get_name(), True, True)
+                    self._inventory.add(food)
+                    self._restock_later(current_npc)
+                    return
                 else:
-                    if chance < 47:
-                        print(f"You successfully robbed {current_npc}")
-                        print(f"You acquired {current_npc.get_prize_food()}")
-                        self._inventory.append(current_npc.get_prize_food())
-                        self._weight += current_npc.get_prize_food().get_weight()
-                        return
-                    else:
-                        print(f"You weren't successful in robbing {current_npc}")
-                        return
-            # Print's nps is unrobbable if it has no prize food
+                    self._say(f"You weren't successful in robbing {current_npc}.")
+                    self._emit("robbed", current_npc.get_name(), False, True)
+                    return
+            # If glock is not in the user's inventory then these are the odds of success
             else:
-                print(f"It is not possible to rob {current_npc}")
-                return
-        print("You can't rob the air.")
+                if chance < 47:
+                    food = self._take_prize_food(current_npc)
+                    self._say(f"You successfully robbed {current_npc}")
+                    self._say(f"You acquired {food}")
+                    self._emit("robbed", current_npc.get_name(), True, False)
+                    self._inventory.add(food)
+                    self._restock_later(current_npc)
+                    return
+                else:
+                    self._say(f"You weren't successful in robbing {current_npc}")
+                    self._emit("robbed", current_npc.get_name(), False, False)
+                    return
+        # Print's nps is unrobbable if it has no prize food
+        else:
+            self._say(f"It is not possible to rob {current_npc}")
 
     def teleport(self, args: str = "") -> None:
         """Method that is called when player's command is teleport.
@@ -510,18 +848,195 @@ class Game:
         old_location = self._current_location
         self._current_location = self.random_location()
         if old_location != self._current_location:
-            print(f"\nYou are now in {self._current_location}")
+            self._say(f"\nYou are now in {self._current_location}")
+            self._emit("teleported", self._current_location.get_name(), "command")
             return
-        print(f"\nYour teleport was unsuccessful.\nYou are still located in: {self._current_location}.")
-
+        self._say(f"\nYour teleport was unsuccessful.\nYou are still located in: {self._current_location}.")
+
+
+
+def run_script(game: Game, lines: Iterable[str], out: TextIO, output_format: str = "text",
+               flush_every: int = 4096) -> int:
+    """Function that feeds commands to a game without prompting and writes the results in batches.
+
+    Blank lines and lines starting with # are skipped. The script stops early if the game ends.
+
+    Params:
+        game (Game): The game to play.
+        lines (Iterable[str]): The commands, one per line.
+        out (TextIO): Where the results are written.
+        output_format (str): "text" writes the text of each result like the console does, "json" writes a
+            transcript with one JSON object per command.
+        flush_every (int): The number of commands whose output is collected before it is written.
+
+    Returns:
+        turns (int): The number of commands that were executed."""
+    if output_format == "json":
+        # Only JSON transcripts need json, so a plain game doesn't import it.
+        import json
+    pending = []
+    turns = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        result = game.execute(line)
+        turns += 1
+        if output_format == "json":
+            pending.append(json.dumps({"turn": turns, "command": line, "valid": result.valid, "lines": result.lines,
+                                       "events": result.events, "game_over": result.game_over}))
+        elif result.lines:
+            pending.append(result.get_text())
+        if len(pending) >= flush_every:
+            out.write("\n".join(pending) + "\n")
+            pending.clear()
+        if result.game_over:
+            break
+    if pending:
+        out.write("\n".join(pending) + "\n")
+    return turns
+
+
+def import_times() -> Tuple[float, List[Tuple[str, float]]]:
+    """Returns the seconds it takes to import this module and the seconds each module it imports directly takes,
+    slowest first. A module is only imported once per process, so they are timed by importing this module in a
+    new interpreter with -X importtime."""
+    import subprocess
+    # The module's own name, since it is __main__ when it runs as a script.
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+    modules = []
+    for line in output.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # One space, then two more for every level the import is nested under the module that imported it.
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        name, seconds = fields[2].strip(), int(fields[1]) / 1e6
+        if depth == 0 and name == module:
+            return seconds, sorted(modules, key=lambda module: module[1], reverse=True)
+        if depth == 0:
+            modules = []
+        elif depth == 1:
+            modules.append((name, seconds))
+    return 0.0, []
+
+
+def profile_startup(args: argparse.Namespace, parse_seconds: float, out: TextIO) -> None:
+    """Function that creates the game the command line asks for and writes how long each part of starting it took,
+    without playing it.
+
+    Params:
+        args (argparse.Namespace): The parsed command line.
+        parse_seconds (float): The seconds it took to parse the command line.
+        out (TextIO): Where the report is written, as text or as JSON depending on args.format."""
+    imports, modules = import_times()
+    from_image = world.has_image(args.world)
+    start = time.perf_counter()
+    world.get_template(args.world, None if args.memory_budget is None else args.memory_budget << 20)
+    world_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    Game(args.seed, args.world)
+    game_seconds = time.perf_counter() - start
+    total = imports + parse_seconds + world_seconds + game_seconds
+    if args.format == "json":
+        import json
+        out.write(json.dumps({"world": args.world, "from_image": from_image, "imports": imports,
+                              "modules": dict(modules), "arguments": parse_seconds, "world_load": world_seconds,
+                              "game": game_seconds, "total": total}) + "\n")
+        return
+    lines = [f"Startup of a game of {args.world}, in milliseconds:",
+             f"  imports    {imports * 1e3:8.2f}  (timed in a new interpreter)"]
+    lines.extend(f"    {name:<22} {seconds * 1e3:8.2f}" for name, seconds in modules[:8])
+    lines.extend([f"  arguments  {parse_seconds * 1e3:8.2f}",
+                  f"  world      {world_seconds * 1e3:8.2f}  "
+                  f"({'read from its image' if from_image else 'built from the world file'})",
+                  f"  game       {game_seconds * 1e3:8.2f}",
+                  f"  total      {total * 1e3:8.2f}  (plus starting the interpreter)"])
+    out.write("\n".join(lines) + "\n")
+
+
+def run_game(rp: Game, args: argparse.Namespace) -> None:
+    """Function that plays the game at the prompt, or from a script if the command line asked for one."""
+    if args.script is None and not args.batch:
+        rp.play()
+        return
+    if args.batch or args.script == "-":
+        run_script(rp, sys.stdin, sys.stdout, args.format)
+        return
+    with open(args.script) as script:
+        run_script(rp, script, sys.stdout, args.format)
 
 
 def main():
     """Function that is the main method of our program.
 
-    This function will run the game created by the three separate classes."""
-    rp = Game()
-    rp.play()
+    This function will run the game created by the three separate classes. With --script or --batch
+    the commands are read from a file or from standard input instead of being typed at a prompt, and help
+    tells the same time on every run."""
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Play the game.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--script", metavar="FILE", help="read commands from FILE, - for standard input")
+    source.add_argument("--batch", action="store_true", help="read commands from standard input")
+    parser.add_argument("--seed", type=int, default=None, help="seed for teleporting and robbing")
+    parser.add_argument("--format", choices=["text", "json"], default="text",
+                        help="how results are written in script and batch mode")
+    parser.add_argument("--world", metavar="FILE", default=world_loader.DEFAULT_WORLD,
+                        help="the world file to play in, such as one written by worldgen.py or world_pages.py")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="for paged worlds, the megabytes of regions to keep in memory")
+    parser.add_argument("--save", metavar="FILE",
+                        help="continue the game saved in FILE if there is one, and keep saving it after every command")
+    parser.add_argument("--record", metavar="FILE", help="record every command to FILE, to replay with replay.py")
+    parser.add_argument("--metrics", metavar="FILE", help="export command metrics to FILE")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=EXPORT_INTERVAL,
+                        help="seconds between metrics exports")
+    parser.add_argument("--telemetry", metavar="FILE", help="save every command and its events to the SQLite "
+                                                            "database FILE")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="write how long importing, loading the world and creating the game took, then exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup(args, time.perf_counter() - started, sys.stdout)
+        return
+    metrics = None
+    if args.metrics:
+        metrics = Metrics(args.metrics, args.metrics_format, args.metrics_interval)
+    sink = None
+    if args.telemetry:
+        # Imported here, since sqlite3 takes a while to import and most games don't save telemetry.
+        import telemetry
+        sink = telemetry.TelemetrySink(args.telemetry)
+    if args.memory_budget is not None:
+        world.get_template(args.world, args.memory_budget << 20)
+    clock = time.localtime if args.script is None and not args.batch else lambda: SCRIPT_CLOCK
+    rp = Game(args.seed, args.world, metrics, sink, clock)
+    if args.save is not None:
+        if os.path.exists(args.save):
+            try:
+                rp.load(args.save)
+            except ValueError as error:
+                parser.error(f"can't continue {args.save}: {error}")
+            if not rp.is_running():
+                # The saved game is over, so a new one is started in its place.
+                rp = Game(args.seed, args.world, metrics, sink, clock)
+        rp.start_journal(args.save)
+    if args.record is not None:
+        rp.start_recording(args.record)
+    try:
+        run_game(rp, args)
+    finally:
+        if args.save is not None:
+            rp.save(args.save)
+            rp.stop_journal()
+        rp.stop_recording()
+        if metrics is not None:
+            metrics.export()
+        if sink is not None:
+            sink.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+"""Class RoomViews, the text look prints for each room, kept until the room changes.
+
+Describing a room walks its items, its NPCs and every one of its exits, and names the neighbors that were
+visited. Players look far more often than a room changes, so the lines are built once per room and reused
+until the room's items, NPCs or exits change (WorldState.versions counts those for the rooms kept here) or one
+of the neighbors that hadn't been visited when the lines were built is visited. Text that never changes, like the help, is built
+once when the module is imported.
+
+Lines that tell the time on the wall clock are ClockText, which output_crc leaves out, so a recorded command
+that printed the time is replayed as the same command a second later."""
+
+import zlib
+from collections import OrderedDict
+from typing import *
+import world
+
+MAX_VIEWS = 64
+HELP_TEXT = ("Valid commands are:\n"
+             "\n- help"
+             "\n- ?"
+             "\n- talk (put the npc name you want to talk to after this word. Ex: talk elf)"
+             "\n- meet (put the npc name you want to talk to after this word. Ex: meet elf)"
+             "\n- take (put the item name you want to take after this word. Ex: take pepsi)"
+             "\n- give (put the item name you want to give/drop after this word. Ex: give pepsi)"
+             "\n- go (put the direction you want to go after this word. Ex: go North)"
+             "\n- items (lists the items you currently are holding)"
+             "\n- look (allows you to see what is around you)"
+             "\n- quit"
+             "\n - q"
+             "\n- rob"
+             "\n- teleport"
+             "\n- travel (put the location name you want to travel to after this word. Ex: travel dark cave)"
+             "\n- n, s, e, w (go north, south, east or west)"
+             "\nCommands can be shortened (Ex: l for look) and several can be typed at once (Ex: take pepsi; go west)")
+
+
+class ClockText(str):
+    """A line of output that tells the time on the wall clock, which is different every time it is printed."""
+    __slots__ = ()
+
+
+def output_crc(lines: List[str]) -> int:
+    """Returns the CRC-32 of the text of a command's output, without the lines that tell the time, as it is saved
+    in a recording."""
+    return zlib.crc32("\n".join(line for line in lines if type(line) is not ClockText).encode())
+
+
+class RoomView:
+    """The lines that describe one room, and what they depend on.
+
+    Attributes:
+        version (int): The version of the room in WorldState.versions when the lines were built.
+        visits (int): WorldState.visits when the unvisited neighbors were last checked.
+        unvisited (list[int]): The neighbors that hadn't been visited when the lines were built.
+        lines (tuple[str, ...]): The lines look prints for the room.
+    """
+    __slots__ = ("version", "visits", "unvisited", "lines")
+
+    def __init__(self, version: int, visits: int, unvisited: List[int], lines: Tuple[str, ...]):
+        """Initializes class RoomView with the values from the input parameters."""
+        self.version = version
+        self.visits = visits
+        self.unvisited = unvisited
+        self.lines = lines
+
+
+class RoomViews:
+    """The look text of the rooms of one game, in a bounded cache.
+
+    Attributes:
+        state (WorldState): The state of the game the rooms belong to.
+        views (OrderedDict[int, RoomView]): The views keyed by location index, least recently used first.
+        max_views (int): The number of views to keep.
+        builds (int): The number of times the lines of a room were built.
+    """
+    def __init__(self, state: world.WorldState, max_views: int = MAX_VIEWS):
+        """Initializes class RoomViews with no views for the given state."""
+        self.state = state
+        self.views = OrderedDict()
+        self.max_views = max_views
+        self.builds = 0
+
+    def lines(self, location: int) -> Tuple[str, ...]:
+        """Returns the lines that describe the location at index location, building them only if the room
+        changed since they were last built. The neighbors are only checked when a location was visited since
+        they were last checked."""
+        state = self.state
+        view = self.views.get(location)
+        if view is not None and view.version == state.versions.get(location, 0):
+            if view.visits != state.visits:
+                visited = state.visited
+                if not any(neighbor in visited for neighbor in view.unvisited):
+                    view.visits = state.visits
+            if view.visits == state.visits:
+                self.views.move_to_end(location)
+                return view.lines
+        view = self._build(location)
+        self.views[location] = view
+        self.views.move_to_end(location)
+        if len(self.views) > self.max_views:
+            state.unwatch(self.views.popitem(last=False)[0])
+        return view.lines
+
+    def _build(self, location: int) -> RoomView:
+        """Builds the lines that describe the location at index location."""
+        self.builds += 1
+        state = self.state
+        template = state.template
+        lines = [f"\nYou are located in: {state.location(location)}", "\nYou see:"]
+        items = state.items_at(location)
+        if not items:
+            lines.append("No items here of use.")
+        lines.extend(f"- {item}" for item in items)
+        lines.append("\nand")
+        npcs = state.npcs.at(location)
+        if not npcs:
+            lines.append("You are alone.")
+        lines.extend(state.npc(npc).get_name() for npc in npcs)
+        lines.append("\nFrom here you may go:")
+        unvisited = []
+        for direction, neighbor in state.exits_of(location).items():
+            if neighbor in state.visited:
+                lines.append(f"- {direction} - {template.location_names[neighbor]} - "
+                             f"{template.location_descriptions[neighbor]}")
+            else:
+                lines.append(f"- {direction}")
+                unvisited.append(neighbor)
+        return RoomView(state.watch(location), state.visits, unvisited, tuple(lines))
@@ -0,0 +1,321 @@
+"""Recording of game sessions and a replay engine that plays them back exactly.
+
+A recording holds every command a game ran, in order, and every so often a checkpoint: a snapshot of the
+whole session, random number generator included, in the same format snapshot.py saves games in. The
+first checkpoint is written when the recording starts, so a recording never needs the seed the game
+was started with, and teleporting and robbing draw the same numbers again when it is replayed.
+
+Each command is saved with the number of random numbers it drew and the CRC-32 of the text it printed,
+without the time help tells (see render.output_crc).
+Replaying checks both after every command and stops with a ReplayError at the first command that did
+something different, which happens when the world file or the game's code changed since the recording.
+
+To get to turn N a Replayer starts at the last checkpoint at or before N and only runs the commands
+after it, so seeking costs at most checkpoint_every commands however long the recording is.
+
+A paged world only moves the NPCs of the player's region, so a recording also saves the size of the regions
+NPCs wander in, and is refused by a world where they wander differently, such as a paged copy of the world it
+was recorded in.
+
+Recording format, little endian:
+    HEADER (magic, version, length of the JSON info), then the JSON info
+    {"world": path, "checkpoint_every": n, "wander_region": n},
+    then records, each RECORD (kind, length, CRC-32) and then its data:
+    COMMAND: COMMAND_INFO (random numbers drawn, CRC-32 of the output) and then the command line in UTF-8.
+    CHECKPOINT: a snapshot in the snapshot.py format.
+    A record that was cut short or doesn't match its CRC ends the recording.
+
+Usage:
+    python project2game.py --record session.rec
+    python replay.py session.rec [--seek N] [--to N] [--format text|json] [--quiet]"""
+
+import argparse
+import bisect
+import json
+import mmap
+import struct
+import sys
+import time
+import zlib
+from typing import *
+from project2game import Game, Result
+from render import output_crc
+import snapshot
+import world
+
+RECORDING_VERSION = 2
+RECORDING_MAGIC = b"ZREC"
+# A checkpoint is written after this many commands.
+CHECKPOINT_EVERY = 1000
+# magic, version, length of the JSON info
+HEADER = struct.Struct("<4sHI")
+# kind, length, CRC-32
+RECORD = struct.Struct("<BII")
+# random numbers drawn, CRC-32 of the output
+COMMAND_INFO = struct.Struct("<II")
+COMMAND = 1
+CHECKPOINT = 2
+
+
+class ReplayError(Exception):
+    """Raised when a replayed command didn't do what it did when it was recorded."""
+
+
+class Recording:
+    """A recording being written, one record per command.
+
+    Attributes:
+        path (str): The recording file.
+        world_path (str): The world file the game plays in.
+        checkpoint_every (int): The number of commands after which the game writes a checkpoint, 0 for never.
+        wander_region (int): The number of locations in each region whose NPCs only wander while the player is in
+            it, 0 if they wander everywhere.
+        records (int): The number of commands recorded since the last checkpoint.
+        last_draws (int): The number of random numbers the game had drawn at the last record.
+        file (BinaryIO): The open recording file.
+    """
+    def __init__(self, path: str, world_path: str, checkpoint_every: int = CHECKPOINT_EVERY, wander_region: int = 0):
+        """Initializes class Recording by creating the file and writing its header.
+
+        Params:
+            path (str): The recording file, replaced if it exists.
+            world_path (str): The world file the game plays in, which replaying loads again.
+            checkpoint_every (int): The number of commands between checkpoints, 0 for only the first one.
+            wander_region (int): The wander_region of the world's template."""
+        self.path = path
+        self.world_path = world_path
+        self.checkpoint_every = checkpoint_every
+        self.wander_region = wander_region
+        self.records = 0
+        self.last_draws = 0
+        info = json.dumps({"world": world_path, "checkpoint_every": checkpoint_every,
+                           "wander_region": wander_region}).encode()
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, len(info)))
+        self.file.write(info)
+
+    def _write(self, kind: int, data: bytes) -> None:
+        """Writes one record and flushes it, so a game that crashes leaves every command it finished."""
+        self.file.write(RECORD.pack(kind, len(data), zlib.crc32(data)))
+        self.file.write(data)
+        self.file.flush()
+
+    def checkpoint(self, saved: snapshot.SessionSnapshot, draws: int) -> None:
+        """Writes a checkpoint.
+
+        Params:
+            saved (SessionSnapshot): A snapshot of the game after its last recorded command.
+            draws (int): The number of random numbers the game had drawn when the snapshot was taken."""
+        self._write(CHECKPOINT, saved.to_bytes())
+        self.records = 0
+        self.last_draws = draws
+
+    def record(self, command_line: str, draws: int, crc: int) -> None:
+        """Writes the record of one command.
+
+        Params:
+            command_line (str): The line the command was run with.
+            draws (int): The number of random numbers the game has drawn, counting this command's.
+            crc (int): The CRC-32 of the command's output, from output_crc."""
+        self._write(COMMAND, COMMAND_INFO.pack(draws - self.last_draws, crc) + command_line.encode())
+        self.last_draws = draws
+        self.records += 1
+
+    def close(self) -> None:
+        """Closes the recording file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Replayer:
+    """Plays back a recording, from its start or from any turn in it.
+
+    Attributes:
+        path (str): The recording file.
+        world_path (str): The world file the commands are replayed in.
+        checkpoint_every (int): The number of commands between the recording's checkpoints.
+        checkpoints (list[int]): The turn of each checkpoint, in order.
+        offsets (list[int]): The offset in the file of each checkpoint.
+        first_turn (int): The turn the recording started at.
+        last_turn (int): The turn of the last command recorded.
+        data (mmap): The recording file mapped into memory.
+    """
+    def __init__(self, path: str, world_path: Optional[str] = None):
+        """Initializes class Replayer by reading where the checkpoints of a recording are.
+
+        Params:
+            path (str): The recording file.
+            world_path (str): The world file to replay in, None for the one the recording was made in.
+
+        Raises:
+            ValueError: If the file isn't a recording of this version or has no checkpoint, or if NPCs wander
+                differently in the world to replay in than in the one it was recorded in."""
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a recording")
+        magic, version, info_length = HEADER.unpack_from(self.data, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a recording of version {RECORDING_VERSION}")
+        info = json.loads(bytes(self.data[HEADER.size:HEADER.size + info_length]))
+        self.world_path = info["world"] if world_path is None else world_path
+        self.checkpoint_every = info["checkpoint_every"]
+        snapshot.check_wander_region(info["wander_region"], world.get_template(self.world_path))
+        self.checkpoints = []
+        self.offsets = []
+        turn = None
+        for kind, data, offset in self._records(HEADER.size + info_length):
+            if kind == CHECKPOINT:
+                turn = snapshot.HEADER.unpack_from(data, 0)[3]
+                self.checkpoints.append(turn)
+                self.offsets.append(offset)
+            elif turn is not None:
+                turn += 1
+        if not self.checkpoints:
+            raise ValueError(f"{path} has no checkpoint")
+        self.first_turn = self.checkpoints[0]
+        self.last_turn = turn
+
+    def _records(self, offset: int) -> Iterator[Tuple[int, bytes, int]]:
+        """Yields the kind, data and offset of every record from offset on, up to the first one that was cut
+        short or is damaged."""
+        data = self.data
+        size = len(data)
+        while offset + RECORD.size <= size:
+            kind, length, crc = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            end = start + length
+            if end > size:
+                return
+            record = data[start:end]
+            if zlib.crc32(record) != crc:
+                return
+            yield kind, record, offset
+            offset = end
+
+    def get_turns(self) -> int:
+        """Returns the number of commands in the recording."""
+        return self.last_turn - self.first_turn
+
+    def _replay(self, from_turn: int, to_turn: int) -> Iterator[Tuple[Game, str, Result]]:
+        """Starts a game at the last checkpoint at or before from_turn and runs the recorded commands after it
+        up to to_turn, checking each one. Yields the game with no line or result once it is at the checkpoint,
+        then the game, line and result of each command after from_turn.
+
+        Raises:
+            ValueError: If from_turn isn't in the recording.
+            ReplayError: If a command drew a different number of random numbers or printed something else."""
+        if not self.first_turn <= from_turn <= self.last_turn:
+            raise ValueError(f"turn {from_turn} is not between {self.first_turn} and {self.last_turn}")
+        index = bisect.bisect_right(self.checkpoints, from_turn) - 1
+        records = self._records(self.offsets[index])
+        game = Game(0, self.world_path)
+        game.restore(snapshot.SessionSnapshot.from_bytes(next(records)[1]))
+        yield game, "", None
+        turn = game.get_turns()
+        for kind, data, _ in records:
+            if turn >= to_turn:
+                return
+            if kind != COMMAND:
+                continue
+            draws, crc = COMMAND_INFO.unpack_from(data, 0)
+            line = data[COMMAND_INFO.size:].decode()
+            before = game.get_draws()
+            result = game.execute(line)
+            turn += 1
+            if game.get_draws() - before != draws:
+                raise ReplayError(f"turn {turn}: {line!r} drew {game.get_draws() - before} random numbers"
+                                  f" instead of {draws}")
+            if output_crc(result.lines) != crc:
+                raise ReplayError(f"turn {turn}: {line!r} printed something else than when it was recorded")
+            if turn > from_turn:
+                yield game, line, result
+
+    def seek(self, turn: int) -> Game:
+        """Returns a game in the state it was in after the given turn of the recording.
+
+        Only the commands after the last checkpoint at or before the turn are run.
+
+        Raises:
+            ValueError: If the turn isn't in the recording.
+            ReplayError: If a command didn't do what it did when it was recorded."""
+        replayed = self._replay(turn, turn)
+        game = next(replayed)[0]
+        for _ in replayed:
+            pass
+        return game
+
+    def replay(self, from_turn: Optional[int] = None, to_turn: Optional[int] = None) \
+            -> Iterator[Tuple[int, str, Result]]:
+        """Replays the recording and yields the turn, line and result of every command after from_turn.
+
+        Params:
+            from_turn (int): The turn to start after, None for the start of the recording.
+            to_turn (int): The last turn to replay, None for the end of the recording.
+
+        Raises:
+            ValueError: If from_turn isn't in the recording.
+            ReplayError: If a command didn't do what it did when it was recorded."""
+        from_turn = self.first_turn if from_turn is None else from_turn
+        to_turn = self.last_turn if to_turn is None else to_turn
+        replayed = self._replay(from_turn, to_turn)
+        next(replayed)
+        for game, line, result in replayed:
+            yield game.get_turns(), line, result
+
+    def close(self) -> None:
+        """Unmaps the recording file."""
+        self.data.close()
+
+
+def main():
+    """Function that replays a recording and writes what each command printed, or only checks it."""
+    parser = argparse.ArgumentParser(description="Replay a recorded game.")
+    parser.add_argument("recording", help="the recording file, written by project2game.py --record")
+    parser.add_argument("--world", metavar="FILE", help="the world file to replay in instead of the recorded one")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="for paged worlds, the megabytes of regions to keep in memory")
+    parser.add_argument("--seek", type=int, metavar="N", help="start after turn N instead of at the start")
+    parser.add_argument("--to", type=int, metavar="N", help="stop after turn N instead of at the end")
+    parser.add_argument("--format", choices=["text", "json"], default="text", help="how results are written")
+    parser.add_argument("--quiet", action="store_true", help="only check the recording and print how long it took")
+    args = parser.parse_args()
+    try:
+        replayer = Replayer(args.recording, args.world)
+    except ValueError as error:
+        sys.exit(f"Can't replay {args.recording}: {error}")
+    first, last = replayer.first_turn, replayer.last_turn
+    for option, turn in (("--seek", args.seek), ("--to", args.to)):
+        if turn is not None and not first <= turn <= last:
+            replayer.close()
+            parser.error(f"{option} {turn} is not a turn of the recording, which has turns {first} to {last}")
+    if args.seek is not None and args.to is not None and args.to < args.seek:
+        replayer.close()
+        parser.error(f"--to {args.to} is before --seek {args.seek}")
+    if args.memory_budget is not None:
+        world.get_template(replayer.world_path, args.memory_budget << 20)
+    start = time.perf_counter()
+    turns = 0
+    try:
+        for turn, line, result in replayer.replay(args.seek, args.to):
+            turns += 1
+            if args.quiet:
+                continue
+            if args.format == "json":
+                print(json.dumps({"turn": turn, "command": line, "valid": result.valid, "lines": result.lines,
+                                  "events": result.events, "game_over": result.game_over}))
+            elif result.lines:
+                print(result.get_text())
+    except ReplayError as error:
+        sys.exit(f"Replay diverged at {error}")
+    finally:
+        replayer.close()
+    if args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {turns} commands in {elapsed:.3f}s ({turns / elapsed if elapsed else 0:.0f} per second)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Class RouteGraph, shortest paths between the locations of a world.
+
+The exits of every location are compiled into integer arrays in CSR form: the exits of location i are
+entries offsets[i] to offsets[i + 1] of the targets and directions arrays. A shortest path query runs a
+breadth first search backwards from the destination, which gives the next move towards that
+destination from every location at once. Those search trees are kept in a bounded cache, so after the
+first query for a destination every other query for it only follows the stored next moves."""
+
+import heapq
+from array import array
+from collections import OrderedDict
+from typing import *
+
+MAX_CACHED_TREES = 16
+
+
+class RouteTree:
+    """The result of one backwards breadth first search from a destination.
+
+    Attributes:
+        target (int): The index of the destination.
+        distance (array[int]): The number of moves from each location to the destination, -1 if there is no path.
+        next_location (array[int]): The location to move to next from each location.
+        next_direction (array[int]): The index of the direction to move in next from each location.
+    """
+    __slots__ = ("target", "distance", "next_location", "next_direction")
+
+    def __init__(self, target: int, distance: array, next_location: array, next_direction: array):
+        """Initializes class RouteTree with the values from the input parameters."""
+        self.target = target
+        self.distance = distance
+        self.next_location = next_location
+        self.next_direction = next_direction
+
+
+class RouteGraph:
+    """The exits of a world as an integer graph, with cached shortest paths.
+
+    Attributes:
+        num_locations (int): The number of locations in the graph.
+        direction_names (list[str]): The name of each direction index.
+        reverse_offsets (array[int]): The exits leading into location i are entries reverse_offsets[i] to
+            reverse_offsets[i + 1] of reverse_sources and reverse_directions.
+        reverse_sources (array[int]): The location each exit leaves from.
+        reverse_directions (array[int]): The direction index of each exit.
+        extra_exits (dict[int, list[tuple[int, int]]]): Exits added after the graph was compiled, keyed by the
+            location they lead to, as (source location, direction index) pairs.
+        trees (OrderedDict[int, RouteTree]): The cached search trees keyed by destination, least recently
+            used first.
+        max_trees (int): The number of search trees to keep.
+    """
+    def __init__(self, num_locations: int, offsets: Sequence[int], targets: Sequence[int],
+                 directions: Sequence[int], direction_names: Sequence[str], max_trees: int = MAX_CACHED_TREES):
+        """Initializes class RouteGraph from the exits in CSR form.
+
+        Params:
+            num_locations (int): The number of locations.
+            offsets (Sequence[int]): The exits of location i are entries offsets[i] to offsets[i + 1] of
+                targets and directions.
+            targets (Sequence[int]): The location each exit leads to.
+            directions (Sequence[int]): The direction index of each exit.
+            direction_names (Sequence[str]): The name of each direction index.
+            max_trees (int): The number of search trees to keep in the cache."""
+        self.num_locations = num_locations
+        self.direction_names = list(direction_names)
+        self._direction_index = {name: index for index, name in enumerate(self.direction_names)}
+        counts = array("l", [0]) * (num_locations + 1)
+        for target in targets:
+            counts[target + 1] += 1
+        for location in range(num_locations):
+            counts[location + 1] += counts[location]
+        self.reverse_offsets = counts
+        fill = array("l", counts)
+        self.reverse_sources = array("l", [0]) * len(targets)
+        self.reverse_directions = array("l", [0]) * len(targets)
+        for source in range(num_locations):
+            for exit in range(offsets[source], offsets[source + 1]):
+                slot = fill[targets[exit]]
+                fill[targets[exit]] += 1
+                self.reverse_sources[slot] = source
+                self.reverse_directions[slot] = directions[exit]
+        self.extra_exits = {}
+        self.trees = OrderedDict()
+        self.max_trees = max_trees
+
+    @classmethod
+    def from_reverse(cls, num_locations: int, reverse_offsets: Sequence[int], reverse_sources: Sequence[int],
+                     reverse_directions: Sequence[int], direction_names: Sequence[str],
+                     max_trees: int = MAX_CACHED_TREES) -> 'RouteGraph':
+        """Returns a graph of exits that were already compiled backwards, such as the reverse arrays of another
+        graph. The arrays are used as they are, so they can be read only views of memory shared between processes.
+
+        Params:
+            num_locations (int): The number of locations.
+            reverse_offsets (Sequence[int]): The exits leading into location i are entries reverse_offsets[i] to
+                reverse_offsets[i + 1] of reverse_sources and reverse_directions.
+            reverse_sources (Sequence[int]): The location each exit leaves from.
+            reverse_directions (Sequence[int]): The direction index of each exit.
+            direction_names (Sequence[str]): The name of each direction index.
+            max_trees (int): The number of search trees to keep in the cache."""
+        graph = cls.__new__(cls)
+        graph.num_locations = num_locations
+        graph.direction_names = list(direction_names)
+        graph._direction_index = {name: index for index, name in enumerate(graph.direction_names)}
+        graph.reverse_offsets = reverse_offsets
+        graph.reverse_sources = reverse_sources
+        graph.reverse_directions = reverse_directions
+        graph.extra_exits = {}
+        graph.trees = OrderedDict()
+        graph.max_trees = max_trees
+        return graph
+
+    def copy(self) -> 'RouteGraph':
+        """Returns a graph that shares the compiled arrays and cached trees of this one, but can have its own
+        exits added without changing this graph."""
+        copy = RouteGraph.__new__(RouteGraph)
+        copy.num_locations = self.num_locations
+        copy.direction_names = list(self.direction_names)
+        copy._direction_index = dict(self._direction_index)
+        copy.reverse_offsets = self.reverse_offsets
+        copy.reverse_sources = self.reverse_sources
+        copy.reverse_directions = self.reverse_directions
+        copy.extra_exits = {target: list(exits) for target, exits in self.extra_exits.items()}
+        copy.trees = OrderedDict(self.trees)
+        copy.max_trees = self.max_trees
+        return copy
+
+    def add_exit(self, source: int, direction: str, target: int) -> None:
+        """Adds an exit to the graph and drops only the cached trees it makes out of date.
+
+        A new exit from source to target only changes the paths to a destination if target can reach the
+        destination and the exit makes source closer to it than it was.
+
+        Params:
+            source (int): The index of the location the exit leaves from.
+            direction (str): The direction of the exit.
+            target (int): The index of the location the exit leads to."""
+        direction_index = self._direction_index.get(direction)
+        if direction_index is None:
+            direction_index = self._direction_index[direction] = len(self.direction_names)
+            self.direction_names.append(direction)
+        self.extra_exits.setdefault(target, []).append((source, direction_index))
+        for destination, tree in list(self.trees.items()):
+            target_distance = tree.distance[target]
+            source_distance = tree.distance[source]
+            if target_distance >= 0 and (source_distance < 0 or target_distance + 1 < source_distance):
+                del self.trees[destination]
+
+    def tree(self, target: int) -> RouteTree:
+        """Returns the search tree for the destination at index target, searching only if it isn't cached."""
+        tree = self.trees.get(target)
+        if tree is not None:
+            self.trees.move_to_end(target)
+            return tree
+        tree = self._search(target)
+        self.trees[target] = tree
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return tree
+
+    def _search(self, target: int) -> RouteTree:
+        """Runs a breadth first search backwards from target over every exit that leads into a location."""
+        distance = array("l", [-1]) * self.num_locations
+        next_location = array("l", [-1]) * self.num_locations
+        next_direction = array("l", [-1]) * self.num_locations
+        offsets, sources, directions, extra_exits = (self.reverse_offsets, self.reverse_sources,
+                                                     self.reverse_directions, self.extra_exits)
+        distance[target] = 0
+        queue = [target]
+        for location in queue:
+            steps = distance[location] + 1
+            for exit in range(offsets[location], offsets[location + 1]):
+                source = sources[exit]
+                if distance[source] < 0:
+                    distance[source] = steps
+                    next_location[source] = location
+                    next_direction[source] = directions[exit]
+                    queue.append(source)
+            if extra_exits:
+                for source, direction in extra_exits.get(location, ()):
+                    if distance[source] < 0:
+                        distance[source] = steps
+                        next_location[source] = location
+                        next_direction[source] = direction
+                        queue.append(source)
+        return RouteTree(target, distance, next_location, next_direction)
+
+    def cheapest(self, costs: Dict[int, int]) -> array:
+        """Returns, for every location, the fewest moves to one of the given locations plus that location's cost,
+        or -1 if none of them can be reached.
+
+        It runs Dijkstra's algorithm backwards from all of the given locations at once, each starting at its cost.
+
+        Params:
+            costs (dict[int, int]): The cost of ending at each location that can be ended at."""
+        distance = array("l", [-1]) * self.num_locations
+        offsets, sources, extra_exits = self.reverse_offsets, self.reverse_sources, self.extra_exits
+        queue = [(cost, location) for location, cost in costs.items()]
+        heapq.heapify(queue)
+        while queue:
+            steps, location = heapq.heappop(queue)
+            if distance[location] >= 0:
+                continue
+            distance[location] = steps
+            steps += 1
+            for exit in range(offsets[location], offsets[location + 1]):
+                if distance[sources[exit]] < 0:
+                    heapq.heappush(queue, (steps, sources[exit]))
+            for source, direction in extra_exits.get(location, ()):
+                if distance[source] < 0:
+                    heapq.heappush(queue, (steps, source))
+        return distance
+
+    def distance(self, source: int, target: int) -> int:
+        """Returns the smallest number of moves from source to target, or -1 if target can't be reached."""
+        return self.tree(target).distance[source]
+
+    def path(self, source: int, target: int) -> Optional[List[Tuple[str, int]]]:
+        """Returns the shortest path from source to target.
+
+        Returns:
+            path (list[tuple[str, int]]): The direction of each move and the index of the location it leads to,
+                or None if target can't be reached."""
+        tree = self.tree(target)
+        if tree.distance[source] < 0:
+            return None
+        path = []
+        location = source
+        while location != target:
+            path.append((self.direction_names[tree.next_direction[location]], tree.next_location[location]))
+            location = tree.next_location[location]
+        return path
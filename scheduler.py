@@ -0,0 +1,167 @@
+"""A hierarchical timer wheel that wakes the NPCs and timed events of a world when they are due.
+
+Time in a game is counted in ticks, one for every command, so a timer that is due at tick N goes off at the end
+of the game's Nth command. A timer is a key, which says what to do when it goes off, and the tick it is due at.
+Only the timers that are due are looked at, however many timers are waiting.
+
+The wheel has WHEEL_LEVELS levels of WHEEL_SIZE slots. Level 0 has one slot for each of the next WHEEL_SIZE
+ticks, and every level above has slots WHEEL_SIZE times as wide as the level below. A timer is put in the lowest
+level whose slots are wide enough to reach its tick. When the wheel turns past the last slot of a level, the
+timers in the next slot of the level above are put back into the levels below, closer to their tick. Scheduling
+and cancelling a timer are O(1), and a timer moves down at most once per level, so a tick costs O(1) amortized
+plus the timers that go off. Timers further away than the top level reaches wait in an overflow set, which is
+only looked at when the top level turns.
+
+The key of a timer is made by timer_key from what kind of timer it is and the index of its NPC or event:
+    WANDER: the NPC moves to a random neighboring location.
+    RESTOCK: a robbed NPC gets its prize food back.
+    EVENT: the timed event of the world file is announced."""
+
+from typing import *
+
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 4
+# The number of ticks the levels reach, timers further away than this wait in the overflow set.
+WHEEL_SPAN = 1 << (WHEEL_BITS * WHEEL_LEVELS)
+
+# The kinds of timers, stored in the lowest KIND_BITS bits of a timer key.
+WANDER = 0
+RESTOCK = 1
+EVENT = 2
+KIND_BITS = 2
+
+
+def timer_key(kind: int, index: int) -> int:
+    """Returns the key of the timer of the given kind for the NPC or event at index."""
+    return index << KIND_BITS | kind
+
+
+def timer_kind(key: int) -> int:
+    """Returns the kind of the timer with the given key."""
+    return key & ((1 << KIND_BITS) - 1)
+
+
+def timer_index(key: int) -> int:
+    """Returns the index of the NPC or event of the timer with the given key."""
+    return key >> KIND_BITS
+
+
+class TimerWheel:
+    """A set of timers, each due at a tick, that returns the timers that are due as the ticks go by.
+
+    Attributes:
+        now (int): The tick the wheel is at. Every timer is due after it.
+        due (dict[int, int]): The tick each timer is due at, keyed by the timer's key.
+        slots (list[dict[int, set[int]]]): For each level, the keys of the timers in each slot that has any,
+            keyed by the number of the slot.
+        overflow (set[int]): The keys of the timers too far away for the top level.
+        cascaded (int): The number of times a timer was moved down to a lower level.
+    """
+    def __init__(self, now: int = 0, timers: Iterable[Tuple[int, int]] = ()):
+        """Initializes class TimerWheel.
+
+        Params:
+            now (int): The tick the wheel starts at.
+            timers (Iterable[tuple[int, int]]): The key and tick of timers to schedule, each after now."""
+        self.now = now
+        self.due = {}
+        self.slots = [{} for _ in range(WHEEL_LEVELS)]
+        self.overflow = set()
+        self.cascaded = 0
+        for key, tick in timers:
+            self.schedule(key, tick)
+
+    def __len__(self) -> int:
+        """Returns the number of timers waiting."""
+        return len(self.due)
+
+    def __contains__(self, key: object) -> bool:
+        """Returns True if the timer with the given key is waiting."""
+        return key in self.due
+
+    def get(self, key: int) -> Optional[int]:
+        """Returns the tick the timer with the given key is due at, or None if it isn't waiting."""
+        return self.due.get(key)
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        """Returns the key and tick of every waiting timer."""
+        return self.due.items()
+
+    def _slot_of(self, tick: int) -> Tuple[int, int]:
+        """Returns the level and slot a timer due at tick belongs in, or WHEEL_LEVELS and 0 for the overflow set."""
+        now = self.now
+        for level in range(WHEEL_LEVELS):
+            shift = WHEEL_BITS * (level + 1)
+            if tick >> shift == now >> shift:
+                return level, (tick >> (shift - WHEEL_BITS)) & WHEEL_MASK
+        return WHEEL_LEVELS, 0
+
+    def _place(self, key: int, tick: int) -> None:
+        """Puts a timer in the slot it belongs in."""
+        level, slot = self._slot_of(tick)
+        if level == WHEEL_LEVELS:
+            self.overflow.add(key)
+            return
+        keys = self.slots[level].get(slot)
+        if keys is None:
+            keys = self.slots[level][slot] = set()
+        keys.add(key)
+
+    def schedule(self, key: int, tick: int) -> None:
+        """Schedules a timer, moving it if it was already waiting.
+
+        Params:
+            key (int): The key of the timer, from timer_key.
+            tick (int): The tick the timer is due at.
+
+        Raises:
+            ValueError: If the tick isn't after the tick the wheel is at."""
+        if tick <= self.now:
+            raise ValueError(f"A timer can't be due at tick {tick}, the wheel is already at tick {self.now}")
+        if key in self.due:
+            self.cancel(key)
+        self.due[key] = tick
+        self._place(key, tick)
+
+    def cancel(self, key: int) -> bool:
+        """Removes a timer. Returns False if it wasn't waiting."""
+        tick = self.due.pop(key, None)
+        if tick is None:
+            return False
+        level, slot = self._slot_of(tick)
+        if level == WHEEL_LEVELS:
+            self.overflow.discard(key)
+            return True
+        keys = self.slots[level][slot]
+        keys.discard(key)
+        if not keys:
+            del self.slots[level][slot]
+        return True
+
+    def advance(self) -> List[int]:
+        """Moves the wheel on by one tick and returns the keys of the timers due at it, in order. The timers
+        are removed from the wheel."""
+        now = self.now = self.now + 1
+        if not now & WHEEL_MASK:
+            if self.overflow and not now & (WHEEL_SPAN - 1):
+                waiting = self.overflow
+                self.overflow = set()
+                for key in waiting:
+                    self._place(key, self.due[key])
+            for level in range(WHEEL_LEVELS - 1, 0, -1):
+                if not now & ((1 << (WHEEL_BITS * level)) - 1):
+                    keys = self.slots[level].pop((now >> (WHEEL_BITS * level)) & WHEEL_MASK, None)
+                    if keys:
+                        self.cascaded += len(keys)
+                        for key in keys:
+                            self._place(key, self.due[key])
+        keys = self.slots[0].pop(now & WHEEL_MASK, None)
+        if not keys:
+            return []
+        due = self.due
+        for key in keys:
+            del due[key]
+        # Sorted, so timers go off in the same order after a game is saved and loaded again.
+        return sorted(keys)
@@ -0,0 +1,216 @@
+"""Asyncio server that lets many players play the game at the same time.
+
+Every TCP connection gets its own Game instance and talks to it one line at a time, the same way
+the console version does. Connect with telnet or netcat, or load test it with load_client.py.
+
+With --workers the games run in that many worker processes instead, see sharded_server.py.
+
+Usage:
+    python server.py [--host HOST] [--port PORT] [--world FILE] [--idle-timeout SECONDS] [--metrics FILE]
+                     [--telemetry FILE]
+    python server.py --workers N [--host HOST] [--port PORT] [--world FILE] [--memory-budget MB] [--telemetry FILE]"""
+
+import argparse
+import asyncio
+import socket
+from typing import *
+from project2game import Game, INTRO_TEXT, PROMPT
+from metrics import EXPORT_INTERVAL, Metrics
+import world_loader
+
+IDLE_TIMEOUT = 300.0
+WRITE_TIMEOUT = 30.0
+WRITE_BUFFER_HIGH = 64 * 1024
+MAX_LINE = 4096
+BACKLOG = 4096
+
+
+class GameServer:
+    """Class that accepts connections and runs one game session per connection.
+
+    Attributes:
+        host (str): The address the server listens on.
+        port (int): The port the server listens on.
+        idle_timeout (float): Seconds a session may go without sending a command before it is closed.
+        write_timeout (float): Seconds a session may wait for a slow client to read its output.
+        sessions (int): The number of sessions that are currently connected.
+        server (asyncio.Server): The running asyncio server, None until start is called.
+        metrics (Metrics): Where every session records its command metrics, None to record nothing.
+        world_path (str): The world file every session plays in.
+        telemetry (TelemetrySink): Where every session saves its commands and events, None to save nothing.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 4000, idle_timeout: float = IDLE_TIMEOUT,
+                 write_timeout: float = WRITE_TIMEOUT, metrics: Optional[Metrics] = None,
+                 world_path: str = world_loader.DEFAULT_WORLD, telemetry: Optional['telemetry.TelemetrySink'] = None):
+        """Initializes class GameServer with the values from the input parameters."""
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.sessions = 0
+        self.server = None
+        self.metrics = metrics
+        self.world_path = world_path
+        self.telemetry = telemetry
+
+    async def start(self) -> None:
+        """Starts listening for connections. The port attribute is updated if port 0 was requested."""
+        self.server = await asyncio.start_server(self.handle_session, self.host, self.port, limit=MAX_LINE,
+                                                 backlog=BACKLOG)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Starts the server and handles connections until the task is cancelled."""
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def serve_handoffs(self, control: socket.socket) -> None:
+        """Runs a session for every connection another process accepted and passed over control, until that
+        process closes its end, then waits for the sessions that are still running.
+
+        Params:
+            control (socket.socket): A Unix socket that receives one byte with one file descriptor per connection."""
+        loop = asyncio.get_running_loop()
+        closed = loop.create_future()
+        sessions = set()
+
+        def receive() -> None:
+            while True:
+                try:
+                    data, fds, _, _ = socket.recv_fds(control, 1, 1)
+                except BlockingIOError:
+                    return
+                except OSError:
+                    data, fds = b"", []
+                for fd in fds:
+                    session = loop.create_task(self.adopt(socket.socket(fileno=fd)))
+                    sessions.add(session)
+                    session.add_done_callback(sessions.discard)
+                if not data:
+                    loop.remove_reader(control.fileno())
+                    # The future was cancelled if the worker was stopped while it waited for it.
+                    if not closed.done():
+                        closed.set_result(None)
+                    return
+
+        control.setblocking(False)
+        loop.add_reader(control.fileno(), receive)
+        await closed
+        if sessions:
+            await asyncio.gather(*sessions, return_exceptions=True)
+
+    async def adopt(self, connection: socket.socket) -> None:
+        """Runs one game on a connection that was accepted somewhere else."""
+        try:
+            reader, writer = await asyncio.open_connection(sock=connection, limit=MAX_LINE)
+        except OSError:
+            connection.close()
+            return
+        await self.handle_session(reader, writer)
+
+    async def close(self) -> None:
+        """Stops accepting new connections."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def send(self, writer: asyncio.StreamWriter, text: str) -> None:
+        """Writes text to a client and waits for the client to catch up if its buffer is full.
+
+        Only the session of the slow client waits, every other session keeps running.
+
+        Raises:
+            asyncio.TimeoutError: If the client doesn't read its output within write_timeout seconds."""
+        writer.write(text.replace("\n", "\r\n").encode())
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def handle_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Runs one game for a single connection until the player quits, wins, idles or disconnects.
+
+        Params:
+            reader (asyncio.StreamReader): The stream the player's commands come from.
+            writer (asyncio.StreamWriter): The stream the game's output goes to."""
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        started = False
+        try:
+            # A world file that can't be loaded any more closes this connection, and the server keeps running.
+            game = Game(world_path=self.world_path, metrics=self.metrics, telemetry=self.telemetry)
+            self.sessions += 1
+            started = True
+            await self.send(writer, INTRO_TEXT + "\n" + game.execute("help").get_text() + "\n" + PROMPT)
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await self.send(writer, "\nYou fell asleep and the dragon found you. Goodbye.\n")
+                    break
+                if not line:
+                    break
+                result = game.execute(line.decode(errors="replace"))
+                if result.game_over:
+                    await self.send(writer, result.get_text() + "\n")
+                    break
+                await self.send(writer, result.get_text() + "\n" + PROMPT)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            if started:
+                self.sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def main():
+    """Function that parses the command line and runs the server."""
+    parser = argparse.ArgumentParser(description="Run the game as a multi player TCP server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--world", default=world_loader.DEFAULT_WORLD, help="the world file to play in")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="run the games in N worker processes that share the world")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="with --workers, the megabytes of world regions each worker keeps in memory")
+    parser.add_argument("--metrics", metavar="FILE", help="export command metrics to FILE")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=EXPORT_INTERVAL,
+                        help="seconds between metrics exports")
+    parser.add_argument("--telemetry", metavar="FILE", help="save every command and its events to the SQLite "
+                                                            "database FILE")
+    args = parser.parse_args()
+    if args.workers:
+        if args.metrics:
+            parser.error("--metrics can't be used with --workers")
+        # Imported here so a single process server doesn't need multiprocessing and shared memory.
+        import sharded_server
+        sharded_server.run(args.world, args.workers, args.host, args.port, args.memory_budget, args.idle_timeout,
+                           args.telemetry)
+        return
+    metrics = None
+    if args.metrics:
+        metrics = Metrics(args.metrics, args.metrics_format, args.metrics_interval)
+    sink = None
+    if args.telemetry:
+        # Imported here so servers that save no telemetry don't load sqlite3.
+        import telemetry
+        sink = telemetry.TelemetrySink(args.telemetry)
+    server = GameServer(args.host, args.port, args.idle_timeout, metrics=metrics, world_path=args.world,
+                        telemetry=sink)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.export()
+        if sink is not None:
+            sink.close()
+
+
+if __name__ == "__main__":
+    main()
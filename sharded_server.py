@@ -0,0 +1,448 @@
+"""A session server that runs its games in several worker processes, which share one copy of the world.
+
+One Python process only uses one core, so server.py --workers N starts a supervisor with N worker processes
+instead. The supervisor compiles the world into a paged world (see world_pages.py) and copies it, together
+with its exits compiled for shortest paths, into one multiprocessing.shared_memory block before it forks the
+workers, which inherit the block without opening it by name. Every worker reads regions straight out of that block through a read only memoryview and keeps only
+the regions it used recently, within its memory budget, so the memory of a worker depends on its budget and
+its sessions and not on the size of the world.
+
+The supervisor accepts every connection and passes its socket to one worker over a Unix socket pair. The
+worker is picked by consistent hashing of the client's address and port on a HashRing, so when a worker
+stops only the connections that would have gone to it go to other workers until it is started again. A
+worker that keeps stopping right after it starts is started again later and later, and left off the ring after
+MAX_QUICK_FAILURES tries.
+Every worker runs its sessions with a GameServer, the same way server.py does in a single process.
+
+Shared memory block format, in the byte order of the machine:
+    SHARED_HEADER (magic, length of the paged world, number of locations, number of exits), then the paged
+    world file padded to a multiple of 8 bytes, then the reverse_offsets, reverse_sources and
+    reverse_directions arrays of its RouteGraph as 8 byte integers.
+
+Usage:
+    python server.py --workers N [--world FILE] [--memory-budget MB] [--host HOST] [--port PORT]"""
+
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+from array import array
+from multiprocessing import shared_memory
+from typing import *
+from routing import RouteGraph
+from server import BACKLOG, GameServer, IDLE_TIMEOUT, WRITE_TIMEOUT
+import world
+import world_loader
+import world_pages
+
+SHARED_MAGIC = b"ZORKSHM1"
+# magic, length of the paged world, number of locations, number of exits
+SHARED_HEADER = struct.Struct("=8sQQQ")
+# The points each worker has on a HashRing. More points spread the connections more evenly.
+RING_POINTS = 128
+# Seconds a worker gets to stop before it is killed.
+STOP_TIMEOUT = 5.0
+# A worker that stops within QUICK_FAILURE seconds of starting failed quickly. It is started again after
+# RESTART_DELAY seconds, twice as long for every quick failure in a row, and left off the ring after
+# MAX_QUICK_FAILURES of them, since it will most likely keep failing while it starts.
+QUICK_FAILURE = 10.0
+RESTART_DELAY = 0.1
+MAX_QUICK_FAILURES = 5
+
+
+def shared_world_path(source_path: str) -> str:
+    """Returns the path games are started with to play in the shared copy of the world file at source_path. It
+    ends in PAGED_SUFFIX, since the shared copy is a paged world, but there doesn't have to be a file there."""
+    if source_path.endswith(world.PAGED_SUFFIX):
+        return source_path
+    return source_path + world.PAGED_SUFFIX
+
+
+def _ring_hash(key: str) -> int:
+    """Returns the position of key on a HashRing, a 64 bit hash that is the same in every process."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+class HashRing:
+    """Consistent hashing of keys onto workers.
+
+    Every worker has points_per_worker points on a ring of 64 bit hashes, and a key goes to the worker of the
+    first point at or after the hash of the key. Adding or removing a worker only moves the keys next to its
+    own points, about 1 / N of them, and every other key keeps going to the same worker.
+
+    Attributes:
+        points (list[int]): The hash of every point on the ring, sorted.
+        owners (list[int]): The worker of each point.
+        points_per_worker (int): The number of points each worker has.
+    """
+    def __init__(self, workers: Iterable[int] = (), points_per_worker: int = RING_POINTS):
+        """Initializes class HashRing with the points of the given workers."""
+        self.points = []
+        self.owners = []
+        self.points_per_worker = points_per_worker
+        for worker in workers:
+            self.add(worker)
+
+    def __len__(self) -> int:
+        """Returns the number of workers on the ring."""
+        return len(self.points) // self.points_per_worker
+
+    def __contains__(self, worker: object) -> bool:
+        """Returns True if the worker is on the ring."""
+        return worker in self.owners
+
+    def add(self, worker: int) -> None:
+        """Adds the points of a worker, unless it is already on the ring."""
+        if worker in self:
+            return
+        for number in range(self.points_per_worker):
+            point = _ring_hash(f"worker {worker} point {number}")
+            index = bisect.bisect_left(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, worker)
+
+    def remove(self, worker: int) -> None:
+        """Removes the points of a worker, if it is on the ring."""
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != worker]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def lookup(self, key: str, skipped: Container[int] = ()) -> int:
+        """Returns the worker the key goes to.
+
+        Params:
+            key (str): The key to look up.
+            skipped (Container[int]): Workers that can't take the key right now. The key goes to the next
+                worker on the ring instead, without moving any other key.
+
+        Raises:
+            LookupError: If there are no workers on the ring that aren't skipped."""
+        index = bisect.bisect_left(self.points, _ring_hash(key))
+        for offset in range(len(self.points)):
+            owner = self.owners[(index + offset) % len(self.points)]
+            if owner not in skipped:
+                return owner
+        raise LookupError("there are no workers on the ring")
+
+
+def _routes_start(pages_length: int) -> int:
+    """Returns where the route arrays start in a shared memory block holding a paged world of pages_length bytes."""
+    return SHARED_HEADER.size + (pages_length + 7) // 8 * 8
+
+
+class SharedWorld:
+    """A compiled world in a shared memory block, written once by the supervisor and only read by the workers.
+
+    Attributes:
+        world_path (str): The path games are started with to play in the shared world, from shared_world_path.
+        block (SharedMemory): The shared memory block.
+        pages_length (int): The length of the paged world file in the block.
+        num_locations (int): The number of locations in the world.
+        num_exits (int): The number of exits in the world.
+    """
+    def __init__(self, source_path: str, region_size: int = world_pages.DEFAULT_REGION_SIZE):
+        """Initializes class SharedWorld by compiling the world file into a paged world, unless it is one already,
+        and copying it and its routes into a new shared memory block.
+
+        Params:
+            source_path (str): The path of a JSON world file or of a paged world file.
+            region_size (int): The number of locations in each region, if the world file is compiled."""
+        self.world_path = shared_world_path(source_path)
+        with tempfile.TemporaryDirectory() as directory:
+            pages_path = source_path
+            if not source_path.endswith(world.PAGED_SUFFIX):
+                pages_path = os.path.join(directory, f"world{world.PAGED_SUFFIX}")
+                world_pages.compile_pages(source_path, pages_path, region_size)
+            routes = world_pages.PagedWorldTemplate(pages_path).get_routes()
+            self.pages_length = os.path.getsize(pages_path)
+            self.num_locations = routes.num_locations
+            self.num_exits = len(routes.reverse_sources)
+            offset = _routes_start(self.pages_length)
+            self.block = shared_memory.SharedMemory(
+                create=True, size=offset + 8 * (self.num_locations + 1 + 2 * self.num_exits))
+            try:
+                buffer = self.block.buf
+                SHARED_HEADER.pack_into(buffer, 0, SHARED_MAGIC, self.pages_length, self.num_locations,
+                                        self.num_exits)
+                with open(pages_path, "rb") as file:
+                    file.readinto(buffer[SHARED_HEADER.size:SHARED_HEADER.size + self.pages_length])
+                for column in (routes.reverse_offsets, routes.reverse_sources, routes.reverse_directions):
+                    data = array("q", column).tobytes()
+                    buffer[offset:offset + len(data)] = data
+                    offset += len(data)
+            finally:
+                # Forked workers inherit the mapping, so the block doesn't need its name once it is written. Without
+                # one, its memory is freed when the last process using it exits, even if the supervisor is killed.
+                self.block.unlink()
+
+    def attach(self, memory_budget: int = world_pages.DEFAULT_MEMORY_BUDGET) -> world_pages.PagedWorldTemplate:
+        """Makes the shared world the template of world_path in this process and returns it. Regions and routes
+        are read out of the block without copying it, and the template can't write to it.
+
+        Params:
+            memory_budget (int): The most bytes of regions this process keeps in memory.
+
+        Raises:
+            ValueError: If the block doesn't hold a shared world."""
+        buffer = self.block.buf.toreadonly()
+        magic, pages_length, num_locations, num_exits = SHARED_HEADER.unpack_from(buffer, 0)
+        if magic != SHARED_MAGIC:
+            raise ValueError(f"the shared memory block {self.block.name} doesn't hold a shared world")
+        template = world_pages.PagedWorldTemplate(self.world_path, memory_budget,
+                                                  buffer=buffer[SHARED_HEADER.size:SHARED_HEADER.size + pages_length])
+        columns = []
+        offset = _routes_start(pages_length)
+        for length in (num_locations + 1, num_exits, num_exits):
+            columns.append(buffer[offset:offset + 8 * length].cast("q"))
+            offset += 8 * length
+        template.routes = RouteGraph.from_reverse(num_locations, *columns, template.direction_names,
+                                                  world_pages.ROUTE_TREES)
+        world_pages.add_paged_template(template)
+        return template
+
+    def close(self) -> None:
+        """Unmaps the shared memory block from this process."""
+        self.block.close()
+
+
+async def _serve_worker(server: GameServer, control: socket.socket) -> None:
+    """Runs the sessions control passes to server until the supervisor closes its end of control or stops the
+    worker with SIGTERM, which cancels this task."""
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    await server.serve_handoffs(control)
+
+
+def run_worker(control: socket.socket, inherited: List[socket.socket], shared: SharedWorld, memory_budget: int,
+               idle_timeout: float, write_timeout: float, telemetry_path: Optional[str] = None) -> None:
+    """Runs the sessions of one worker process until the supervisor closes its end of control.
+
+    Params:
+        control (socket.socket): The worker's end of the socket pair the supervisor passes connections over.
+        inherited (list[socket.socket]): The supervisor's sockets this process got a copy of when it was forked.
+        shared (SharedWorld): The world every session plays in.
+        memory_budget (int): The most bytes of regions the worker keeps in memory.
+        idle_timeout (float): Seconds a session may go without sending a command before it is closed.
+        write_timeout (float): Seconds a session may wait for a slow client to read its output.
+        telemetry_path (str): The SQLite database the worker's sessions save their commands to, None to save
+            nothing. Every worker has its own sink and connection, since neither survives a fork."""
+    # The supervisor decides when workers stop, and its signal handlers and wakeup pipe were copied by fork.
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for sock in inherited:
+        sock.close()
+    shared.attach(memory_budget)
+    sink = None
+    if telemetry_path is not None:
+        # Imported here so workers that save no telemetry don't load sqlite3.
+        import telemetry
+        sink = telemetry.TelemetrySink(telemetry_path)
+    server = GameServer(idle_timeout=idle_timeout, write_timeout=write_timeout, world_path=shared.world_path,
+                        telemetry=sink)
+    try:
+        asyncio.run(_serve_worker(server, control))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        # Reached after SIGTERM too, so the sink writes its queue before the worker exits.
+        if sink is not None:
+            sink.close()
+
+
+class ShardedServer:
+    """Class that accepts connections and passes each one to one of several worker processes that run the games.
+
+    Attributes:
+        world_path (str): The world file the games play in.
+        num_workers (int): The number of worker processes.
+        host (str): The address the server listens on.
+        port (int): The port the server listens on.
+        memory_budget (int): The most bytes of world regions each worker keeps in memory.
+        idle_timeout (float): Seconds a session may go without sending a command before it is closed.
+        write_timeout (float): Seconds a session may wait for a slow client to read its output.
+        telemetry_path (str): The SQLite database every worker saves its sessions' commands to, None for none.
+        shared (SharedWorld): The world in shared memory, None until start is called.
+        listener (socket.socket): The listening socket, None until start is called.
+        ring (HashRing): Which worker each connection goes to.
+        processes (dict[int, multiprocessing.Process]): The process of each worker, keyed by its number.
+        controls (dict[int, socket.socket]): The supervisor's end of the socket pair of each worker.
+        connections (int): The number of connections passed to workers.
+        restarts (int): The number of times a worker stopped and was started again.
+        started (dict[int, float]): The event loop time each worker was last started at.
+        quick_failures (dict[int, int]): The number of times in a row each worker stopped soon after it started.
+        pending (dict[int, asyncio.TimerHandle]): The restart waiting for each worker that is backing off.
+        failed (set[int]): The workers that failed too often in a row and are left off the ring.
+    """
+    def __init__(self, world_path: str = world_loader.DEFAULT_WORLD, num_workers: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 4000,
+                 memory_budget: int = world_pages.DEFAULT_MEMORY_BUDGET, idle_timeout: float = IDLE_TIMEOUT,
+                 write_timeout: float = WRITE_TIMEOUT, telemetry_path: Optional[str] = None):
+        """Initializes class ShardedServer with the values from the input parameters. num_workers defaults to
+        the number of cores."""
+        self.world_path = world_path
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.telemetry_path = telemetry_path
+        self.shared = None
+        self.listener = None
+        self.ring = HashRing()
+        self.processes = {}
+        self.controls = {}
+        self.connections = 0
+        self.restarts = 0
+        self.started = {}
+        self.quick_failures = {}
+        self.pending = {}
+        self.failed = set()
+        # Workers are forked, so they start at once and share the supervisor's memory until they write to it.
+        self._context = multiprocessing.get_context("fork")
+
+    async def start(self) -> None:
+        """Shares the world, starts listening and starts the workers. The port attribute is updated if port 0
+        was requested."""
+        self.shared = SharedWorld(self.world_path)
+        self.listener = socket.create_server((self.host, self.port), backlog=BACKLOG)
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        for number in range(self.num_workers):
+            self._start_worker(number)
+
+    def _start_worker(self, number: int) -> None:
+        """Forks the worker with the given number and puts it on the ring."""
+        supervisor_end, worker_end = socket.socketpair()
+        # Passing a connection must never block the accept loop, even when a stuck worker's buffer is full.
+        supervisor_end.setblocking(False)
+        inherited = [self.listener, supervisor_end, *self.controls.values()]
+        process = self._context.Process(target=run_worker, name=f"worker {number}", daemon=True,
+                                        args=(worker_end, inherited, self.shared, self.memory_budget,
+                                              self.idle_timeout, self.write_timeout, self.telemetry_path))
+        process.start()
+        worker_end.close()
+        self.processes[number] = process
+        self.controls[number] = supervisor_end
+        self.ring.add(number)
+        loop = asyncio.get_running_loop()
+        self.started[number] = loop.time()
+        loop.add_reader(process.sentinel, self._worker_stopped, number)
+
+    def _worker_stopped(self, number: int) -> None:
+        """Starts a worker again after its process stopped. Its connections go to other workers in between.
+
+        A worker that keeps stopping soon after it starts is started again after a delay that doubles every
+        time, and is left off the ring after MAX_QUICK_FAILURES quick failures in a row."""
+        process = self.processes.pop(number)
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(process.sentinel)
+        process.join()
+        self.ring.remove(number)
+        self.controls.pop(number).close()
+        if self.listener is None:
+            return
+        if loop.time() - self.started[number] < QUICK_FAILURE:
+            failures = self.quick_failures[number] = self.quick_failures.get(number, 0) + 1
+        else:
+            failures = self.quick_failures[number] = 0
+        if failures >= MAX_QUICK_FAILURES:
+            self.failed.add(number)
+            print(f"Worker {number} stopped with exit code {process.exitcode} {failures} times in a row right "
+                  f"after it started, it isn't started again.", file=sys.stderr)
+            return
+        delay = RESTART_DELAY * 2 ** (failures - 1) if failures else 0.0
+        self.pending[number] = loop.call_later(delay, self._restart_worker, number)
+
+    def _restart_worker(self, number: int) -> None:
+        """Starts a stopped worker again once its delay is over, unless the server was closed in between."""
+        del self.pending[number]
+        if self.listener is not None:
+            self.restarts += 1
+            self._start_worker(number)
+
+    def dispatch(self, connection: socket.socket, address: Tuple) -> None:
+        """Passes a connection to the worker its address and port hash to, or to the next worker on the ring if
+        that one stopped, and closes the supervisor's copy of it."""
+        key = f"{address[0]}:{address[1]}"
+        # Workers whose buffer is full because they are stuck. They stay on the ring for later connections.
+        busy = set()
+        try:
+            while True:
+                try:
+                    number = self.ring.lookup(key, busy)
+                except LookupError:
+                    return
+                try:
+                    socket.send_fds(self.controls[number], [b"c"], [connection.fileno()])
+                except BlockingIOError:
+                    busy.add(number)
+                    continue
+                except OSError:
+                    # The worker stopped, _worker_stopped starts it again once its process has exited.
+                    self.ring.remove(number)
+                    continue
+                self.connections += 1
+                return
+        finally:
+            connection.close()
+
+    async def serve_forever(self) -> None:
+        """Starts the server and passes connections to the workers until the task is cancelled."""
+        if self.listener is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                connection, address = await loop.sock_accept(self.listener)
+                self.dispatch(connection, address)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stops accepting connections, stops every worker and frees the shared world."""
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        loop = asyncio.get_running_loop()
+        for handle in self.pending.values():
+            handle.cancel()
+        self.pending.clear()
+        for number, process in self.processes.items():
+            loop.remove_reader(process.sentinel)
+            self.controls[number].close()
+            process.terminate()
+        for process in self.processes.values():
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self.processes.clear()
+        self.controls.clear()
+        self.ring = HashRing()
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+
+def run(world_path: str, num_workers: int, host: str, port: int, memory_budget: Optional[int] = None,
+        idle_timeout: float = IDLE_TIMEOUT, telemetry_path: Optional[str] = None) -> None:
+    """Runs a ShardedServer until it is interrupted.
+
+    Params:
+        memory_budget (int): The megabytes of world regions each worker keeps in memory, None for the default.
+        telemetry_path (str): The SQLite database the workers save their sessions' commands to, None for none."""
+    budget = world_pages.DEFAULT_MEMORY_BUDGET if memory_budget is None else memory_budget << 20
+    server = ShardedServer(world_path, num_workers, host, port, budget, idle_timeout,
+                           telemetry_path=telemetry_path)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
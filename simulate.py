@@ -0,0 +1,241 @@
+"""Monte Carlo simulator for balancing the game.
+
+Plays a large number of games with a scripted or random policy across a pool of worker processes
+and prints aggregated statistics. Every game is seeded from the base seed and its game number, so a
+run gives the same numbers no matter how many workers are used.
+
+Usage:
+    python simulate.py [--games N] [--policy random|greedy] [--workers N] [--seed N] [--json]"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from typing import *
+from project2game import Game
+
+MAX_TURNS = 300
+BATCH_SIZE = 500
+CARRY_LIMIT = 30
+
+
+class SimulationStats:
+    """Class that holds the running totals of a simulation.
+
+    Only counters are stored, never a record per game, so batches can be merged without the memory
+    use growing with the number of games.
+
+    Attributes:
+        counters (dict[str, int]): Named totals such as games, wins and rob attempts.
+        turns_histogram (dict[int, int]): The number of wins for each number of turns it took to win.
+    """
+    def __init__(self):
+        """Initializes class SimulationStats with every total at zero."""
+        self.counters = {"games": 0, "wins": 0, "quits": 0, "turns": 0, "win_turns": 0,
+                         "rob_attempts_armed": 0, "rob_successes_armed": 0,
+                         "rob_attempts_unarmed": 0, "rob_successes_unarmed": 0,
+                         "zero_calorie_gives": 0, "elf_teleports": 0, "elf_teleports_moved": 0}
+        self.turns_histogram = {}
+
+    def record_game(self, game: Game, turns: int, events: List[tuple]) -> None:
+        """Adds the outcome of one finished game to the totals.
+
+        Params:
+            game (Game): The finished game.
+            turns (int): The number of commands that were played.
+            events (list[tuple]): Every event the game produced."""
+        counters = self.counters
+        counters["games"] += 1
+        counters["turns"] += turns
+        elf_location = game.get_elf_location().get_name()
+        for event in events:
+            kind = event[0]
+            if kind == "robbed":
+                suffix = "armed" if event[3] else "unarmed"
+                counters["rob_attempts_" + suffix] += 1
+                if event[2]:
+                    counters["rob_successes_" + suffix] += 1
+            elif kind == "fed" and event[2] == 0:
+                counters["zero_calorie_gives"] += 1
+            elif kind == "teleported" and event[2] == "elf":
+                counters["elf_teleports"] += 1
+                if event[1] != elf_location:
+                    counters["elf_teleports_moved"] += 1
+            elif kind == "won":
+                counters["wins"] += 1
+                counters["win_turns"] += turns
+                self.turns_histogram[turns] = self.turns_histogram.get(turns, 0) + 1
+            elif kind == "quit":
+                counters["quits"] += 1
+
+    def merge(self, other: 'SimulationStats') -> None:
+        """Adds the totals of other into these totals."""
+        for key, value in other.counters.items():
+            self.counters[key] += value
+        for turns, count in other.turns_histogram.items():
+            self.turns_histogram[turns] = self.turns_histogram.get(turns, 0) + count
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the rates and averages that describe the balance of the game."""
+        counters = self.counters
+
+        def ratio(numerator: str, denominator: str) -> float:
+            return counters[numerator] / counters[denominator] if counters[denominator] else 0.0
+
+        summary = {"games": counters["games"],
+                   "win_rate": ratio("wins", "games"),
+                   "average_turns_to_victory": ratio("win_turns", "wins"),
+                   "median_turns_to_victory": self.turns_percentile(0.5),
+                   "rob_success_rate_armed": ratio("rob_successes_armed", "rob_attempts_armed"),
+                   "rob_success_rate_unarmed": ratio("rob_successes_unarmed", "rob_attempts_unarmed"),
+                   "rob_attempts_armed": counters["rob_attempts_armed"],
+                   "rob_attempts_unarmed": counters["rob_attempts_unarmed"],
+                   "zero_calorie_gives": counters["zero_calorie_gives"],
+                   "elf_teleport_rate": ratio("elf_teleports", "zero_calorie_gives"),
+                   "elf_teleport_moved_rate": ratio("elf_teleports_moved", "zero_calorie_gives")}
+        return summary
+
+    def turns_percentile(self, fraction: float) -> int:
+        """Returns the number of turns that the given fraction of wins took at most."""
+        wins = self.counters["wins"]
+        seen = 0
+        for turns in sorted(self.turns_histogram):
+            seen += self.turns_histogram[turns]
+            if seen >= wins * fraction:
+                return turns
+        return 0
+
+
+def random_policy(game: Game, rng: random.Random) -> str:
+    """Returns a random command that makes sense in the player's current location."""
+    location = game.get_current_location()
+    choice = rng.randint(0, 6)
+    if choice <= 2 and location.get_locations():
+        return "go " + rng.choice(list(location.get_locations()))
+    if choice == 3 and location.get_items():
+        return "take " + rng.choice(list(location.get_items())).get_name()
+    if choice == 4 and game.get_inventory():
+        return "give " + rng.choice(list(game.get_inventory())).get_name()
+    if choice == 5 and location.get_npcs():
+        return "rob"
+    if choice == 6:
+        return "teleport"
+    return "look"
+
+
+def greedy_policy(game: Game, rng: random.Random) -> str:
+    """Returns a command for a player who collects food, feeds the elf and wanders otherwise."""
+    location = game.get_current_location()
+    inventory = game.get_inventory()
+    if location == game.get_elf_location():
+        for item in inventory:
+            if item.get_calories() > 0:
+                return "give " + item.get_name()
+    if game.get_weight() > CARRY_LIMIT:
+        heaviest = max(inventory, key=lambda item: (item.get_calories() == 0, item.get_weight()))
+        return "give " + heaviest.get_name()
+    for item in location.get_items():
+        if item.get_calories() > 0 and game.get_weight() + item.get_weight() <= CARRY_LIMIT:
+            return "take " + item.get_name()
+    for npc in location.get_npcs():
+        if npc.has_prize_food():
+            return "rob"
+    exits = list(location.get_locations())
+    if not exits:
+        return "look"
+    return "go " + rng.choice(exits)
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+def game_seed(base_seed: int, game_number: int) -> int:
+    """Returns the seed of a single game so it doesn't depend on which worker plays it."""
+    return (base_seed << 32) | game_number
+
+
+def play_game(seed: int, policy: Callable[[Game, random.Random], str], max_turns: int,
+              stats: SimulationStats) -> None:
+    """Plays one game with the given policy and records it in stats."""
+    game = Game(seed)
+    policy_rng = random.Random(seed ^ 0x5EED)
+    events = []
+    turns = 0
+    while turns < max_turns:
+        result = game.execute(policy(game, policy_rng))
+        turns += 1
+        events.extend(result.events)
+        if result.game_over:
+            break
+    stats.record_game(game, turns, events)
+
+
+def run_batch(task: Tuple[int, int, int, str, int]) -> SimulationStats:
+    """Plays one batch of games inside a worker process and returns only its totals.
+
+    Params:
+        task (tuple): The base seed, the first game number, the number of games, the policy name and the
+            maximum number of turns per game."""
+    base_seed, first_game, num_games, policy_name, max_turns = task
+    policy = POLICIES[policy_name]
+    stats = SimulationStats()
+    for game_number in range(first_game, first_game + num_games):
+        play_game(game_seed(base_seed, game_number), policy, max_turns, stats)
+    return stats
+
+
+def simulate(num_games: int, policy: str = "greedy", workers: Optional[int] = None, seed: int = 0,
+             max_turns: int = MAX_TURNS, batch_size: int = BATCH_SIZE) -> SimulationStats:
+    """Plays num_games games across a pool of processes and returns the merged totals.
+
+    Batches are merged as soon as a worker finishes them, so the parent never holds more than one
+    SimulationStats per batch in flight.
+
+    Params:
+        num_games (int): How many games to play.
+        policy (str): The name of the policy in POLICIES that chooses each command.
+        workers (int): The number of worker processes, all cores when None.
+        seed (int): The base seed every game seed is derived from.
+        max_turns (int): The number of commands after which an unfinished game counts as a loss.
+        batch_size (int): The number of games a worker plays before reporting back."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy}, choose from {', '.join(POLICIES)}")
+    tasks = ((seed, first, min(batch_size, num_games - first), policy, max_turns)
+             for first in range(0, num_games, batch_size))
+    total = SimulationStats()
+    if workers == 1:
+        for task in tasks:
+            total.merge(run_batch(task))
+        return total
+    with multiprocessing.Pool(workers) as pool:
+        for stats in pool.imap_unordered(run_batch, tasks):
+            total.merge(stats)
+    return total
+
+
+def main():
+    """Function that parses the command line, runs the simulation and prints the statistics."""
+    parser = argparse.ArgumentParser(description="Simulate many games and report balance statistics.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--json", action="store_true", help="print the statistics as JSON")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    stats = simulate(args.games, args.policy, args.workers, args.seed, args.max_turns, args.batch_size)
+    elapsed = time.perf_counter() - start
+    summary = stats.summary()
+    summary["games_per_second"] = args.games / elapsed
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    for key, value in summary.items():
+        print(f"{key}: {value:,.4f}" if isinstance(value, float) else f"{key}: {value:,}")
+
+
+if __name__ == "__main__":
+    main()
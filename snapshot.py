@@ -0,0 +1,474 @@
+"""Binary snapshots of a game's session and the journal of changes made after one.
+
+A snapshot holds everything a game changed: where the player is, what they carry, the calories the elf
+still needs, the state of the random number generator, and from the WorldState the visited locations,
+the items of every room whose items changed, the message number, prize food and location of every NPC
+that changed, and the timers of the world clock. The world itself isn't saved, a snapshot is loaded into
+a game that uses the same world file. A paged world only moves the NPCs of the player's region, so the same
+world plays differently paged and whole, and a snapshot saves the size of the regions NPCs wander in to be
+refused by a game where they wander differently.
+
+Between snapshots a journal gets one record per command with only what that command changed, so
+saving after every command costs as much as the command changed and not the size of the world. A
+journal starts with the id of the snapshot it continues, so a journal left over from an older snapshot
+is never applied to a newer one.
+
+Items are saved as their index in the world's template. Items that aren't from the template, such as
+ones made by tests, are saved by value and loaded as new Item objects.
+
+Snapshot format, little endian:
+    HEADER, then SECTIONS (offset, length) pairs, then the sections.
+    rng: array of 32 bit unsigned integers, the state of the Mersenne Twister.
+    visited: array of 32 bit integers, the visited locations.
+    inventory: array of 32 bit integers, the item codes of the inventory in the order it was picked up.
+    rooms: array of 32 bit integers, for each room whose items changed its index, its number of items and
+        their item codes.
+    npcs: array of 32 bit integers, for each NPC that changed its index, its message number (-1 if it never
+        talked), its prize food (-1 if it never changed, else 0 or 1) and its location (-1 if it never moved).
+    timers: array of 64 bit integers, the key and the tick of every timer of the world clock.
+    extra: marshal of (gauss_next, extra_exits, renamed, items that aren't in the template), where the item
+        code of the item at position k of that list is -1 - k.
+
+Journal format:
+    JOURNAL_HEADER, then records, each RECORD (length, CRC-32) and then marshal of
+    (turns, location, calories_needed, run_game, inventory or None, {room: items}, [visited location],
+     {npc: (message_num, high_value, renamed, location)}, extra_exits or None, rng_state or None,
+     {timer key: tick or None if it went off or was cancelled}).
+    A record that was cut short or doesn't match its CRC ends the journal."""
+
+import marshal
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import *
+from items_npc import Item
+from item_index import ItemIndex
+import world
+
+SNAPSHOT_VERSION = 3
+SNAPSHOT_MAGIC = b"ZSAV"
+JOURNAL_MAGIC = b"ZJRN"
+JOURNAL_SUFFIX = ".journal"
+# The journal is folded into a new snapshot after this many commands.
+SNAPSHOT_EVERY = 10000
+# magic, version, snapshot id, turns, location, calories needed, run game, number of locations, items and NPCs,
+# wander region
+HEADER = struct.Struct("<4sHQqqqBqqqq")
+SECTION_NAMES = ("rng", "visited", "inventory", "rooms", "npcs", "extra", "timers")
+SECTIONS = struct.Struct(f"<{2 * len(SECTION_NAMES)}Q")
+# magic, version, snapshot id
+JOURNAL_HEADER = struct.Struct("<4sHQ")
+RECORD = struct.Struct("<II")
+
+
+def _to_bytes(typecode: str, values: Iterable[int]) -> bytes:
+    """Returns integers as the bytes of a little endian array."""
+    data = array(typecode, values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _sorted_dict(values: dict) -> dict:
+    """Returns a copy of a dictionary of dictionaries with the keys of both in order."""
+    return {key: dict(sorted(value.items())) for key, value in sorted(values.items())}
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    """Returns the array of integers in little endian bytes."""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def encode_item(template: world.WorldTemplate, item: Item) -> Union[int, tuple]:
+    """Returns an item as its index in template, or as its values if it isn't one of the template's items."""
+    if isinstance(item, world.StoredItem) and item._template is template:
+        return item.get_index()
+    return item.get_name(), item.description, item.get_calories(), item.get_weight(), tuple(sorted(item.get_tags()))
+
+
+def decode_item(template: world.WorldTemplate, code: Union[int, tuple]) -> Item:
+    """Returns the item that encode_item encoded."""
+    if isinstance(code, int):
+        return template.item(code)
+    return Item(*code)
+
+
+def check_wander_region(wander_region: int, template: world.WorldTemplate) -> None:
+    """Checks that NPCs wander in template the way they did in the game a snapshot or recording was saved from.
+
+    Raises:
+        ValueError: If they don't, such as in a paged copy of a world whose snapshot was saved whole."""
+    if wander_region != template.wander_region():
+        def describe(size: int) -> str:
+            return f"in regions of {size} locations" if size else "everywhere"
+        raise ValueError(f"The game was saved where NPCs wander {describe(wander_region)}, but in this world they"
+                         f" wander {describe(template.wander_region())}")
+
+
+class SessionSnapshot:
+    """Everything a game changed, as it is saved in a snapshot file.
+
+    Attributes:
+        snapshot_id (int): A random number that identifies the snapshot, and the journal that continues it.
+        turns (int): The number of commands the game ran.
+        location (int): The index of the location the player is in.
+        calories_needed (int): The calories the elf still needs.
+        run_game (bool): If the game is still being played.
+        world_size (tuple[int, int, int]): The number of locations, items and NPCs of the world.
+        wander_region (int): The number of locations in each region whose NPCs only wander while the player is in
+            it, 0 if they wander everywhere, from WorldTemplate.wander_region.
+        rng_state (tuple): The state of the game's random number generator, as returned by getstate.
+        inventory (list): The item code of each item the player carries.
+        visited (Iterable[int]): The indexes of the visited locations.
+        room_items (dict[int, list]): The item codes of each room whose items changed.
+        message_num (dict[int, int]): The message number of each NPC that talked.
+        high_value (dict[int, bool]): If an NPC still has its prize food, for NPCs where it changed.
+        renamed (dict[int, dict[str, str]]): The name or description of each NPC that was changed.
+        npc_locations (dict[int, int]): The location of each NPC that moved.
+        extra_exits (dict[int, dict[str, int]]): The exits the game added.
+        timers (dict[int, int]): The tick of each timer of the world clock, keyed by the timer's key. Like the
+            inventory, the game makes its world clock from these itself.
+    """
+    def __init__(self, snapshot_id: int, turns: int, location: int, calories_needed: int, run_game: bool,
+                 world_size: Tuple[int, int, int], rng_state: tuple, wander_region: int = 0):
+        """Initializes class SessionSnapshot with the values from the input parameters and no changes."""
+        self.snapshot_id = snapshot_id
+        self.turns = turns
+        self.location = location
+        self.calories_needed = calories_needed
+        self.run_game = run_game
+        self.world_size = world_size
+        self.wander_region = wander_region
+        self.rng_state = rng_state
+        self.inventory = []
+        self.visited = ()
+        self.room_items = {}
+        self.message_num = {}
+        self.high_value = {}
+        self.renamed = {}
+        self.npc_locations = {}
+        self.extra_exits = {}
+        self.timers = {}
+
+    @staticmethod
+    def world_size_of(template: world.WorldTemplate) -> Tuple[int, int, int]:
+        """Returns the number of locations, items and NPCs of a world."""
+        return len(template.location_names), len(template.item_names), len(template.npc_names)
+
+    @classmethod
+    def capture(cls, state: world.WorldState, snapshot_id: int, turns: int, location: int,
+                inventory: Iterable[Item], calories_needed: int, run_game: bool,
+                rng_state: tuple) -> 'SessionSnapshot':
+        """Returns a snapshot of a game.
+
+        Params:
+            state (WorldState): The state of the game's world.
+            snapshot_id (int): The id of the new snapshot.
+            turns (int): The number of commands the game ran.
+            location (int): The index of the location the player is in.
+            inventory (Iterable[Item]): The items the player carries.
+            calories_needed (int): The calories the elf still needs.
+            run_game (bool): If the game is still being played.
+            rng_state (tuple): The state of the game's random number generator."""
+        template = state.template
+        snapshot = cls(snapshot_id, turns, location, calories_needed, run_game, cls.world_size_of(template),
+                       rng_state, template.wander_region())
+        snapshot.inventory = [encode_item(template, item) for item in inventory]
+        snapshot.visited = sorted(state.visited)
+        for room, items in state.room_items.items():
+            if list(items) != list(template.starting_items(room)):
+                snapshot.room_items[room] = [encode_item(template, item) for item in items]
+        snapshot.message_num = dict(state.message_num)
+        snapshot.high_value = dict(state.high_value)
+        snapshot.renamed = {npc: dict(renamed) for npc, renamed in state.renamed.items()}
+        snapshot.npc_locations = {npc: location for npc, location in state.npcs.moved.items()
+                                  if location != template.npc_locations[npc]}
+        snapshot.extra_exits = {source: dict(exits) for source, exits in state.extra_exits.items()}
+        if state.timers is not None:
+            snapshot.timers = dict(state.timers.items())
+        return snapshot
+
+    def to_bytes(self) -> bytes:
+        """Returns the snapshot in the snapshot format. Every section is written in the order of its keys, so
+        snapshots of the same state have the same bytes however the state was reached."""
+        extra_items = []
+        extra_codes = {}
+
+        def code_of(code: Union[int, tuple]) -> int:
+            if isinstance(code, int):
+                return code
+            if code not in extra_codes:
+                extra_codes[code] = -1 - len(extra_items)
+                extra_items.append(code)
+            return extra_codes[code]
+
+        rooms = []
+        for room, codes in sorted(self.room_items.items()):
+            rooms.append(room)
+            rooms.append(len(codes))
+            rooms.extend(code_of(code) for code in codes)
+        npcs = []
+        for npc in sorted(set(self.message_num) | set(self.high_value) | set(self.npc_locations)):
+            high_value = self.high_value.get(npc)
+            npcs += (npc, self.message_num.get(npc, -1), -1 if high_value is None else int(high_value),
+                     self.npc_locations.get(npc, -1))
+        timers = []
+        for key, tick in sorted(self.timers.items()):
+            timers += (key, tick)
+        version, state, gauss_next = self.rng_state
+        inventory = [code_of(code) for code in self.inventory]
+        sections = [_to_bytes("I", state), _to_bytes("i", self.visited), _to_bytes("i", inventory),
+                    _to_bytes("i", rooms), _to_bytes("i", npcs),
+                    marshal.dumps((version, gauss_next, _sorted_dict(self.extra_exits), _sorted_dict(self.renamed),
+                                   extra_items)),
+                    _to_bytes("q", timers)]
+        offsets = []
+        offset = HEADER.size + SECTIONS.size
+        for section in sections:
+            offsets += (offset, len(section))
+            offset += len(section)
+        return b"".join([HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.snapshot_id, self.turns, self.location,
+                                     self.calories_needed, self.run_game, *self.world_size, self.wander_region),
+                         SECTIONS.pack(*offsets)] + sections)
+
+    def write(self, path: str) -> int:
+        """Writes the snapshot to path, replacing it in one step so a crash never leaves half a snapshot.
+
+        Returns:
+            size (int): The number of bytes written."""
+        data = self.to_bytes()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        return len(data)
+
+    @classmethod
+    def read(cls, path: str) -> 'SessionSnapshot':
+        """Returns the snapshot in the file at path, which is mapped into memory instead of read.
+
+        Raises:
+            ValueError: If the file isn't a snapshot of this version."""
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return cls.from_bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, mmap.mmap]) -> 'SessionSnapshot':
+        """Returns the snapshot in data, which is in the snapshot format.
+
+        Raises:
+            ValueError: If data isn't a snapshot of this version."""
+        if len(data) < HEADER.size + SECTIONS.size:
+            raise ValueError("The data is not a snapshot")
+        (magic, version, snapshot_id, turns, location, calories_needed, run_game, num_locations, num_items,
+         num_npcs, wander_region) = HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"The data is not a snapshot of version {SNAPSHOT_VERSION}")
+        offsets = SECTIONS.unpack_from(data, HEADER.size)
+        sections = {name: data[offsets[2 * index]:offsets[2 * index] + offsets[2 * index + 1]]
+                    for index, name in enumerate(SECTION_NAMES)}
+        rng_version, gauss_next, extra_exits, renamed, extra_items = marshal.loads(sections["extra"])
+        snapshot = cls(snapshot_id, turns, location, calories_needed, bool(run_game),
+                       (num_locations, num_items, num_npcs),
+                       (rng_version, tuple(_from_bytes("I", sections["rng"])), gauss_next), wander_region)
+
+        def code_of(code: int) -> Union[int, tuple]:
+            return code if code >= 0 else extra_items[-1 - code]
+
+        snapshot.inventory = [code_of(code) for code in _from_bytes("i", sections["inventory"])]
+        snapshot.visited = _from_bytes("i", sections["visited"])
+        rooms = _from_bytes("i", sections["rooms"])
+        position = 0
+        while position < len(rooms):
+            count = rooms[position + 1]
+            snapshot.room_items[rooms[position]] = [code_of(code) for code in
+                                                    rooms[position + 2:position + 2 + count]]
+            position += 2 + count
+        npcs = _from_bytes("i", sections["npcs"])
+        for position in range(0, len(npcs), 4):
+            npc, message_num, high_value, location = npcs[position:position + 4]
+            if message_num >= 0:
+                snapshot.message_num[npc] = message_num
+            if high_value >= 0:
+                snapshot.high_value[npc] = bool(high_value)
+            if location >= 0:
+                snapshot.npc_locations[npc] = location
+        timers = _from_bytes("q", sections["timers"])
+        snapshot.timers = dict(zip(timers[::2], timers[1::2]))
+        snapshot.renamed = renamed
+        snapshot.extra_exits = extra_exits
+        return snapshot
+
+    def restore(self, state: world.WorldState) -> None:
+        """Puts the changes of the snapshot into a new, untouched WorldState. The values the game keeps
+        itself, such as the inventory, are left in the snapshot.
+
+        Raises:
+            ValueError: If the state's world isn't the size of the world the snapshot was saved from, or its NPCs
+                wander differently."""
+        template = state.template
+        if self.world_size_of(template) != tuple(self.world_size):
+            raise ValueError("The snapshot was saved from a different world")
+        check_wander_region(self.wander_region, template)
+        state.visited.update(self.visited)
+        for room, codes in self.room_items.items():
+            state.room_items[room] = ItemIndex(decode_item(template, code) for code in codes)
+        for npc, message_num in self.message_num.items():
+            state.message_num[npc] = message_num
+        for npc, high_value in self.high_value.items():
+            state.high_value[npc] = high_value
+        state.renamed.update(self.renamed)
+        for npc, location in self.npc_locations.items():
+            state.npcs.move(npc, location)
+        for source, exits in self.extra_exits.items():
+            for direction, target in exits.items():
+                state.add_exit(source, direction, target)
+
+    def apply(self, record: tuple, state: world.WorldState) -> None:
+        """Applies a journal record to a restored WorldState, and to the values of this snapshot that the game
+        keeps itself, such as the location, the inventory and the timers."""
+        (self.turns, self.location, self.calories_needed, self.run_game, inventory, room_items, visited, npcs,
+         extra_exits, rng_state, timers) = record
+        template = state.template
+        if inventory is not None:
+            self.inventory = inventory
+        for room, codes in room_items.items():
+            state.room_items[room] = ItemIndex(decode_item(template, code) for code in codes)
+        state.visited.update(visited)
+        for npc, (message_num, high_value, renamed, location) in npcs.items():
+            if message_num is not None:
+                state.message_num[npc] = message_num
+            if high_value is not None:
+                state.high_value[npc] = high_value
+            if renamed is not None:
+                state.renamed[npc] = renamed
+            if location is not None:
+                state.npcs.move(npc, location)
+        if extra_exits is not None:
+            for source, exits in extra_exits.items():
+                for direction, target in exits.items():
+                    if target != state.extra_exits.get(source, {}).get(direction):
+                        state.add_exit(source, direction, target)
+        if rng_state is not None:
+            self.rng_state = rng_state
+        for key, tick in timers.items():
+            if tick is None:
+                self.timers.pop(key, None)
+            else:
+                self.timers[key] = tick
+
+
+class Journal:
+    """The journal of changes made after a snapshot, written one record per command.
+
+    Attributes:
+        snapshot_path (str): The snapshot the journal continues. The journal is at snapshot_path + JOURNAL_SUFFIX.
+        snapshot_every (int): The number of records after which the game writes a new snapshot, 0 for never.
+        records (int): The number of records written since the last snapshot.
+        file (BinaryIO): The open journal file, None until the first snapshot was written.
+        last_inventory (list): The item codes of the inventory in the last record that had one.
+        last_draws (int): The number of random numbers the game had drawn at the last record.
+    """
+    def __init__(self, snapshot_path: str, snapshot_every: int = SNAPSHOT_EVERY):
+        """Initializes class Journal. The file is only opened by restart, once its snapshot exists."""
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.records = 0
+        self.file = None
+        self.last_inventory = None
+        self.last_draws = -1
+
+    def restart(self, snapshot_id: int, inventory: List[Union[int, tuple]], draws: int) -> None:
+        """Empties the journal and starts it again after the snapshot with the given id.
+
+        Params:
+            snapshot_id (int): The id of the snapshot that was just written.
+            inventory (list): The item codes of the inventory in that snapshot.
+            draws (int): The number of random numbers the game had drawn when the snapshot was written."""
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.snapshot_path + JOURNAL_SUFFIX, "wb")
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, SNAPSHOT_VERSION, snapshot_id))
+        self.file.flush()
+        self.records = 0
+        self.last_inventory = inventory
+        self.last_draws = draws
+
+    def record(self, state: world.WorldState, turns: int, location: int, inventory: Iterable[Item],
+               calories_needed: int, run_game: bool, draws: int, rng_state: Callable[[], tuple]) -> None:
+        """Writes a record of what changed since the last one and clears the state's changes.
+
+        Params:
+            state (WorldState): The state of the game's world, whose changes are tracked.
+            turns (int): The number of commands the game ran.
+            location (int): The index of the location the player is in.
+            inventory (Iterable[Item]): The items the player carries.
+            calories_needed (int): The calories the elf still needs.
+            run_game (bool): If the game is still being played.
+            draws (int): The number of random numbers the game has drawn.
+            rng_state (Callable[[], tuple]): Returns the state of the game's random number generator, only
+                called if numbers were drawn since the last record."""
+        template = state.template
+        changes = state.changes
+        codes = [encode_item(template, item) for item in inventory]
+        if codes == self.last_inventory:
+            codes = None
+        else:
+            self.last_inventory = codes
+        room_items = {room: [encode_item(template, item) for item in state.items_at(room)]
+                      for room in changes.locations}
+        npcs = {npc: (state.message_num.get(npc), state.high_value.get(npc), state.renamed.get(npc),
+                      state.npcs.location_of(npc)) for npc in changes.npcs}
+        timers = {key: state.timers.get(key) for key in changes.timers}
+        extra_exits = ({source: dict(exits) for source, exits in state.extra_exits.items()}
+                       if changes.exits else None)
+        if draws != self.last_draws:
+            self.last_draws = draws
+            rng = rng_state()
+        else:
+            rng = None
+        data = marshal.dumps((turns, location, calories_needed, run_game, codes, room_items, list(changes.visited),
+                              npcs, extra_exits, rng, timers))
+        changes.clear()
+        self.file.write(RECORD.pack(len(data), zlib.crc32(data)))
+        self.file.write(data)
+        self.file.flush()
+        self.records += 1
+
+    def close(self) -> None:
+        """Closes the journal file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_journal(path: str, snapshot_id: int) -> Iterator[tuple]:
+    """Yields the records of the journal at path, if there is one and it continues the given snapshot.
+
+    Reading stops at the first record that was cut short or is damaged, such as the last record of a game
+    that crashed while writing it."""
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with file:
+        header = file.read(JOURNAL_HEADER.size)
+        if len(header) < JOURNAL_HEADER.size or JOURNAL_HEADER.unpack(header) != (JOURNAL_MAGIC, SNAPSHOT_VERSION,
+                                                                                     snapshot_id):
+            return
+        while True:
+            record_header = file.read(RECORD.size)
+            if len(record_header) < RECORD.size:
+                return
+            length, crc = RECORD.unpack(record_header)
+            data = file.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                return
+            yield marshal.loads(data)
@@ -0,0 +1,807 @@
+"""A solver that finds the fewest commands that win a game from where it is now.
+
+The solver searches the states a game can get into with A* (or a beam search for worlds too large for
+A*). A state only holds what the commands that win the game can change, as a small tuple of integers
+and tuples that can be hashed and compared:
+
+    (location, calories_needed, weight, armed, inventory, rooms)
+
+inventory holds the indexes of the items the player carries and rooms the items of every room the
+solver changed, as (location, items) pairs sorted by location. Both keep the items sorted by name with
+a stable sort, which keeps the order of items that share a name, so the first item with a name is the
+one the game would find for "take" and "give". weight and armed are the totals of the inventory, kept
+apart from it like the game's running totals so moves don't have to add up the items.
+
+Robbing fails without changing anything but the random number generator, so trying until it works is
+expectimax with a single outcome: it costs 1 / chance commands on average and is searched like any other
+move with that cost. Teleporting, and giving the elf food without calories, send the player to a random
+location. Those are chance nodes whose value is the average over every location of the best plan from
+there, found by searching again one level deeper, up to chance_depth levels. They are only considered
+when chance_depth is above 0 and the world has at most max_outcomes locations, because the value of
+each one takes a search from every location, so by default the solver plans without teleporting. A
+chance node starts out with the average of the estimates from every location as its lower bound, and
+each time it is the cheapest option left the location with the highest estimate is solved and the bound
+raised, so a teleport that is worse than walking is usually dropped after solving a few locations
+instead of all of them.
+
+Solving every location exactly is what made teleporting take minutes even in world.json, where
+thousands of chance nodes look cheaper than walking before they are solved. So the locations of the
+last level of chance nodes are solved with a beam search chance_beam wide, whose plans can be played
+and so are an upper bound on what the teleport costs, and each search solves the locations of at most
+max_chance_nodes chance nodes: after that, teleports that still need a location solved are dropped and the
+search plans with the ones it knows.
+
+A* also remembers the cheapest way it found to win from every state on each solution, since the rest of a
+solution is the cheapest way on from each of its states, and a later search that reaches one of them is
+done there. States that were searched are kept in a bounded transposition table, so a state is only
+searched again if it was reached more cheaply or was evicted to stay under the bound.
+
+Usage:
+    python solver.py [--world FILE] [--seed N] [--travel] [--beam WIDTH] [--play] [--json]
+                     [--chance-depth N [--chance-beam WIDTH] [--chance-nodes N]]"""
+
+import argparse
+import bisect
+import heapq
+import json
+import math
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import *
+from project2game import Game
+import world_loader
+
+# The weight above which go and travel refuse to move, and the chances rob succeeds with, as in Game.
+CARRY_LIMIT = 30
+ARMED_ROB_CHANCE = 87 / 101
+UNARMED_ROB_CHANCE = 47 / 101
+DEFAULT_TABLE_SIZE = 1 << 20
+DEFAULT_CHANCE_DEPTH = 0
+DEFAULT_MAX_OUTCOMES = 64
+DEFAULT_CHANCE_BEAM = 64
+DEFAULT_CHANCE_NODES = 4
+# The detour through the nearest food is only added to the estimate in worlds with at most this many locations.
+MAX_DETOUR_LOCATIONS = 1 << 16
+# Kinds of nodes in the A* queue.
+MOVE = 0
+GOAL = 1
+CHANCE_BOUND = 2
+CHANCE = 3
+KNOWN = 4
+
+
+class TranspositionTable:
+    """The cheapest cost each state was reached with, bounded by evicting the least recently used states.
+
+    Attributes:
+        entries (OrderedDict[tuple, float]): The cost of each state, least recently used first.
+        max_entries (int): The number of states to keep.
+        hits (int): The number of times a state was skipped because it was already reached as cheaply.
+        evictions (int): The number of states evicted.
+    """
+    def __init__(self, max_entries: int = DEFAULT_TABLE_SIZE):
+        """Initializes class TranspositionTable with no states."""
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.evictions = 0
+
+    def improve(self, state: tuple, cost: float) -> bool:
+        """Records that state was reached with cost and returns True, unless it was already reached as
+        cheaply, in which case it returns False."""
+        entries = self.entries
+        known = entries.get(state)
+        if known is not None:
+            entries.move_to_end(state)
+            if known <= cost:
+                self.hits += 1
+                return False
+        entries[state] = cost
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def get(self, state: tuple) -> Optional[float]:
+        """Returns the cheapest cost state was reached with, None if it wasn't or was evicted."""
+        return self.entries.get(state)
+
+    def __len__(self) -> int:
+        """Returns the number of states in the table."""
+        return len(self.entries)
+
+
+class Solution:
+    """The commands that win a game, or that lead up to a chance node after which the game is solved again.
+
+    Attributes:
+        commands (list[str]): The commands, in order. "rob" has to be repeated until it works.
+        states (list[tuple]): The state after each command, None after the command that ends in a chance node.
+        expected_commands (float): The number of commands the game takes to win on average when the
+            solution is followed, counting repeated robs and everything after a chance node.
+        chance (bool): True if the last command sends the player to a random location.
+        costs (list[float]): The number of commands it takes on average to get to the state after each command.
+    """
+    def __init__(self, commands: List[str], states: List[Optional[tuple]], expected_commands: float,
+                 chance: bool, costs: Optional[List[float]] = None):
+        """Initializes class Solution with the values from the input parameters."""
+        self.commands = commands
+        self.states = states
+        self.expected_commands = expected_commands
+        self.chance = chance
+        self.costs = [] if costs is None else costs
+
+
+class ChanceNode:
+    """A teleport to a random location, whose value is found one location at a time while the search needs it.
+
+    Attributes:
+        state (tuple): The state the teleport starts from, with -1 as its location.
+        depth (int): How many chance nodes deep the search that reached it evaluates them.
+        pending (list[tuple[float, int]]): The estimate and index of each location that wasn't solved yet,
+            highest estimate last.
+        estimated (float): The sum of the estimates of the pending locations.
+        solved (float): The sum of the commands it takes to win from the solved locations.
+    """
+    __slots__ = ("state", "depth", "pending", "estimated", "solved")
+
+    def __init__(self, state: tuple, depth: int, estimates: List[Tuple[float, int]]):
+        """Initializes class ChanceNode with no location solved yet."""
+        self.state = state
+        self.depth = depth
+        self.pending = sorted(estimates)
+        self.estimated = sum(estimate for estimate, location in estimates)
+        self.solved = 0.0
+
+    def value(self, num_locations: int) -> float:
+        """Returns the commands it takes on average to win with this teleport, the teleport included. It is a
+        lower bound while some locations are pending and exact once none are."""
+        return 1 + (self.solved + self.estimated) / num_locations
+
+
+def typeable(name: str) -> bool:
+    """Returns True if a player can type name after a command, which the game lower cases and splits."""
+    return name == " ".join(name.lower().split())
+
+
+class Solver:
+    """Searches for the fewest commands that win a game from its current state.
+
+    Attributes:
+        game (Game): The game that is solved. It isn't changed.
+        template (WorldTemplate): The template of the game's world.
+        elf (int): The index of the elf's location.
+        travel (bool): If the solver moves with travel instead of go.
+        chance_depth (int): How many chance nodes deep teleports are evaluated, 0 to never teleport.
+        chance_beam (int): The width of the beam search that solves the locations of the last level of chance
+            nodes, None to solve them with A*.
+        max_chance_nodes (int): The most chance nodes each search solves locations of to find their value.
+        table_size (int): The number of states each search keeps in its transposition table.
+        beam_width (int): The number of states a beam search keeps at each step, None for A*.
+        expanded (int): The number of states searched.
+        generated (int): The number of states reached.
+        chance_evaluations (int): The number of locations solved to find the value of chance nodes.
+        known_hits (int): The number of searches that ended at a state an earlier search had solved.
+        hits (int): The number of states skipped because they were already reached as cheaply.
+        evictions (int): The number of states evicted from transposition tables.
+    """
+    def __init__(self, game: Game, travel: bool = False, chance_depth: int = DEFAULT_CHANCE_DEPTH,
+                 max_outcomes: int = DEFAULT_MAX_OUTCOMES, table_size: int = DEFAULT_TABLE_SIZE,
+                 beam_width: Optional[int] = None, chance_beam: Optional[int] = DEFAULT_CHANCE_BEAM,
+                 max_chance_nodes: int = DEFAULT_CHANCE_NODES):
+        """Initializes class Solver for the current state of a game.
+
+        Params:
+            game (Game): The game to solve.
+            travel (bool): Move with travel, which goes anywhere in one command, instead of go.
+            chance_depth (int): How many chance nodes deep teleports are evaluated, 0 to never teleport.
+            max_outcomes (int): Teleports are only considered in worlds with at most this many locations.
+            table_size (int): The number of states each search keeps in its transposition table.
+            beam_width (int): Use a beam search that keeps this many states at each step instead of A*. It
+                needs much less memory but the solution it finds may not be the shortest and it never
+                teleports.
+            chance_beam (int): Solve the locations of the last level of chance nodes with a beam search this
+                wide, None to solve them exactly with A*, which is much slower.
+            max_chance_nodes (int): The most chance nodes each search solves locations of to find their
+                value, after which teleports whose value isn't known yet are dropped.
+
+        Raises:
+            ValueError: If NPCs of the game's world wander or get their prize food back, which the solver
+                doesn't plan for."""
+        self.game = game
+        self._world = game.get_world()
+        if self._world.template.wanderers or self._world.template.restocking:
+            raise ValueError("The solver only plans for worlds whose NPCs stay put and are only robbed once")
+        self.template = self._world.template
+        self.elf = game.get_elf_location().get_index()
+        self._num_locations = len(self.template.location_names)
+        self.travel = travel
+        self.chance_depth = chance_depth if self._num_locations <= max_outcomes and beam_width is None else 0
+        self.chance_beam = chance_beam
+        self.max_chance_nodes = max_chance_nodes
+        self.table_size = table_size
+        self.beam_width = beam_width
+        self.expanded = 0
+        self.generated = 0
+        self.chance_evaluations = 0
+        self.known_hits = 0
+        self.hits = 0
+        self.evictions = 0
+        self._items = {}
+        self._ground = {}
+        self._moves = {}
+        self._prizes = {}
+        self._chance_values = {}
+        # The cheapest way to win from every state on a solution A* found, keyed by the state and the depth of
+        # chance nodes it was found with, as (commands left on average, solution, index of its next command).
+        self._known = {}
+        self._distance = self._world.get_routes().tree(self.elf).distance
+        self._destinations = None
+        self._reachable = {}
+        self._food = self._food_table(game.get_calories_needed())
+        self._detour = None
+        self._source_distance = {}
+        distances = [self._distance[location] for location in range(self._num_locations)]
+        self._teleport_moves = math.inf if min(distances) < 0 else 1 + sum(distances) / self._num_locations
+        if not travel and self._num_locations <= MAX_DETOUR_LOCATIONS:
+            self._detour = self._detour_table()
+
+    def _item(self, index: int) -> Tuple[str, int, int, int, bool]:
+        """Returns the name, calories, weight, armed tag (0 or 1) of the item at index and if it can be typed."""
+        info = self._items.get(index)
+        if info is None:
+            template = self.template
+            name = template.item_names[index]
+            info = self._items[index] = (name, template.item_calories[index], template.item_weights[index],
+                                         int("armed" in template.item_tags[index]), typeable(name))
+        return info
+
+    def _sorted(self, items: Iterable[int]) -> Tuple[int, ...]:
+        """Returns item indexes sorted by name, keeping the order of items with the same name."""
+        return tuple(sorted(items, key=lambda index: self._item(index)[0]))
+
+    def _add(self, items: Tuple[int, ...], index: int) -> Tuple[int, ...]:
+        """Returns items with the item at index added after every item with the same name, unless it's there."""
+        if index in items:
+            return items
+        name = self._item(index)[0]
+        position = len(items)
+        while position and self._item(items[position - 1])[0] > name:
+            position -= 1
+        return items[:position] + (index,) + items[position:]
+
+    @staticmethod
+    def _remove(items: Tuple[int, ...], index: int) -> Tuple[int, ...]:
+        """Returns items without the item at index."""
+        position = items.index(index)
+        return items[:position] + items[position + 1:]
+
+    def _room(self, location: int, rooms: tuple) -> Tuple[int, ...]:
+        """Returns the items at location in a state with the given rooms."""
+        for room, items in rooms:
+            if room == location:
+                return items
+        items = self._ground.get(location)
+        if items is None:
+            changed = self._world.room_items.get(location)
+            if changed is None:
+                changed = self.template.starting_items(location)
+            items = self._ground[location] = self._sorted(item.get_index() for item in changed)
+        return items
+
+    def _set_room(self, rooms: tuple, location: int, items: Tuple[int, ...]) -> tuple:
+        """Returns rooms with the items at location replaced, leaving out rooms that are as the game has them."""
+        rooms = tuple(room for room in rooms if room[0] != location)
+        if items == self._room(location, ()):
+            return rooms
+        return tuple(sorted(rooms + ((location, items),)))
+
+    def _prize(self, location: int) -> int:
+        """Returns the index of the prize food that robbing at location gets, -1 if rob gets nothing there."""
+        prize = self._prizes.get(location)
+        if prize is None:
+            npcs = self._world.location(location).get_npcs()
+            prize = -1
+            if npcs and npcs[0].has_prize_food():
+                prize = npcs[0].get_prize_food().get_index()
+            self._prizes[location] = prize
+        return prize
+
+    def _food_table(self, calories_needed: int) -> List[int]:
+        """Returns the running totals of the calories of the best food in the world, largest first, up to
+        calories_needed.
+
+        Every food item that can be typed counts once, whether it's carried or lying somewhere, and the prize
+        food of every NPC counts as often as needed since NPCs can be robbed again after their prize was eaten.
+        The number of items a plan has to give the elf is at least the number of totals below the calories
+        it needs."""
+        calories = []
+        for location in range(self._num_locations):
+            for index in self._room(location, ()):
+                name, item_calories, _, _, can_type = self._item(index)
+                if item_calories > 0 and can_type:
+                    calories.append(item_calories)
+        for item in self.game.get_inventory():
+            name, item_calories, _, _, can_type = self._item(item.get_index())
+            if item_calories > 0 and can_type:
+                calories.append(item_calories)
+        prize = 0
+        for index in range(len(self.template.npc_keys)):
+            npc = self._world.npc(index)
+            if npc.has_prize_food():
+                name, item_calories, _, _, can_type = self._item(npc.get_prize_food().get_index())
+                if can_type:
+                    prize = max(prize, item_calories)
+        calories.sort(reverse=True)
+        totals = []
+        total = 0
+        for item_calories in calories:
+            if total >= calories_needed:
+                break
+            total += max(item_calories, prize)
+            totals.append(total)
+        while prize and total < calories_needed:
+            total += prize
+            totals.append(total)
+        return totals
+
+    def _has_food(self, items: Iterable[int]) -> bool:
+        """Returns True if any of the items is food that can be typed."""
+        for index in items:
+            info = self._item(index)
+            if info[1] > 0 and info[4]:
+                return True
+        return False
+
+    def _detour_table(self) -> array:
+        """Returns, for every location, the fewest moves from it to a location where food can be taken or robbed
+        and from there to the elf, or -1 if there is no such way."""
+        costs = {}
+        for location in range(self._num_locations):
+            distance = self._distance[location]
+            if distance < 0:
+                continue
+            prize = self._prize(location)
+            if (prize >= 0 and self._has_food((prize,))) or self._has_food(self._room(location, ())):
+                costs[location] = distance
+        return self._world.get_routes().cheapest(costs)
+
+    def _detour_from(self, location: int, rooms: tuple) -> int:
+        """Returns the fewest moves from location to the elf through a place with food, -1 if there is none."""
+        detour = self._detour[location]
+        for room, items in rooms:
+            if self._distance[room] >= 0 and self._has_food(items):
+                distance = self._source_distance.get(room)
+                if distance is None:
+                    distance = self._source_distance[room] = self._world.get_routes().tree(room).distance
+                if distance[location] >= 0 and (detour < 0 or distance[location] + self._distance[room] < detour):
+                    detour = distance[location] + self._distance[room]
+        return detour
+
+    def _estimate(self, state: tuple, depth: int) -> float:
+        """Returns a lower bound on the commands it takes to win from a state.
+
+        Each item the elf still needs is given with one command and, unless it's already carried, taken or
+        robbed with at least one more, so the estimate is the cheapest mix of carried food and the best food
+        in the world that has enough calories. Getting to the elf takes at least the distance to it, through
+        a place with food if what is carried isn't enough, or one command when the player can travel. When
+        the player can teleport, getting there costs at most the teleport and the average distance to the elf
+        from where it lands, or one command if what comes after the teleport can teleport again."""
+        location, calories_needed, _, _, inventory, rooms = state
+        food = self._food
+        carried = []
+        for index in inventory:
+            info = self._item(index)
+            if info[1] > 0 and info[4]:
+                carried.append(info[1])
+        carried.sort(reverse=True)
+        commands = math.inf
+        total = 0
+        for given in range(len(carried) + 1):
+            if given:
+                total += carried[given - 1]
+            left = calories_needed - total
+            if left <= 0:
+                commands = min(commands, given)
+                break
+            if food and left <= food[-1]:
+                commands = min(commands, given + 2 * (bisect.bisect_left(food, left) + 1))
+        if commands == math.inf:
+            return commands
+        if location == self.elf:
+            return commands
+        if self.travel:
+            return commands + 1
+        distance = self._distance[location]
+        if total < calories_needed and self._detour is not None:
+            distance = self._detour_from(location, rooms)
+        if distance < 0:
+            distance = math.inf
+        if depth > 1:
+            distance = min(distance, 1)
+        elif depth == 1:
+            distance = min(distance, self._teleport_moves)
+        return commands + distance
+
+    def _location_moves(self, location: int) -> List[Tuple[str, int]]:
+        """Returns the go or travel commands that leave location and where each one ends."""
+        moves = self._moves.get(location)
+        if moves is not None:
+            return moves
+        moves = []
+        if self.travel:
+            reachable = self._reachable_from(location)
+            for destination in self._travel_destinations():
+                if destination != location and destination in reachable:
+                    moves.append(("travel " + self.template.location_names[destination].lower(), destination))
+        else:
+            seen = {location}
+            for direction, target in self._world.location(location).get_locations().items():
+                target = target.get_index()
+                if target not in seen and typeable(direction):
+                    seen.add(target)
+                    moves.append(("go " + direction, target))
+        self._moves[location] = moves
+        return moves
+
+    def _travel_destinations(self) -> List[int]:
+        """Returns the locations worth traveling to: the elf's, the ones with something to take or rob and
+        ones that can be found by name."""
+        if self._destinations is None:
+            destinations = []
+            for location in range(self._num_locations):
+                worth = location == self.elf or self._prize(location) >= 0
+                for index in self._room(location, ()):
+                    info = self._item(index)
+                    worth = worth or (info[4] and (info[1] > 0 or info[3] > 0))
+                name = self.template.location_names[location].lower()
+                if worth and typeable(name) and self.template.find_location(name) == location:
+                    destinations.append(location)
+            self._destinations = destinations
+        return self._destinations
+
+    def _reachable_from(self, location: int) -> Set[int]:
+        """Returns the locations that can be reached from location."""
+        reachable = self._reachable.get(location)
+        if reachable is None:
+            routes = self._world.get_routes()
+            reachable = self._reachable[location] = {target for target in self._travel_destinations()
+                                                     if routes.distance(location, target) >= 0}
+        return reachable
+
+    def _successors(self, state: tuple, chance: bool) -> Iterator[Tuple[str, float, tuple, int]]:
+        """Yields the command, cost, next state and kind of every useful command in a state.
+
+        The kind is MOVE, GOAL when the command wins the game, or CHANCE when it sends the player to a
+        random location, in which case the next state has -1 as its location."""
+        location, calories_needed, weight, armed, inventory, rooms = state
+        if weight <= CARRY_LIMIT:
+            for command, target in self._location_moves(location):
+                yield command, 1, (target, calories_needed, weight, armed, inventory, rooms), MOVE
+        ground = self._room(location, rooms)
+        last_name = None
+        for index in ground:
+            name, calories, item_weight, item_armed, can_type = self._item(index)
+            if name == last_name or not can_type:
+                continue
+            last_name = name
+            # Feeding the elf an item without calories only teleports, which the teleport command does for less.
+            if calories == 0 and not item_armed:
+                continue
+            yield ("take " + name, 1,
+                   (location, calories_needed, weight + item_weight, armed + item_armed, self._add(inventory, index),
+                    self._set_room(rooms, location, self._remove(ground, index))), MOVE)
+        last_name = None
+        for index in inventory:
+            name, calories, item_weight, item_armed, can_type = self._item(index)
+            if name == last_name or not can_type:
+                continue
+            last_name = name
+            rest = self._remove(inventory, index)
+            if location != self.elf:
+                if weight <= CARRY_LIMIT:
+                    continue
+                yield ("give " + name, 1,
+                       (location, calories_needed, weight - item_weight, armed - item_armed, rest,
+                        self._set_room(rooms, location, self._add(ground, index))), MOVE)
+            elif calories > 0:
+                yield ("give " + name, 1,
+                       (location, calories_needed - calories, weight - item_weight, armed - item_armed, rest, rooms),
+                       GOAL if calories >= calories_needed else MOVE)
+            elif chance:
+                yield "give " + name, 1, (-1, calories_needed, weight - item_weight, armed - item_armed, rest, rooms), \
+                    CHANCE
+        prize = self._prize(location)
+        if prize >= 0 and prize not in inventory:
+            name, calories, item_weight, item_armed, can_type = self._item(prize)
+            yield ("rob", 1 / (ARMED_ROB_CHANCE if armed > 0 else UNARMED_ROB_CHANCE),
+                   (location, calories_needed, weight + item_weight, armed + item_armed, self._add(inventory, prize),
+                    rooms), MOVE)
+        if chance:
+            yield "teleport", 1, (-1,) + state[1:], CHANCE
+
+    def _chance_node(self, state: tuple, depth: int) -> 'ChanceNode':
+        """Returns the ChanceNode for a state whose location is -1, creating it the first time it's needed."""
+        key = (state, depth)
+        chance_node = self._chance_values.get(key)
+        if chance_node is None:
+            estimates = [(self._estimate((location,) + state[1:], depth - 1), location)
+                         for location in range(self._num_locations)]
+            chance_node = self._chance_values[key] = ChanceNode(state, depth, estimates)
+        return chance_node
+
+    def _refine(self, chance_node: 'ChanceNode') -> None:
+        """Replaces the estimate of the location whose estimate is the highest with the value of solving it."""
+        self.chance_evaluations += 1
+        estimate, location = chance_node.pending.pop()
+        chance_node.estimated -= estimate
+        start = (location,) + chance_node.state[1:]
+        if chance_node.depth == 1 and self.chance_beam is not None:
+            solution = self._beam(start, self.chance_beam)
+        else:
+            solution = self._astar(start, chance_node.depth - 1)
+        chance_node.solved += math.inf if solution is None else solution.expected_commands
+
+    def state_of(self, game: Game) -> tuple:
+        """Returns the state a game is in."""
+        inventory = game.get_inventory()
+        return (game.get_current_location().get_index(), game.get_calories_needed(), inventory.get_weight(),
+                inventory.get_tag_count("armed"), self._sorted(item.get_index() for item in inventory), ())
+
+    def solve(self) -> Optional[Solution]:
+        """Returns the solution with the fewest commands on average from the game's current state, or None if
+        the game can't be won from there."""
+        start = self.state_of(self.game)
+        if start[1] <= 0:
+            return Solution([], [], 0, False)
+        if self.beam_width is not None:
+            return self._beam(start, self.beam_width)
+        return self._astar(start, self.chance_depth)
+
+    def _solution(self, nodes: List[tuple], node: int, cost: float, chance: bool) -> Solution:
+        """Returns the solution that ends at a node, following the parents of nodes back to the start."""
+        commands = []
+        states = []
+        costs = []
+        while node:
+            parent, command, state, g = nodes[node]
+            commands.append(command)
+            states.append(None if state[0] < 0 else state)
+            costs.append(g)
+            node = parent
+        commands.reverse()
+        states.reverse()
+        costs.reverse()
+        return Solution(commands, states, cost, chance, costs)
+
+    def _remember(self, start: tuple, solution: Solution, depth: int) -> Solution:
+        """Keeps how to win from start and every state of a cheapest solution from it, and returns the solution.
+        The rest of a cheapest solution is the cheapest way to win from every state on it, so a search that
+        reaches one of them doesn't have to search further."""
+        known = self._known
+        known[(start, depth)] = (solution.expected_commands, solution, 0)
+        for position, state in enumerate(solution.states):
+            if state is not None:
+                known[(state, depth)] = (solution.expected_commands - solution.costs[position], solution, position + 1)
+        return solution
+
+    def _known_solution(self, nodes: List[tuple], node: int, g: float, state: tuple, depth: int) -> Solution:
+        """Returns the solution that gets to a known state at a node and then wins the way that was remembered."""
+        remaining, known, position = self._known[(state, depth)]
+        solution = self._solution(nodes, node, g + remaining, known.chance)
+        base = known.costs[position - 1] if position else 0
+        solution.commands.extend(known.commands[position:])
+        solution.states.extend(known.states[position:])
+        solution.costs.extend(g + cost - base for cost in known.costs[position:])
+        return solution
+
+    def _tail(self, state: tuple, depth: int) -> Solution:
+        """Returns the remembered solution from a known state."""
+        return self._known_solution([(0, "", state, 0)], 0, 0, state, depth)
+
+    def _astar(self, start: tuple, depth: int) -> Optional[Solution]:
+        """Returns the cheapest solution from start on average, with chance nodes evaluated depth levels deep.
+
+        The queue holds (f, -g, sequence number, g, kind, node) entries, where f is g plus the estimate of what
+        is left, and nodes holds the parent, command, state and g of each node. A state that an earlier search
+        found the cheapest way to win from is a KNOWN node, whose estimate is exact and which ends the search
+        like a goal when it is the cheapest node left."""
+        if (start, depth) in self._known:
+            self.known_hits += 1
+            return self._tail(start, depth)
+        chance = depth > 0
+        # The chance nodes this search solved locations of, searches it starts to solve them have their own.
+        refined = set()
+        table = TranspositionTable(self.table_size)
+        nodes = [(0, "", start, 0)]
+        queue = [(self._estimate(start, depth), 0, 0, 0, MOVE, 0)]
+        table.improve(start, 0)
+        counter = 0
+        try:
+            while queue:
+                f, _, _, g, kind, node = heapq.heappop(queue)
+                if f == math.inf:
+                    return None
+                state = nodes[node][2]
+                if kind == GOAL:
+                    return self._remember(start, self._solution(nodes, node, g, False), depth)
+                if kind == CHANCE:
+                    return self._remember(start, self._solution(nodes, node, f, True), depth)
+                if kind == KNOWN:
+                    self.known_hits += 1
+                    return self._remember(start, self._known_solution(nodes, node, g, state, depth), depth)
+                if kind == CHANCE_BOUND:
+                    chance_node = self._chance_node(state, depth)
+                    if chance_node.pending:
+                        if chance_node not in refined:
+                            if len(refined) >= self.max_chance_nodes:
+                                # The teleport is dropped, since finding out what it's worth would take too long.
+                                continue
+                            refined.add(chance_node)
+                        self._refine(chance_node)
+                    value = chance_node.value(self._num_locations)
+                    if value == math.inf:
+                        continue
+                    counter += 1
+                    heapq.heappush(queue, (g - 1 + value, -g, counter, g,
+                                           CHANCE_BOUND if chance_node.pending else CHANCE, node))
+                    continue
+                known = table.get(state)
+                if known is not None and known < g:
+                    continue
+                self.expanded += 1
+                for command, cost, successor, successor_kind in self._successors(state, chance):
+                    successor_cost = g + cost
+                    if not table.improve(successor, successor_cost):
+                        continue
+                    self.generated += 1
+                    if successor_kind == GOAL:
+                        estimate = 0
+                    elif successor_kind == CHANCE:
+                        successor_kind = CHANCE_BOUND
+                        estimate = self._chance_node(successor, depth).value(self._num_locations) - 1
+                    elif (successor, depth) in self._known:
+                        successor_kind = KNOWN
+                        estimate = self._known[(successor, depth)][0]
+                    else:
+                        estimate = self._estimate(successor, depth)
+                    if estimate == math.inf:
+                        continue
+                    nodes.append((node, command, successor, successor_cost))
+                    counter += 1
+                    heapq.heappush(queue, (successor_cost + estimate, -successor_cost, counter, successor_cost,
+                                           successor_kind, len(nodes) - 1))
+            return None
+        finally:
+            self.hits += table.hits
+            self.evictions += table.evictions
+
+    def _beam(self, start: tuple, width: int) -> Optional[Solution]:
+        """Returns a solution found by keeping only the width most promising states after each command."""
+        table = TranspositionTable(self.table_size)
+        table.improve(start, 0)
+        nodes = [(0, "", start, 0)]
+        beam = [(self._estimate(start, 0), 0, 0)]
+        best = None
+        try:
+            while beam:
+                candidates = []
+                for _, g, node in beam:
+                    self.expanded += 1
+                    for command, cost, successor, kind in self._successors(nodes[node][2], False):
+                        successor_cost = g + cost
+                        if not table.improve(successor, successor_cost):
+                            continue
+                        self.generated += 1
+                        nodes.append((node, command, successor, successor_cost))
+                        if kind == GOAL:
+                            if best is None or successor_cost < best[0]:
+                                best = (successor_cost, len(nodes) - 1)
+                            continue
+                        estimate = self._estimate(successor, 0)
+                        if estimate < math.inf:
+                            candidates.append((successor_cost + estimate, successor_cost, len(nodes) - 1))
+                candidates.sort()
+                beam = candidates[:width]
+                if best is not None and (not beam or beam[0][0] >= best[0]):
+                    break
+            if best is None:
+                return None
+            return self._solution(nodes, best[1], best[0], False)
+        finally:
+            self.hits += table.hits
+            self.evictions += table.evictions
+
+    def matches(self, game: Game, state: tuple) -> bool:
+        """Returns True if a game is in the state a solution expected it to be in."""
+        actual = self.state_of(game)
+        ground = self._sorted(item.get_index() for item in game.get_current_location().get_items())
+        return actual[:5] == state[:5] and ground == self._room(state[0], state[5])
+
+
+def play(game: Game, max_commands: int = 100000, **options) -> int:
+    """Function that wins a game by following solutions, and checks that the game does what the solver expected.
+
+    A rob is repeated until it works and after a chance node the game is solved again from where it landed.
+
+    Params:
+        game (Game): The game to play.
+        max_commands (int): The number of commands after which the game is given up.
+        options: The arguments for each Solver.
+
+    Returns:
+        commands (int): The number of commands played.
+
+    Raises:
+        ValueError: If the game can't be won or didn't do what the solver expected."""
+    played = 0
+    while game.is_running() and played < max_commands:
+        solver = Solver(game, **options)
+        solution = solver.solve()
+        if solution is None:
+            raise ValueError("The game can't be won from here")
+        for command, state in zip(solution.commands, solution.states):
+            while True:
+                result = game.execute(command)
+                played += 1
+                if not any(event[0] == "robbed" and not event[2] for event in result.events):
+                    break
+            if state is not None and game.is_running() and not solver.matches(game, state):
+                raise ValueError(f"After {command!r} the game isn't in the state the solver expected")
+    return played
+
+
+def main():
+    """Function that solves a game and prints the commands that win it, or exits with 1 if it can't be won."""
+    parser = argparse.ArgumentParser(description="Find the fewest commands that win the game.")
+    parser.add_argument("--world", metavar="FILE", default=world_loader.DEFAULT_WORLD, help="the world file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the game, which picks where the player starts")
+    parser.add_argument("--travel", action="store_true", help="move with travel instead of go")
+    parser.add_argument("--beam", type=int, metavar="WIDTH", help="use a beam search for large worlds")
+    parser.add_argument("--chance-depth", type=int, default=DEFAULT_CHANCE_DEPTH,
+                        help="how many teleports deep to look, 0 to never teleport")
+    parser.add_argument("--chance-beam", type=int, default=DEFAULT_CHANCE_BEAM, metavar="WIDTH",
+                        help="the width of the beam search that solves where a last teleport can land, 0 for A*")
+    parser.add_argument("--chance-nodes", type=int, default=DEFAULT_CHANCE_NODES, metavar="N",
+                        help="the number of teleports each search works out the value of before it drops the rest")
+    parser.add_argument("--table-size", type=int, default=DEFAULT_TABLE_SIZE,
+                        help="the number of states kept in the transposition table")
+    parser.add_argument("--play", action="store_true",
+                        help="also win the game by following the solution, to check the solver against the game")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+    options = {"travel": args.travel, "chance_depth": args.chance_depth, "table_size": args.table_size,
+               "beam_width": args.beam, "chance_beam": args.chance_beam or None,
+               "max_chance_nodes": args.chance_nodes}
+    game = Game(args.seed, args.world)
+    start = time.perf_counter()
+    try:
+        solver = Solver(game, **options)
+    except ValueError as error:
+        sys.exit(str(error))
+    solution = solver.solve()
+    elapsed = time.perf_counter() - start
+    report = {"winnable": solution is not None, "seconds": elapsed, "expanded": solver.expanded,
+              "generated": solver.generated, "table_hits": solver.hits, "table_evictions": solver.evictions,
+              "chance_evaluations": solver.chance_evaluations, "known_hits": solver.known_hits}
+    if solution is not None:
+        report.update({"expected_commands": solution.expected_commands, "commands": solution.commands,
+                       "ends_in_chance": solution.chance})
+        if args.play:
+            report["played_commands"] = play(game, **options)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            if key == "commands":
+                print("commands:\n" + "\n".join("    " + command for command in value))
+            else:
+                print(f"{key}: {value:,.4f}" if isinstance(value, float) else f"{key}: {value}")
+    if solution is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
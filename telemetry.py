@@ -0,0 +1,220 @@
+"""Class TelemetrySink, which saves what players do to a SQLite database without making commands wait for it.
+
+A Game that is given a sink hands it every command it ran and the events the command produced, such as the items
+taken and given, the calories fed to the elf, robberies and teleports. The sink only adds them to a bounded queue
+in memory. A background thread takes them off the queue in batches and writes each batch in one transaction, with
+the database in WAL mode and the same few INSERT statements, which sqlite3 prepares once and keeps in its
+statement cache. A slow disk only makes the queue longer, never a command slower.
+
+When the queue is more than half full the sink keeps only one command in every sample_every, and gives the
+commands it keeps a weight of the number of commands they stand for, so totals can still be estimated. When the
+queue is full commands are dropped. Both are counted, and the counters of every sink are saved in the database
+when it is closed.
+
+Database tables:
+    sessions (session, started, world): One row per game. session is a random 63 bit number, so the games of
+        different processes writing to the same database never share one.
+    commands (session, turn, time, command, target, valid, nanoseconds, weight): One row per command. command is
+        the command that ran, or the word that was typed when valid is 0.
+    events (session, turn, kind, value1, value2, value3, weight): One row per event of a command, with the values
+        of the event, such as the item and calories of fed or the NPC, success and armed of robbed.
+    sinks (closed, pid, emitted, written, sampled, dropped, failed): The counters of each sink that was closed."""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import *
+
+MAX_QUEUE = 65536
+SAMPLE_EVERY = 8
+BATCH_SIZE = 1024
+FLUSH_INTERVAL = 0.5
+BUSY_TIMEOUT = 5.0
+# The number of values an event can have after its kind.
+EVENT_VALUES = 3
+# The kinds of records on the queue, as their first value.
+SESSION = 0
+COMMAND = 1
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS sessions (session INTEGER PRIMARY KEY, started REAL, world TEXT)",
+          "CREATE TABLE IF NOT EXISTS commands (session INTEGER, turn INTEGER, time REAL, command TEXT, target TEXT, "
+          "valid INTEGER, nanoseconds INTEGER, weight INTEGER)",
+          "CREATE TABLE IF NOT EXISTS events (session INTEGER, turn INTEGER, kind TEXT, value1, value2, value3, "
+          "weight INTEGER)",
+          "CREATE TABLE IF NOT EXISTS sinks (closed REAL, pid INTEGER, emitted INTEGER, written INTEGER, "
+          "sampled INTEGER, dropped INTEGER, failed INTEGER)")
+INSERT_SESSION = "INSERT OR IGNORE INTO sessions VALUES (?, ?, ?)"
+INSERT_COMMAND = "INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_EVENT = "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)"
+INSERT_SINK = "INSERT INTO sinks VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Returns a connection to the telemetry database at path in WAL mode, creating its tables if they don't exist.
+    Transactions are begun and committed explicitly."""
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode a crash can only lose the last transactions, never corrupt the database.
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+class TelemetrySink:
+    """A bounded queue of commands and events, and the thread that writes them to a SQLite database.
+
+    Commands are queued by the thread that runs the games and written by the sink's own thread. The counters are
+    each only changed by one of the two threads.
+
+    Attributes:
+        path (str): The database file.
+        max_queue (int): The most records the queue holds, commands are dropped when it is full.
+        sample_above (int): The number of records above which only one command in every sample_every is kept.
+        sample_every (int): One command in this many is kept while the queue is more than half full.
+        batch_size (int): The most records written in one transaction.
+        flush_interval (float): The most seconds a record waits on the queue while the queue is short.
+        queue (deque[tuple]): The records waiting to be written.
+        emitted (int): The number of commands the games handed to the sink.
+        sampled (int): The number of commands that weren't kept because the sink was sampling.
+        dropped (int): The number of commands that were dropped because the queue was full.
+        written (int): The number of records written to the database.
+        failed (int): The number of records lost because the database couldn't be written.
+        batches (int): The number of transactions committed.
+    """
+    def __init__(self, path: str, max_queue: int = MAX_QUEUE, sample_every: int = SAMPLE_EVERY,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        """Initializes class TelemetrySink and starts its writer thread. The database is opened and its tables
+        created before this returns, so a database that can't be written is reported to the caller.
+
+        Params:
+            path (str): The database file, created if it doesn't exist.
+            max_queue (int): The most records the queue holds.
+            sample_every (int): One command in this many is kept while the queue is more than half full.
+            batch_size (int): The most records written in one transaction.
+            flush_interval (float): The most seconds a record waits on the queue while the queue is short.
+
+        Raises:
+            sqlite3.Error: If the database can't be opened or its tables can't be created."""
+        self.path = path
+        self.max_queue = max_queue
+        self.sample_above = max_queue // 2
+        self.sample_every = max(1, sample_every)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = deque()
+        self.emitted = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self._skipped = 0
+        self._closed = False
+        self._wake = threading.Event()
+        self._connection = connect(path)
+        self._thread = threading.Thread(target=self._write_loop, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def start_session(self, world: str) -> int:
+        """Queues a new game and returns its session number.
+
+        Params:
+            world (str): The world file the game plays in."""
+        session = int.from_bytes(os.urandom(8), "little") >> 1
+        if len(self.queue) < self.max_queue:
+            self.queue.append((SESSION, session, time.time(), world))
+        return session
+
+    def record(self, session: int, turn: int, command: str, target: str, valid: bool, nanoseconds: int,
+               events: List[tuple]) -> None:
+        """Queues a command and its events, unless the sink is sampling or the queue is full. Never waits.
+
+        Params:
+            session (int): The session number of the game, from start_session.
+            turn (int): The turn the command was.
+            command (str): The command that ran, or the word that was typed if it isn't a command.
+            target (str): Everything typed after the command word.
+            valid (bool): If the command was a known command.
+            nanoseconds (int): How long the command's handler took.
+            events (list[tuple]): The events the command produced, which must not be changed afterwards."""
+        self.emitted += 1
+        queue = self.queue
+        size = len(queue)
+        if size >= self.sample_above:
+            if size >= self.max_queue:
+                self.dropped += 1
+                return
+            if self._skipped < self.sample_every - 1:
+                self._skipped += 1
+                self.sampled += 1
+                return
+        queue.append((COMMAND, session, turn, time.time(), command, target, valid, nanoseconds, events,
+                      self._skipped + 1))
+        self._skipped = 0
+        if size + 1 >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+
+    def _write_loop(self) -> None:
+        """Writes the queue to the database in batches until the sink is closed and the queue is empty."""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self.queue:
+                self._write_batch()
+            if self._closed:
+                break
+
+    def _write_batch(self) -> None:
+        """Takes up to batch_size records off the queue and writes them in one transaction."""
+        queue = self.queue
+        sessions = []
+        commands = []
+        events = []
+        count = min(len(queue), self.batch_size)
+        for _ in range(count):
+            record = queue.popleft()
+            if record[0] == SESSION:
+                sessions.append(record[1:])
+                continue
+            kind, session, turn, when, command, target, valid, nanoseconds, command_events, weight = record
+            commands.append((session, turn, when, command, target, valid, nanoseconds, weight))
+            for event in command_events:
+                values = event[1:EVENT_VALUES + 1]
+                events.append((session, turn, event[0]) + values + (None,) * (EVENT_VALUES - len(values)) +
+                              (weight,))
+        connection = self._connection
+        try:
+            connection.execute("BEGIN")
+            connection.executemany(INSERT_SESSION, sessions)
+            connection.executemany(INSERT_COMMAND, commands)
+            connection.executemany(INSERT_EVENT, events)
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.rollback()
+            self.failed += count
+            return
+        self.written += count
+        self.batches += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the counters of the sink and the number of records waiting on the queue."""
+        return {"emitted": self.emitted, "written": self.written, "sampled": self.sampled, "dropped": self.dropped,
+                "failed": self.failed, "batches": self.batches, "queued": len(self.queue)}
+
+    def close(self) -> None:
+        """Writes every record still on the queue, saves the sink's counters and closes the database."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self._connection.execute(INSERT_SINK, (time.time(), os.getpid(), self.emitted, self.written, self.sampled,
+                                                   self.dropped, self.failed))
+        except sqlite3.Error:
+            pass
+        self._connection.close()
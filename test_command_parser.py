@@ -0,0 +1,131 @@
+"""Tests for class CommandGrammar: prefixes, direction aliases and lines with several commands.
+
+Usage:
+    python -m pytest test_command_parser.py
+    python -m unittest test_command_parser"""
+
+import unittest
+from typing import *
+from command_parser import CommandGrammar, DIRECTION_ALIASES
+
+# The command words of Game.
+GAME_COMMANDS = ["?", "help", "talk", "meet", "take", "give", "go", "items", "look", "quit", "q", "rob", "teleport",
+                 "travel"]
+
+
+def parsed(grammar: CommandGrammar, line: str) -> List[Tuple[Optional[str], str, str]]:
+    """Returns the command, target and text of every command of a line."""
+    return [(command.name, command.target, command.text) for command in grammar.parse(line)]
+
+
+class PrefixTest(unittest.TestCase):
+    """Checks which commands the words and prefixes of the game's commands stand for."""
+
+    def setUp(self):
+        """Compiles the grammar of the game's commands."""
+        self.grammar = CommandGrammar(GAME_COMMANDS)
+
+    def test_unique_prefixes(self):
+        """Every prefix that only one command starts with stands for it, and every command word for itself."""
+        for name in GAME_COMMANDS:
+            for end in range(1, len(name) + 1):
+                prefix = name[:end]
+                starting = [other for other in GAME_COMMANDS if other.startswith(prefix)]
+                command = self.grammar.parse_command(prefix)
+                with self.subTest(prefix=prefix):
+                    if prefix in GAME_COMMANDS:
+                        self.assertEqual(command.name, prefix)
+                    elif len(starting) == 1:
+                        self.assertEqual(command.name, name)
+                    else:
+                        self.assertIsNone(command.name)
+
+    def test_ambiguous_prefixes(self):
+        """A prefix several commands start with stands for none of them, and candidates lists them in order."""
+        for prefix, names in [("t", ["take", "talk", "teleport", "travel"]), ("ta", ["take", "talk"]),
+                              ("tr", ["travel"]), ("g", ["give", "go"]), ("x", [])]:
+            with self.subTest(prefix=prefix):
+                command = self.grammar.parse_command(f"{prefix} pepsi")
+                self.assertEqual((command.word, command.target), (prefix, "pepsi"))
+                self.assertEqual(command.name, names[0] if len(names) == 1 else None)
+                self.assertEqual(self.grammar.candidates(prefix), names)
+        self.assertEqual(self.grammar.candidates(""), [])
+
+    def test_command_word_that_is_a_prefix(self):
+        """A command word that other commands start with stands for itself, like "q" and "go"."""
+        self.assertEqual(self.grammar.parse_command("q").name, "q")
+        self.assertEqual(self.grammar.parse_command("go north").name, "go")
+        self.assertEqual(self.grammar.parse_command("qu").name, "quit")
+
+    def test_case_and_spaces(self):
+        """Words are matched in lower case and the target gets single spaces."""
+        command = self.grammar.parse_command("  TAKE   Small\tRock ")
+        self.assertEqual((command.word, command.name, command.target), ("take", "take", "small rock"))
+
+
+class DirectionAliasTest(unittest.TestCase):
+    """Checks the words that move the player."""
+
+    def test_aliases(self):
+        """Every direction alias runs go with its direction, followed by anything typed after it."""
+        grammar = CommandGrammar(GAME_COMMANDS)
+        for alias, direction in DIRECTION_ALIASES.items():
+            with self.subTest(alias=alias):
+                self.assertEqual(parsed(grammar, alias), [("go", direction, alias)])
+                self.assertEqual(parsed(grammar, f"{alias.upper()} Quickly"),
+                                 [("go", f"{direction} quickly", f"{alias.upper()} Quickly")])
+
+    def test_alias_overrides_unique_prefix(self):
+        """An alias that is also the prefix of a single command moves the player, but a command word that is an
+        alias stays the command."""
+        grammar = CommandGrammar(["go", "news", "up", "dance"])
+        self.assertEqual(grammar.parse_command("n").name, "go")
+        self.assertEqual(grammar.parse_command("ne").target, "northeast")
+        self.assertEqual(grammar.parse_command("d").target, "down")
+        self.assertEqual(grammar.parse_command("ne").name, "go")
+        self.assertEqual(grammar.parse_command("new").name, "news")
+        self.assertEqual(grammar.parse_command("da").name, "dance")
+        command = grammar.parse_command("up")
+        self.assertEqual((command.name, command.target), ("up", ""))
+
+    def test_no_go_command(self):
+        """Without a go command the aliases mean nothing, and prefixes stand for their command."""
+        grammar = CommandGrammar(["look", "news"])
+        self.assertIsNone(grammar.parse_command("s").name)
+        self.assertEqual(grammar.parse_command("n").name, "news")
+
+
+class LineTest(unittest.TestCase):
+    """Checks lines with several commands separated by semicolons."""
+
+    def setUp(self):
+        """Compiles the grammar of the game's commands."""
+        self.grammar = CommandGrammar(GAME_COMMANDS)
+
+    def test_split(self):
+        """Each part of a line is a command, in order, with the text it was parsed from."""
+        self.assertEqual(parsed(self.grammar, "take pepsi; go west;l"),
+                         [("take", "pepsi", "take pepsi"), ("go", "west", " go west"), ("look", "", "l")])
+
+    def test_empty_parts(self):
+        """Empty parts are left out, and a line of only separators and spaces is a single empty command."""
+        self.assertEqual(parsed(self.grammar, ";; n ;  ;"), [("go", "north", " n ")])
+        for line in ["", "   ", ";", " ; ;; "]:
+            with self.subTest(line=line):
+                self.assertEqual(parsed(self.grammar, line), [(None, "", line)])
+                self.assertEqual(self.grammar.parse(line)[0].word, "")
+
+    def test_parsed_lines_kept(self):
+        """A line parsed again gives the same commands, and the kept lines are emptied when there are too many."""
+        grammar = CommandGrammar(GAME_COMMANDS, max_parsed=3)
+        commands = grammar.parse("take pepsi; n")
+        self.assertIs(grammar.parse("take pepsi; n"), commands)
+        for line in ["look", "items", "rob"]:
+            grammar.parse(line)
+        self.assertLessEqual(len(grammar.parsed), 3)
+        self.assertNotIn("take pepsi; n", grammar.parsed)
+        self.assertEqual(parsed(grammar, "take pepsi; n"), [("take", "pepsi", "take pepsi"), ("go", "north", " n")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests for class Game: robbing an NPC that gets its prize food back, and changing the items of a room.
+
+Usage:
+    python -m pytest test_game.py
+    python -m unittest test_game"""
+
+import json
+import os
+import tempfile
+import unittest
+from typing import *
+from items_npc import Item
+from project2game import Game
+import world
+
+POTION = {"name": "calorie potion", "description": "This potion is sure to hold lots of calories", "calories": 190,
+          "weight": 13}
+WORLD = {"calories_needed": 100000,
+         "elf_location": "witch_house",
+         "locations": [{"id": "witch_house", "name": "Witch House", "description": "A house.",
+                        "npcs": [{"key": "witch", "name": "Witch", "description": "A witch.",
+                                  "messages": ["Hello."], "high_value": True, "prize_food": POTION,
+                                  "restock_after": 1}]}]}
+
+
+class RestockTest(unittest.TestCase):
+    """Robs a witch that gets her calorie potion back one tick after every robbery, in a world with one location
+    where the elf is too."""
+
+    def setUp(self):
+        """Writes the world file to a temporary folder."""
+        self.folder = tempfile.TemporaryDirectory()
+        self.world_path = os.path.join(self.folder.name, "world.json")
+        with open(self.world_path, "w") as file:
+            json.dump(WORLD, file)
+
+    def tearDown(self):
+        """Deletes the temporary folder."""
+        self.folder.cleanup()
+
+    def rob_until_robbed(self, game: Game) -> None:
+        """Robs the witch until a robbery works, letting the clock give her potion back first if she has none."""
+        for _ in range(1000):
+            result = game.execute("rob")
+            if any(event[0] == "robbed" and event[2] for event in result.events):
+                return
+        self.fail("The witch was never robbed")
+
+    def test_rob_twice(self):
+        """Each robbery adds a potion of its own, so both are listed and counted, and giving one away leaves the
+        totals of the other."""
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                game = Game(seed=seed, world_path=self.world_path)
+                inventory = game.get_inventory()
+                self.rob_until_robbed(game)
+                self.rob_until_robbed(game)
+                self.assertEqual(len(inventory), 2)
+                self.assertEqual(inventory.get_weight(), 2 * POTION["weight"])
+                self.assertTrue(inventory.check_totals())
+                first, second = inventory
+                self.assertIsNot(first, second)
+                game.execute("give calorie potion")
+                self.assertEqual(len(inventory), 1)
+                self.assertEqual(inventory.get_weight(), POTION["weight"])
+                self.assertTrue(inventory.check_totals())
+                self.rob_until_robbed(game)
+                self.assertEqual(len(inventory), 2)
+                self.assertTrue(inventory.check_totals())
+
+
+class RoomItemsTest(unittest.TestCase):
+    """Changes the items of the room the player starts in, in the game's own world."""
+
+    def test_items_read_only(self):
+        """The items of a room can't be changed past add_item and remove_item, which look shows at once and
+        the changes to save record."""
+        game = Game(0)
+        location = game.get_current_location()
+        items = location.get_items()
+        for method in ("add", "remove"):
+            self.assertFalse(hasattr(items, method), method)
+        game.execute("look")
+        game.get_world().changes = world.StateChanges()
+        junk = Item("shiny junk", "Some junk.", 0, 1)
+        location.add_item(junk)
+        self.assertIn(junk, location.get_items())
+        self.assertIn("shiny junk", game.execute("look").get_text())
+        self.assertIn(location.get_index(), game.get_world().changes.locations)
+        location.remove_item(junk)
+        self.assertNotIn("shiny junk", game.execute("look").get_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
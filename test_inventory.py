@@ -0,0 +1,120 @@
+"""Property tests for class Inventory: its running totals never drift from a full recount of its items.
+
+Each test plays many seeded random sequences of adds and removes, with items that share names and items tagged
+"armed", and compares the totals with a recount after every step.
+
+Usage:
+    python -m pytest test_inventory.py
+    python -m unittest test_inventory"""
+
+import random
+import unittest
+from typing import *
+from items_npc import Item
+from inventory import Inventory
+
+NAMES = ["pepsi", "small rock", "sword", "frog legs", "zero calorie potion"]
+TAGS = ["armed", "armored", "lit"]
+SEQUENCES = 200
+STEPS = 100
+
+
+def random_item(rng: random.Random) -> Item:
+    """Returns a new item with one of a few names, so that several items share each name, and some tags."""
+    tags = [tag for tag in TAGS if rng.random() < 0.3]
+    return Item(rng.choice(NAMES), "Something.", rng.randint(0, 1000), rng.randint(0, 500), tags)
+
+
+class InventoryTotalsTest(unittest.TestCase):
+    """Checks the totals of an Inventory against a recount of a list that holds the same items."""
+
+    def assert_totals(self, inventory: Inventory, carried: List[Item]) -> None:
+        """Asserts that check_totals passes and that every total matches a recount of carried."""
+        self.assertTrue(inventory.check_totals())
+        self.assertEqual(len(inventory), len(carried))
+        self.assertEqual(inventory.get_weight(), sum(item.weight for item in carried))
+        self.assertEqual(inventory.get_calories(), sum(item.num_calories for item in carried))
+        for tag in TAGS:
+            count = sum(tag in item.tags for item in carried)
+            self.assertEqual(inventory.get_tag_count(tag), count)
+            self.assertEqual(inventory.has_tag(tag), count > 0)
+
+    def test_random_adds_and_removes(self):
+        """Totals match a recount after every step of random sequences of adds and removes."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            inventory = Inventory()
+            carried = []
+            for step in range(STEPS):
+                if carried and rng.random() < 0.45:
+                    item = carried.pop(rng.randrange(len(carried)))
+                    inventory.remove(item)
+                else:
+                    item = random_item(rng)
+                    inventory.add(item)
+                    carried.append(item)
+                with self.subTest(seed=seed, step=step):
+                    self.assert_totals(inventory, carried)
+
+    def test_emptied_inventory(self):
+        """An inventory that had every item removed has totals of zero and no tags left over."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            inventory = Inventory()
+            carried = [random_item(rng) for _ in range(rng.randint(1, 20))]
+            for item in carried:
+                inventory.add(item)
+            rng.shuffle(carried)
+            while carried:
+                inventory.remove(carried.pop())
+                self.assert_totals(inventory, carried)
+            self.assertEqual((inventory.get_weight(), inventory.get_calories()), (0, 0))
+            self.assertFalse(any(inventory.has_tag(tag) for tag in TAGS))
+
+    def test_duplicate_names(self):
+        """With several items of the same name, find returns the one picked up first, and removing it leaves the
+        totals of the others."""
+        rng = random.Random(0)
+        inventory = Inventory()
+        rocks = [Item("small rock", "A rock.", rng.randint(0, 1000), rng.randint(0, 500), ["armed"] * (index % 2))
+                 for index in range(6)]
+        for rock in rocks:
+            inventory.add(rock)
+        while rocks:
+            self.assertIs(inventory.find("small rock"), rocks[0])
+            inventory.remove(rocks.pop(0))
+            self.assert_totals(inventory, rocks)
+        self.assertIsNone(inventory.find("small rock"))
+
+    def test_remove_missing_item(self):
+        """Removing an item that isn't carried raises ValueError and leaves the totals as they were."""
+        rng = random.Random(0)
+        inventory = Inventory()
+        carried = [random_item(rng) for _ in range(10)]
+        for item in carried:
+            inventory.add(item)
+        with self.assertRaises(ValueError):
+            inventory.remove(random_item(rng))
+        self.assert_totals(inventory, carried)
+
+    def test_add_carried_item(self):
+        """Adding an item that is already carried raises ValueError and leaves the totals as they were, while an
+        equal but separate item with the same name is added."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            inventory = Inventory()
+            carried = [random_item(rng) for _ in range(rng.randint(1, 20))]
+            for item in carried:
+                inventory.add(item)
+            item = rng.choice(carried)
+            with self.assertRaises(ValueError):
+                inventory.add(item)
+            self.assert_totals(inventory, carried)
+            twin = Item(item.name, item.description, item.num_calories, item.weight, item.tags)
+            inventory.add(twin)
+            carried.append(twin)
+            self.assert_totals(inventory, carried)
+
+
+if __name__ == "__main__":
+    unittest.main()
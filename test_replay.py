@@ -0,0 +1,115 @@
+"""Tests for replay.py: recording a game and replaying it from its start or from any turn in it.
+
+Each test records seeded random commands in a generated world whose NPCs wander and get their prize food back,
+with a checkpoint every few commands, and compares what replaying prints and the state it leaves the game in
+with the game that was recorded.
+
+Usage:
+    python -m pytest test_replay.py
+    python -m unittest test_replay"""
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from typing import *
+from unittest import mock
+from project2game import Game
+from test_snapshot import random_command, state_of
+import replay
+import worldgen
+
+SEEDS = 4
+COMMANDS = 80
+CHECKPOINT_EVERY = 7
+
+
+class ReplayTest(unittest.TestCase):
+    """Records and replays games of a generated world of 400 locations where every NPC wanders."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Writes the world file to a temporary folder."""
+        cls.folder = tempfile.mkdtemp()
+        cls.world_path = os.path.join(cls.folder, "world.json")
+        with open(cls.world_path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(400, npc_density=1.0, wander_chance=1.0), 10 ** 6)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Deletes the temporary folder."""
+        shutil.rmtree(cls.folder)
+
+    def record(self, seed: int) -> Tuple[str, int, List[List[str]], List[bytes]]:
+        """Plays a few commands, then records COMMANDS random commands.
+
+        Returns:
+            tuple[str, int, list[list[str]], list[bytes]]: The recording file, the turn the recording started
+                at, the lines each recorded command printed, and the state of the game when the recording
+                started and after each recorded command."""
+        rng = random.Random(seed)
+        game = Game(seed, self.world_path)
+        for _ in range(seed):
+            game.execute(random_command(game, rng))
+        path = os.path.join(self.folder, f"{self.id()}.{seed}.rec")
+        game.start_recording(path, CHECKPOINT_EVERY)
+        lines = []
+        states = [state_of(game)]
+        for _ in range(COMMANDS):
+            lines.append(game.execute(random_command(game, rng)).lines)
+            states.append(state_of(game))
+        game.stop_recording()
+        return path, seed, lines, states
+
+    def test_replay(self):
+        """Replaying a recording prints what every command printed when it was recorded."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                path, first_turn, lines, states = self.record(seed)
+                replayer = replay.Replayer(path)
+                self.assertEqual((replayer.first_turn, replayer.last_turn), (first_turn, first_turn + COMMANDS))
+                self.assertEqual(replayer.get_turns(), COMMANDS)
+                replayed = list(replayer.replay())
+                replayer.close()
+                self.assertEqual([turn for turn, _, _ in replayed],
+                                 list(range(first_turn + 1, first_turn + COMMANDS + 1)))
+                self.assertEqual([result.lines for _, _, result in replayed], lines)
+
+    def test_seek(self):
+        """Seeking to a turn, on a checkpoint or between two, gives the game as it was after that turn, and
+        replaying from it prints the same as the rest of a full replay."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                path, first_turn, lines, states = self.record(seed)
+                replayer = replay.Replayer(path)
+                for offset in (0, 1, CHECKPOINT_EVERY - 1, CHECKPOINT_EVERY, 3 * CHECKPOINT_EVERY + 2,
+                               COMMANDS - 1, COMMANDS):
+                    turn = first_turn + offset
+                    self.assertEqual(state_of(replayer.seek(turn)), states[offset], turn)
+                    tail = [result.lines for _, _, result in replayer.replay(turn, turn + 5)]
+                    self.assertEqual(tail, lines[offset:offset + 5], turn)
+                replayer.close()
+
+    def test_turn_not_recorded(self):
+        """Seeking to a turn before or after the recording raises ValueError, and so does the command line."""
+        path, first_turn, lines, states = self.record(2)
+        replayer = replay.Replayer(path)
+        for turn in (first_turn - 1, first_turn + COMMANDS + 1):
+            with self.assertRaises(ValueError):
+                replayer.seek(turn)
+        replayer.close()
+        for arguments in (["--seek", str(first_turn + COMMANDS + 1)], ["--to", str(first_turn - 1)],
+                          ["--seek", str(first_turn + 5), "--to", str(first_turn + 4)]):
+            with self.subTest(arguments=arguments):
+                with mock.patch.object(sys, "argv", ["replay.py", path, *arguments]), \
+                        contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as raised:
+                    replay.main()
+                self.assertEqual(raised.exception.code, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
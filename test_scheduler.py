@@ -0,0 +1,141 @@
+"""Tests for class TimerWheel: it wakes the same timers at the same ticks as a heap of every waiting timer.
+
+Each test plays many seeded random sequences of schedules, cancels and ticks, starting just before the end of a
+slot of some level or of what the top level reaches, so timers are moved down between levels and in and out of
+the overflow set while the sequence runs.
+
+Usage:
+    python -m pytest test_scheduler.py
+    python -m unittest test_scheduler"""
+
+import heapq
+import random
+import unittest
+from typing import *
+import scheduler
+from scheduler import TimerWheel, WHEEL_BITS, WHEEL_LEVELS, WHEEL_SPAN
+
+SEQUENCES = 100
+STEPS = 3000
+KEYS = 200
+# Ticks the sequences start at, each a little before a tick where a level of the wheel or the overflow set turns.
+STARTS = [0] + [(1 << (WHEEL_BITS * level)) - 40 for level in range(1, WHEEL_LEVELS + 1)] + [3 * WHEEL_SPAN - 40]
+
+
+class HeapTimers:
+    """The timers a TimerWheel should hold, kept in a heap with the cancelled ones left in it until they come up.
+
+    Attributes:
+        now (int): The current tick.
+        due (dict[int, int]): The tick each waiting timer is due at, keyed by the timer's key.
+        heap (list[tuple[int, int]]): The tick and key of every timer scheduled, including cancelled ones.
+    """
+    def __init__(self, now: int):
+        """Initializes class HeapTimers with no timers at tick now."""
+        self.now = now
+        self.due = {}
+        self.heap = []
+
+    def schedule(self, key: int, tick: int) -> None:
+        """Schedules a timer, replacing it if it was already waiting."""
+        self.due[key] = tick
+        heapq.heappush(self.heap, (tick, key))
+
+    def cancel(self, key: int) -> bool:
+        """Removes a timer. Returns False if it wasn't waiting."""
+        return self.due.pop(key, None) is not None
+
+    def advance(self) -> List[int]:
+        """Moves on by one tick and returns the keys of the timers due at it, in order."""
+        self.now += 1
+        keys = []
+        while self.heap and self.heap[0][0] <= self.now:
+            tick, key = heapq.heappop(self.heap)
+            if self.due.get(key) == tick:
+                del self.due[key]
+                keys.append(key)
+        return sorted(keys)
+
+
+def random_delay(rng: random.Random) -> int:
+    """Returns a number of ticks from now for a timer, from one tick to further than the top level reaches."""
+    reach = rng.choice([1 << WHEEL_BITS, 1 << (2 * WHEEL_BITS), STEPS, 1 << (3 * WHEEL_BITS), WHEEL_SPAN,
+                        4 * WHEEL_SPAN])
+    return rng.randint(1, reach)
+
+
+class TimerWheelTest(unittest.TestCase):
+    """Checks a TimerWheel against HeapTimers."""
+
+    def assert_same_timers(self, wheel: TimerWheel, reference: HeapTimers) -> None:
+        """Asserts that the wheel holds the timers of the reference, due at the same ticks."""
+        self.assertEqual(wheel.now, reference.now)
+        self.assertEqual(len(wheel), len(reference.due))
+        self.assertEqual(dict(wheel.items()), reference.due)
+
+    def test_random_sequences(self):
+        """The wheel returns the same timers as the heap at every tick of random schedules, cancels and ticks."""
+        cascaded = overflowed = 0
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            start = STARTS[seed % len(STARTS)]
+            wheel = TimerWheel(start)
+            reference = HeapTimers(start)
+            with self.subTest(seed=seed, start=start):
+                for step in range(STEPS):
+                    action = rng.random()
+                    key = scheduler.timer_key(rng.randrange(3), rng.randrange(KEYS))
+                    if action < 0.3:
+                        tick = wheel.now + random_delay(rng)
+                        wheel.schedule(key, tick)
+                        reference.schedule(key, tick)
+                    elif action < 0.4:
+                        self.assertEqual(wheel.cancel(key), reference.cancel(key))
+                    else:
+                        self.assertEqual(wheel.advance(), reference.advance())
+                    self.assertEqual(wheel.get(key), reference.due.get(key))
+                    self.assertEqual(key in wheel, key in reference.due)
+                self.assert_same_timers(wheel, reference)
+            cascaded += wheel.cascaded
+            overflowed += bool(wheel.overflow)
+        # The sequences must have moved timers down between levels and left some in the overflow set.
+        self.assertGreater(cascaded, 0)
+        self.assertGreater(overflowed, 0)
+
+    def test_timers_given_at_start(self):
+        """A wheel made with timers goes off like one they were scheduled in one at a time."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            start = STARTS[seed % len(STARTS)]
+            timers = {scheduler.timer_key(scheduler.WANDER, index): start + random_delay(rng) for index in range(KEYS)}
+            wheel = TimerWheel(start, timers.items())
+            reference = HeapTimers(start)
+            for key, tick in timers.items():
+                reference.schedule(key, tick)
+            for _ in range(STEPS):
+                self.assertEqual(wheel.advance(), reference.advance())
+            self.assert_same_timers(wheel, reference)
+
+    def test_same_tick(self):
+        """Timers due at the same tick go off together, in the order of their keys."""
+        wheel = TimerWheel()
+        keys = [scheduler.timer_key(kind, index) for index in (5, 1, 3) for kind in (scheduler.EVENT, scheduler.WANDER)]
+        for key in keys:
+            wheel.schedule(key, 100)
+        for _ in range(99):
+            self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), sorted(keys))
+        self.assertEqual(len(wheel), 0)
+
+    def test_past_tick(self):
+        """Scheduling a timer at or before the tick the wheel is at raises ValueError and changes nothing."""
+        wheel = TimerWheel(10)
+        wheel.schedule(1, 20)
+        for tick in (10, 5):
+            with self.assertRaises(ValueError):
+                wheel.schedule(1, tick)
+        self.assertEqual(wheel.get(1), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
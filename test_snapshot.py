@@ -0,0 +1,186 @@
+"""Tests for snapshot.py: saving a game to a snapshot and loading it, and replaying the journal written after one.
+
+Each test plays seeded random commands in a generated world whose NPCs wander and get their prize food back, and
+compares the loaded game with the one that was saved through the bytes of a snapshot of each, which hold the
+state of the world, the inventory and the random number generator.
+
+Usage:
+    python -m pytest test_snapshot.py
+    python -m unittest test_snapshot"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from typing import *
+from project2game import Game
+import snapshot
+import worldgen
+
+SEEDS = 10
+COMMANDS = 60
+DIRECTIONS = ["north", "south", "east", "west", "northeast", "northwest", "southeast", "southwest"]
+
+
+def random_command(game: Game, rng: random.Random) -> str:
+    """Returns a random command that is likely to change something in the game."""
+    kind = rng.random()
+    if kind < 0.35:
+        return "go " + rng.choice(DIRECTIONS)
+    if kind < 0.55:
+        items = list(game.get_current_location().get_items())
+        return "take " + rng.choice(items).get_name() if items else "look"
+    if kind < 0.7:
+        items = list(game.get_inventory())
+        return "give " + rng.choice(items).get_name() if items else "items"
+    if kind < 0.85:
+        return "rob"
+    if kind < 0.9:
+        return "teleport"
+    return "talk " + rng.choice(list(game.get_world().npcs))
+
+
+def state_of(game: Game) -> bytes:
+    """Returns the bytes of a snapshot of a game, which are the same for games in the same state."""
+    return game.get_snapshot(0).to_bytes()
+
+
+class SnapshotTest(unittest.TestCase):
+    """Saves and loads games of a generated world of 400 locations where every NPC wanders."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Writes the world file to a temporary folder."""
+        cls.folder = tempfile.mkdtemp()
+        cls.world_path = os.path.join(cls.folder, "world.json")
+        with open(cls.world_path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(400, npc_density=1.0, wander_chance=1.0), 10 ** 6)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Deletes the temporary folder."""
+        shutil.rmtree(cls.folder)
+
+    def setUp(self):
+        """Picks a path for the snapshot of each test."""
+        self.path = os.path.join(self.folder, f"{self.id()}.sav")
+
+    def play(self, game: Game, rng: random.Random, num_commands: int) -> List[bytes]:
+        """Runs random commands and returns the state of the game after each one."""
+        states = []
+        for _ in range(num_commands):
+            game.execute(random_command(game, rng))
+            states.append(state_of(game))
+        return states
+
+    def assert_same_game(self, loaded: Game, game: Game, rng: random.Random) -> None:
+        """Asserts that two games are in the same state and go on the same way."""
+        self.assertEqual(state_of(loaded), state_of(game))
+        self.assertEqual(loaded.get_snapshot().rng_state, game.get_snapshot().rng_state)
+        self.assertEqual(loaded.get_turns(), game.get_turns())
+        self.assertTrue(loaded.get_inventory().check_totals())
+        for _ in range(20):
+            command = random_command(game, rng)
+            self.assertEqual(loaded.execute(command).lines, game.execute(command).lines)
+        self.assertEqual(state_of(loaded), state_of(game))
+
+    def test_round_trip(self):
+        """A snapshot has the same bytes after it is read back, and restoring it gives the game it was taken of."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                game = Game(seed, self.world_path)
+                self.play(game, rng, COMMANDS)
+                data = game.get_snapshot(seed + 1).to_bytes()
+                saved = snapshot.SessionSnapshot.from_bytes(data)
+                self.assertEqual(saved.to_bytes(), data)
+                loaded = Game(None, self.world_path)
+                loaded.restore(saved)
+                self.assert_same_game(loaded, game, rng)
+
+    def test_save_and_load(self):
+        """A game saved to a file and loaded into a new game goes on the same way."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                game = Game(seed, self.world_path)
+                self.play(game, rng, COMMANDS)
+                game.save(self.path)
+                loaded = Game(None, self.world_path)
+                loaded.load(self.path)
+                self.assert_same_game(loaded, game, rng)
+
+    def test_journal(self):
+        """Loading a snapshot applies the journal written after it, up to the last command."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                game = Game(seed, self.world_path)
+                self.play(game, rng, COMMANDS // 2)
+                game.start_journal(self.path, 0)
+                self.play(game, rng, COMMANDS)
+                game.stop_journal()
+                loaded = Game(None, self.world_path)
+                loaded.load(self.path)
+                self.assert_same_game(loaded, game, rng)
+
+    def test_journal_cut_short(self):
+        """A journal whose last record was cut short, or whose record was damaged, is applied up to the record
+        before it."""
+        rng = random.Random(0)
+        game = Game(0, self.world_path)
+        game.start_journal(self.path, 0)
+        states = self.play(game, rng, COMMANDS)
+        game.stop_journal()
+        journal_path = self.path + snapshot.JOURNAL_SUFFIX
+        with open(journal_path, "rb") as file:
+            journal = file.read()
+        offsets = [snapshot.JOURNAL_HEADER.size]
+        while offsets[-1] < len(journal):
+            length, crc = snapshot.RECORD.unpack_from(journal, offsets[-1])
+            offsets.append(offsets[-1] + snapshot.RECORD.size + length)
+        self.assertEqual(len(offsets), COMMANDS + 1)
+        for record in range(0, COMMANDS, 7):
+            start, end = offsets[record], offsets[record + 1]
+            for damaged in (journal[:end - 1], journal[:start + 3],
+                            journal[:end - 1] + bytes([journal[end - 1] ^ 1]) + journal[end:]):
+                with self.subTest(record=record, length=len(damaged)):
+                    with open(journal_path, "wb") as file:
+                        file.write(damaged)
+                    loaded = Game(None, self.world_path)
+                    loaded.load(self.path)
+                    self.assertEqual(state_of(loaded), states[record - 1] if record else self.snapshot_state())
+
+    def snapshot_state(self) -> bytes:
+        """Returns the state of a game loaded from the snapshot at self.path without its journal."""
+        loaded = Game(None, self.world_path)
+        loaded.restore(snapshot.SessionSnapshot.read(self.path))
+        return state_of(loaded)
+
+    def test_journal_of_older_snapshot(self):
+        """A journal left over from an older snapshot isn't applied to a newer one."""
+        rng = random.Random(0)
+        game = Game(0, self.world_path)
+        game.start_journal(self.path, 0)
+        self.play(game, rng, COMMANDS // 2)
+        game.stop_journal()
+        journal_path = self.path + snapshot.JOURNAL_SUFFIX
+        shutil.copy(journal_path, journal_path + ".old")
+        self.play(game, rng, COMMANDS // 2)
+        game.save(self.path)
+        shutil.copy(journal_path + ".old", journal_path)
+        loaded = Game(None, self.world_path)
+        loaded.load(self.path)
+        self.assertEqual(state_of(loaded), state_of(game))
+
+    def test_different_world(self):
+        """Restoring a snapshot of another world raises ValueError."""
+        game = Game(0, self.world_path)
+        saved = game.get_snapshot()
+        with self.assertRaises(ValueError):
+            Game(0).restore(saved)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""Tests for trigram_index.py: one_edit_apart against an edit distance, and TrigramIndex.best against scoring every
+name.
+
+Usage:
+    python -m pytest test_trigram_index.py
+    python -m unittest test_trigram_index"""
+
+import math
+import random
+import unittest
+from typing import *
+from trigram_index import MIN_COVERAGE, SHORT_NAME, TrigramIndex, normalize, one_edit_apart, trigrams
+
+SEQUENCES = 200
+
+
+def edit_distance(first: str, second: str) -> int:
+    """Returns the number of letters that have to be changed, removed, added or swapped with the next one to turn
+    first into second, where no letter is edited twice."""
+    rows = [list(range(len(second) + 1))]
+    for row in range(1, len(first) + 1):
+        rows.append([row] + [0] * len(second))
+        for column in range(1, len(second) + 1):
+            cost = first[row - 1] != second[column - 1]
+            distance = min(rows[row - 1][column] + 1, rows[row][column - 1] + 1, rows[row - 1][column - 1] + cost)
+            if (row > 1 and column > 1 and first[row - 1] == second[column - 2]
+                    and first[row - 2] == second[column - 1]):
+                distance = min(distance, rows[row - 2][column - 2] + 1)
+            rows[row][column] = distance
+    return rows[-1][-1]
+
+
+def scan_best(names: Iterable[str], query: str, min_coverage: float = MIN_COVERAGE) -> Optional[str]:
+    """Returns the name TrigramIndex.best should find, by scoring every name."""
+    wanted = trigrams(query)
+    if not wanted:
+        return None
+    needed = max(1, math.ceil(min_coverage * len(wanted)))
+    best = None
+    best_score = None
+    for name in sorted(names):
+        grams = trigrams(name)
+        shared = len(wanted & grams)
+        score = (shared, -abs(len(grams) - len(wanted)))
+        if shared >= needed and (best_score is None or score > best_score):
+            best = name
+            best_score = score
+    if best is None and len(normalize(query)) <= SHORT_NAME:
+        best = next((name for name in sorted(names) if one_edit_apart(normalize(query), normalize(name))), None)
+    return best
+
+
+def random_name(rng: random.Random, letters: str, longest: int) -> str:
+    """Returns a name of random letters, so that random names share many trigrams."""
+    return "".join(rng.choice(letters) for _ in range(rng.randint(1, longest)))
+
+
+class OneEditTest(unittest.TestCase):
+    """Checks one_edit_apart."""
+
+    def test_examples(self):
+        """Changed, removed, added and swapped letters are one edit, anything more or nothing isn't."""
+        for first, second, expected in [("elf", "elv", True), ("elf", "el", True), ("elf", "self", True),
+                                        ("elf", "elfs", True), ("elf", "efl", True), ("elf", "lef", True),
+                                        ("ab", "ba", True), ("abcd", "badc", False), ("abc", "cba", False),
+                                        ("elf", "elf", False), ("elf", "e", False), ("", "a", True),
+                                        ("pepsi", "pespi", True), ("pepsi", "pesip", False)]:
+            with self.subTest(first=first, second=second):
+                self.assertEqual(one_edit_apart(first, second), expected)
+                self.assertEqual(one_edit_apart(second, first), expected)
+
+    def test_edit_distance(self):
+        """one_edit_apart is True exactly when the edit distance is 1, for random short words."""
+        rng = random.Random(0)
+        for _ in range(20000):
+            first = random_name(rng, "abc", 5)
+            second = random_name(rng, "abc", 5)
+            if rng.random() < 0.5:
+                # Swap two neighboring letters of first, so transpositions come up often.
+                position = rng.randrange(len(first))
+                second = first[:position] + first[position + 1:position + 2] + first[position] + first[position + 2:]
+            self.assertEqual(one_edit_apart(first, second), edit_distance(first, second) == 1, (first, second))
+
+
+class TrigramIndexTest(unittest.TestCase):
+    """Checks TrigramIndex.best against scan_best."""
+
+    def test_random_queries(self):
+        """best finds the same name as scoring every name, for random names and queries that share many
+        trigrams, so the walk of the lists stops early on many of them."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            names = {random_name(rng, "ab cd", 9) for _ in range(rng.randint(1, 40))}
+            index = TrigramIndex(names)
+            with self.subTest(seed=seed):
+                for _ in range(20):
+                    query = random_name(rng, "ab cd", 9)
+                    self.assertEqual(index.best(query), scan_best(names, query), query)
+                    self.assertEqual(index.best(query, 0.8), scan_best(names, query, 0.8), query)
+
+    def test_added_and_removed(self):
+        """After names are added and removed, best finds the same name as scoring the names left."""
+        for seed in range(SEQUENCES):
+            rng = random.Random(seed)
+            index = TrigramIndex()
+            names = set()
+            with self.subTest(seed=seed):
+                for _ in range(60):
+                    name = random_name(rng, "abcde", 7)
+                    if name in names and rng.random() < 0.5:
+                        index.remove(name)
+                        names.discard(name)
+                    else:
+                        index.add(name)
+                        names.add(name)
+                    query = random_name(rng, "abcde", 7)
+                    self.assertEqual(index.best(query), scan_best(names, query), query)
+                self.assertEqual(len(index), len(names))
+
+    def test_common_lists_not_walked(self):
+        """Once an exact name was found in the rare lists, the lists most names share aren't walked."""
+
+        class Unwalked(dict):
+            """A list of names that fails the test if it is walked."""
+            def __iter__(self):
+                raise AssertionError("a list of common trigrams was walked")
+
+        names = [f"small rock {number}" for number in range(500)] + ["pepsi"]
+        index = TrigramIndex(names)
+        for gram in trigrams("small rock"):
+            index.grams[gram] = Unwalked(index.grams[gram])
+        self.assertEqual(index.best("small rock 7"), "small rock 7")
+        self.assertEqual(index.best("small rock 123"), "small rock 123")
+        self.assertEqual(index.best("pepsi"), "pepsi")
+
+    def test_short_names(self):
+        """A short query that shares too few trigrams matches a name one letter away, the first in order."""
+        index = TrigramIndex(["elf", "Witch", "troll", "Gandalf"])
+        self.assertEqual(index.best("elv"), "elf")
+        self.assertEqual(index.best("wicth"), "Witch")
+        self.assertEqual(index.best("trol"), "troll")
+        self.assertIsNone(index.best("dragon"))
+        self.assertIsNone(index.best("gandlaf x"))
+        self.assertEqual(TrigramIndex(["cat", "bat"]).best("at"), "bat")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests for world_pages.py: a paged world that keeps only a few regions in memory plays like the whole world.
+
+Each test plays seeded random commands in a generated world, compiled into small regions, with a memory budget
+and a number of region states so small that regions are dropped and read again, and changed region states are
+written to the spill file and read back, all the time.
+
+Usage:
+    python -m pytest test_world_pages.py
+    python -m unittest test_world_pages"""
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from typing import *
+from project2game import Game
+from test_snapshot import random_command, state_of
+import world
+import world_pages
+import worldgen
+
+SEEDS = 5
+COMMANDS = 200
+REGION_SIZE = 16
+
+
+class PagedWorldTest(unittest.TestCase):
+    """Plays a generated world of 400 locations whole and paged, where no NPC wanders so both play the same."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Writes the world file and its paged world to a temporary folder, and opens the paged world with room
+        for one region and two region states."""
+        cls.folder = tempfile.mkdtemp()
+        cls.world_path = os.path.join(cls.folder, "world.json")
+        cls.pages_path = cls.world_path + world.PAGED_SUFFIX
+        with open(cls.world_path, "w") as file:
+            worldgen.write_world(file, worldgen.WorldGenerator(400, npc_density=1.0, wander_chance=0.0), 10 ** 6)
+        world_pages.compile_pages(cls.world_path, cls.pages_path, REGION_SIZE)
+        cls.template = world_pages.PagedWorldTemplate(os.path.abspath(cls.pages_path), 1, 2)
+        world_pages.add_paged_template(cls.template)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Forgets the paged world and deletes the temporary folder."""
+        world.clear_cache()
+        shutil.rmtree(cls.folder)
+
+    def test_same_as_whole(self):
+        """A paged game says the same and is in the same state as a whole game after every command, while its
+        regions are dropped and its changed region states are written back and read again."""
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                whole = Game(seed, self.world_path)
+                paged = Game(seed, self.pages_path)
+                for _ in range(COMMANDS):
+                    command = random_command(whole, rng)
+                    self.assertEqual(paged.execute(command).lines, whole.execute(command).lines, command)
+                    self.assertEqual(state_of(paged), state_of(whole), command)
+                state = paged.get_world()
+                self.assertGreater(state.write_backs, 0)
+                self.assertGreater(len(state.spilled), 2)
+
+    def test_reading_items_writes_nothing(self):
+        """Looking at the items of rooms doesn't count their regions as changed, so regions that were written
+        to the spill file aren't written again when they are read back and dropped."""
+        game = Game(0, self.pages_path)
+        state = game.get_world()
+        locations = range(0, len(state.locations), REGION_SIZE // 2)
+        for location in locations:
+            state.locations[location].set_visited()
+        state.flush()
+        write_backs = state.write_backs
+        self.assertGreater(write_backs, 2)
+        for _ in range(2):
+            for location in locations:
+                list(state.items_at(location))
+                list(state.locations[location].get_items())
+        state.flush()
+        self.assertEqual(state.write_backs, write_backs)
+
+    def test_invalid_world(self):
+        """A world that is found to be invalid while it is compiled raises ValueError and leaves no file."""
+        with open(self.world_path) as file:
+            source = json.load(file)
+        npcs = [npc for location in source["locations"] for npc in location.get("npcs", [])]
+        npcs[-1]["key"] = npcs[0]["key"]
+        invalid_path = os.path.join(self.folder, "invalid.json")
+        with open(invalid_path, "w") as file:
+            json.dump(source, file)
+        pages_path = invalid_path + world.PAGED_SUFFIX
+        with self.assertRaises(ValueError):
+            world_pages.compile_pages(invalid_path, pages_path, REGION_SIZE)
+        left = [name for name in os.listdir(self.folder) if name.startswith(os.path.basename(pages_path))]
+        self.assertEqual(left, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""Class TrigramIndex, which finds the name that best matches a partial or misspelled one.
+
+A name is split into its trigrams, the overlapping runs of three characters of the lower case name with a space
+added on each side, and the index maps every trigram to the names that have it. A name matches a query when it
+has at least MIN_COVERAGE of the query's trigrams, so "burger" finds "15 day old burger" and "pepsy" finds
+"pepsi". A name that has needed of the query's trigrams must have one of the len(query) - needed + 1 rarest of
+them, so only the names listed under those are scored and the trigrams most names share are never walked. Once
+a name was found, a list is only walked while a name first seen in it could still have as many of the trigrams
+as that name, which for a close match ends after the first few lists.
+
+One wrong, missing, extra or swapped letter changes at most three trigrams, which leaves short names like "elf"
+below MIN_COVERAGE. A query of at most SHORT_NAME characters that matched nothing is therefore compared letter by
+letter with the names whose length is within one of its own, and matches a name that is one such edit away, so
+"elv" finds "elf". Names are kept by their length for this, so the longer names are never looked at.
+
+The best name has the most of the query's trigrams, then the number of trigrams closest to the query's, then
+comes first in alphabetical order. It doesn't depend on the order names were added in, so a game restored from a
+snapshot picks the same names as the game that was saved."""
+
+import math
+from typing import *
+
+MIN_COVERAGE = 0.5
+# Queries up to this long match a name one letter away, from this length on a wrong letter keeps enough trigrams.
+SHORT_NAME = 6
+
+
+def normalize(text: str) -> str:
+    """Returns text in lower case, with runs of whitespace made single spaces and no whitespace on either side."""
+    return " ".join(text.lower().split())
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Returns the trigrams of text, normalized and with a space added on each side."""
+    padded = f" {normalize(text)} "
+    return frozenset(padded[start:start + 3] for start in range(len(padded) - 2))
+
+
+def one_edit_apart(first: str, second: str) -> bool:
+    """Returns True if second is first with one letter changed, removed, added or swapped with the next one."""
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) - len(first) > 1 or first == second:
+        return False
+    start = 0
+    while start < len(first) and first[start] == second[start]:
+        start += 1
+    if len(first) < len(second):
+        return first[start:] == second[start + 1:]
+    return (first[start + 1:] == second[start + 1:] or
+            (first[start + 2:] == second[start + 2:] and first[start:start + 2] == second[start + 1::-1][:2]))
+
+
+class TrigramIndex:
+    """A set of names that can be searched by partial or misspelled names.
+
+    Attributes:
+        grams (dict[str, dict[str, None]]): The names that have each trigram.
+        names (dict[str, frozenset[str]]): The trigrams of each name.
+        short (dict[int, dict[str, str]]): The normalized form of every name of at most SHORT_NAME + 1
+            characters, keyed by its length and then by the name.
+    """
+    __slots__ = ("grams", "names", "short")
+
+    def __init__(self, names: Iterable[str] = ()):
+        """Initializes class TrigramIndex with the names from the input parameter.
+
+        Params:
+            names (Iterable[str]): The names the index starts with."""
+        self.grams = {}
+        self.names = {}
+        self.short = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str) -> None:
+        """Adds a name to the index, if it isn't in it already."""
+        if name in self.names:
+            return
+        grams = self.names[name] = trigrams(name)
+        for gram in grams:
+            posting = self.grams.get(gram)
+            if posting is None:
+                self.grams[gram] = {name: None}
+            else:
+                posting[name] = None
+        normalized = normalize(name)
+        if len(normalized) <= SHORT_NAME + 1:
+            self.short.setdefault(len(normalized), {})[name] = normalized
+
+    def remove(self, name: str) -> None:
+        """Removes a name from the index, if it is in it."""
+        grams = self.names.pop(name, None)
+        if grams is None:
+            return
+        for gram in grams:
+            posting = self.grams[gram]
+            del posting[name]
+            if not posting:
+                del self.grams[gram]
+        normalized = normalize(name)
+        names = self.short.get(len(normalized))
+        if names is not None and name in names:
+            del names[name]
+            if not names:
+                del self.short[len(normalized)]
+
+    def best(self, query: str, min_coverage: float = MIN_COVERAGE) -> Optional[str]:
+        """Returns the name that best matches query, or None if no name has min_coverage of its trigrams and,
+        for a query of at most SHORT_NAME characters, no name is one letter away from it.
+
+        Params:
+            query (str): What the player typed. Ex: "burger"
+            min_coverage (float): The fraction of the query's trigrams a name must have to match."""
+        wanted = trigrams(query)
+        if not wanted or not self.names:
+            return None
+        needed = max(1, math.ceil(min_coverage * len(wanted)))
+        empty = {}
+        postings = sorted((self.grams.get(gram, empty) for gram in wanted), key=len)
+        best = None
+        best_score = None
+        seen = set()
+        for position, posting in enumerate(postings):
+            # A name first seen here isn't in the rarer lists, so it has at most this many of the trigrams.
+            most = len(wanted) - position
+            if most < needed or (best_score is not None and most < best_score[0]):
+                break
+            for name in posting:
+                if name in seen:
+                    continue
+                seen.add(name)
+                grams = self.names[name]
+                shared = len(wanted & grams)
+                if shared < needed:
+                    continue
+                score = (shared, -abs(len(grams) - len(wanted)))
+                if best_score is None or score > best_score or (score == best_score and name < best):
+                    best = name
+                    best_score = score
+        if best is None:
+            best = self._one_edit(normalize(query))
+        return best
+
+    def _one_edit(self, query: str) -> Optional[str]:
+        """Returns the first name in alphabetical order that is one letter away from the normalized query, or None if
+        there is none or the query is longer than SHORT_NAME."""
+        if len(query) > SHORT_NAME:
+            return None
+        best = None
+        for length in (len(query) - 1, len(query), len(query) + 1):
+            for name, normalized in self.short.get(length, {}).items():
+                if (best is None or name < best) and one_edit_apart(query, normalized):
+                    best = name
+        return best
+
+    def __contains__(self, name: object) -> bool:
+        """Returns True if the name is in the index."""
+        return name in self.names
+
+    def __len__(self) -> int:
+        """Returns the number of names in the index."""
+        return len(self.names)
@@ -0,0 +1,911 @@
+"""Classes that share one read-only copy of a world between every game in a process.
+
+WorldTemplate holds everything about a world that never changes: the names and descriptions of the
+locations, the exits between them, the items and the NPC message tables. It is built once per world
+file. Each game then gets a WorldState that only holds what that game changed: where items were moved
+to, which locations were visited, the message number, prize food and location of each NPC and the
+timers of its world clock. Everything a game hasn't touched is read straight from the template.
+
+SessionLocation and SessionNPC are Location and NPC objects that read from a template and write to
+a WorldState, so the game code can keep using them like any other Location and NPC.
+
+Building a template walks every location, item and NPC of the compiled world, so once it is built its columns
+are saved as an image next to the compiled world, in the __pycache__ folder next to the world file. The image
+is stamped with the size and modification time of the world file, the way Python stamps .pyc files, so the
+next process that plays that world checks it with one stat and unmarshals the columns without reading the
+world file, hashing it or building anything.
+
+Image file format:
+    IMAGE_HEADER (magic, image version, compiled format version, size and modification time in nanoseconds of
+    the world file), then marshal of (values, arrays): the IMAGE_VALUES attributes of the template, then the
+    type code and bytes of each of its IMAGE_ARRAYS attributes."""
+
+import marshal
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Mapping, Sequence
+from typing import *
+from items_npc import Item, NPC
+from item_index import ItemIndex, ItemView
+from locations_zork import Location
+from routing import RouteGraph
+from scheduler import TimerWheel
+from trigram_index import TrigramIndex
+import world_loader
+
+# Templates that were already built by this process, keyed by path, size and modification time of their world file.
+_templates = {}
+# The extension of world files that are split into regions and loaded a region at a time.
+PAGED_SUFFIX = ".pages"
+IMAGE_SUFFIX = ".image"
+IMAGE_MAGIC = b"ZIMG"
+IMAGE_VERSION = 1
+# magic, image version, compiled format version, size and modification time of the world file
+IMAGE_HEADER = struct.Struct("<4sHHQq")
+# The attributes of a WorldTemplate that its image holds as they are.
+IMAGE_VALUES = ("calories_needed", "elf_index", "location_names", "location_descriptions", "direction_names",
+                "item_names", "item_descriptions", "item_tags", "npc_keys", "npc_names", "npc_descriptions",
+                "npc_messages", "npc_high_value", "wanderers", "restocking", "events", "location_npcs", "npc_index",
+                "location_lookup")
+# The array attributes of a WorldTemplate, which its image holds as their type code and bytes.
+IMAGE_ARRAYS = ("exit_offsets", "exit_directions", "exit_targets", "item_calories", "item_weights", "item_locations",
+                "location_item_ids", "location_item_offsets", "npc_prize_ids", "npc_locations", "npc_wander_every",
+                "npc_restock_after")
+
+
+class WorldTemplate:
+    """The static part of a world, shared read-only by every game that uses it.
+
+    Locations, items and NPCs are numbered and their data is stored in columns, one array or tuple per
+    attribute, with every string interned. Item, NPC and Location objects are only created as views
+    over these columns when a game needs them.
+
+    Attributes:
+        calories_needed (int): The number of calories the elf needs to win the game.
+        elf_index (int): The index of the location where the elf is waiting.
+        location_names (tuple[str]): The name of each location.
+        location_descriptions (tuple[str]): The description of each location.
+        direction_names (tuple[str]): Every direction used by an exit.
+        exit_offsets (array[int]): The exits of location i are at exit_offsets[i] to exit_offsets[i + 1].
+        exit_directions (array[int]): The index in direction_names of the direction of each exit.
+        exit_targets (array[int]): The index of the location each exit leads to.
+        item_names (tuple[str]): The name of each item.
+        item_descriptions (tuple[str]): The description of each item.
+        item_calories (array[int]): The number of calories of each item.
+        item_weights (array[int]): The weight of each item.
+        item_locations (array[int]): The index of the location each item starts in, -1 for prize foods.
+        item_tags (tuple[frozenset[str]]): The capabilities of each item. Items with the same tags share one set.
+        location_item_offsets (array[int]): The items location i starts with are at location_item_offsets[i]
+            to location_item_offsets[i + 1] in location_item_ids.
+        location_item_ids (array[int]): The index of each item that starts in a location, grouped by location.
+        npc_keys (tuple[str]): The lower case name players type to talk to each NPC.
+        npc_names (tuple[str]): The name of each NPC.
+        npc_descriptions (tuple[str]): The description of each NPC.
+        npc_messages (tuple[list[str]]): The messages each NPC can say.
+        npc_high_value (bytes): 1 if the NPC starts with a high value food, else 0.
+        npc_prize_ids (array[int]): The index of the prize food item of each NPC.
+        npc_locations (array[int]): The index of the location each NPC starts in.
+        npc_wander_every (array[int]): The number of ticks between the moves of each NPC, 0 if it stays put.
+        npc_restock_after (array[int]): The number of ticks after which each NPC gets its prize food back once it
+            was robbed, 0 for never.
+        location_npcs (dict[int, tuple[int]]): The indexes of the NPCs each location that has any starts with.
+        wanderers (tuple[tuple[int, int]]): The index and wander_every of every NPC that wanders.
+        restocking (bool): If any NPC gets its prize food back.
+        events (tuple[tuple[int, int, str, int]]): The start, every, message and location index of every timed
+            event, where the location index is -1 for events announced everywhere.
+        npc_index (dict[str, int]): A dictionary from an NPC key to the index of that NPC.
+        item_views (dict[int, StoredItem]): The item views created so far. Items never change, so the
+            same views are used by every game.
+        location_lookup (dict[str, int]): A dictionary from a lower case location name to its index.
+        routes (RouteGraph): The shortest paths between locations, None until they are first needed.
+    """
+    def __init__(self, compiled: tuple):
+        """Initializes class WorldTemplate from a compiled world.
+
+        Params:
+            compiled (tuple): A world returned by world_loader.load_world or world_loader.compile_world."""
+        version, calories_needed, elf_index, location_table, item_table, npc_table, events = compiled
+        intern = sys.intern
+        self.calories_needed = calories_needed
+        self.elf_index = elf_index
+
+        self.location_names = tuple(intern(location[0]) for location in location_table)
+        self.location_descriptions = tuple(intern(location[1]) for location in location_table)
+        direction_index = {}
+        self.exit_offsets = array("l", [0])
+        self.exit_directions = array("H")
+        self.exit_targets = array("l")
+        for name, description, exits in location_table:
+            for direction, target in exits:
+                self.exit_directions.append(direction_index.setdefault(intern(direction), len(direction_index)))
+                self.exit_targets.append(target)
+            self.exit_offsets.append(len(self.exit_targets))
+        self.direction_names = tuple(direction_index)
+
+        self.item_names = tuple(intern(item[0]) for item in item_table)
+        self.item_descriptions = tuple(intern(item[1]) for item in item_table)
+        self.item_calories = array("H", (item[2] for item in item_table))
+        self.item_weights = array("H", (item[3] for item in item_table))
+        self.item_locations = array("l", (item[4] for item in item_table))
+        tag_sets = {}
+        self.item_tags = tuple(tag_sets.setdefault(frozenset(item[5]), frozenset(item[5])) for item in item_table)
+        by_location = sorted((location, index) for index, location in enumerate(self.item_locations)
+                             if location >= 0)
+        self.location_item_ids = array("l", (index for location, index in by_location))
+        self.location_item_offsets = array("l", [0]) * (len(location_table) + 1)
+        for location, index in by_location:
+            self.location_item_offsets[location + 1] += 1
+        for location in range(len(location_table)):
+            self.location_item_offsets[location + 1] += self.location_item_offsets[location]
+
+        self.npc_keys = tuple(intern(npc[0]) for npc in npc_table)
+        self.npc_names = tuple(intern(npc[1]) for npc in npc_table)
+        self.npc_descriptions = tuple(intern(npc[2]) for npc in npc_table)
+        self.npc_messages = tuple([intern(message) for message in npc[3]] for npc in npc_table)
+        self.npc_high_value = bytes(bool(npc[4]) for npc in npc_table)
+        self.npc_prize_ids = array("l", (npc[5] for npc in npc_table))
+        self.npc_locations = array("l", (npc[6] for npc in npc_table))
+        self.npc_wander_every = array("l", (npc[7] for npc in npc_table))
+        self.npc_restock_after = array("l", (npc[8] for npc in npc_table))
+        self.wanderers = tuple((index, every) for index, every in enumerate(self.npc_wander_every) if every)
+        self.restocking = any(self.npc_restock_after)
+        self.events = tuple((start, every, intern(message), location) for start, every, message, location in events)
+        location_npcs = {}
+        for index, location in enumerate(self.npc_locations):
+            location_npcs.setdefault(location, []).append(index)
+        self.location_npcs = {location: tuple(npcs) for location, npcs in location_npcs.items()}
+        self.npc_index = {key: index for index, key in enumerate(self.npc_keys)}
+        self.item_views = {}
+        self.location_lookup = {}
+        for index, name in enumerate(self.location_names):
+            self.location_lookup.setdefault(name.lower().rstrip("."), index)
+        self.routes = None
+
+    @classmethod
+    def from_image(cls, data: bytes) -> 'WorldTemplate':
+        """Returns the template whose columns were saved by to_image, without building anything again."""
+        values, arrays = marshal.loads(data)
+        template = cls.__new__(cls)
+        for name, value in zip(IMAGE_VALUES, values):
+            setattr(template, name, value)
+        for name, (typecode, data) in zip(IMAGE_ARRAYS, arrays):
+            column = array(typecode)
+            column.frombytes(data)
+            setattr(template, name, column)
+        template.item_views = {}
+        template.routes = None
+        return template
+
+    def to_image(self) -> bytes:
+        """Returns the columns of this template marshalled, for from_image. The item views and routes are left out,
+        since they are only built when a game needs them."""
+        return marshal.dumps((tuple(getattr(self, name) for name in IMAGE_VALUES),
+                              tuple((getattr(self, name).typecode, getattr(self, name).tobytes())
+                                    for name in IMAGE_ARRAYS)))
+
+    def get_routes(self) -> RouteGraph:
+        """Returns the RouteGraph of this world's exits, compiling it the first time it's needed."""
+        if self.routes is None:
+            self.routes = RouteGraph(len(self.location_names), self.exit_offsets, self.exit_targets,
+                                     self.exit_directions, self.direction_names)
+        return self.routes
+
+    def is_static(self) -> bool:
+        """Returns True if nothing in this world changes on its own, so games of it need no world clock."""
+        return not (self.wanderers or self.restocking or self.events)
+
+    def wander_region(self) -> int:
+        """Returns the number of locations in each region whose NPCs only wander while the player is in it, or 0
+        if NPCs wander wherever the player is. Games of worlds where this differs play differently, so snapshots
+        and recordings save it."""
+        return 0
+
+    def find_location(self, name: str) -> Optional[int]:
+        """Returns the index of the location with the given name, ignoring case, or None if there isn't one."""
+        return self.location_lookup.get(name.lower().rstrip("."))
+
+    def item(self, index: int) -> 'StoredItem':
+        """Returns the StoredItem for the item at index, creating it the first time it's needed."""
+        view = self.item_views.get(index)
+        if view is None:
+            view = self.item_views[index] = StoredItem(self, index)
+        return view
+
+    def starting_items(self, location: int) -> Tuple['StoredItem', ...]:
+        """Returns the items the location at index location starts with."""
+        offsets = self.location_item_offsets
+        return tuple(self.item(index) for index in self.location_item_ids[offsets[location]:offsets[location + 1]])
+
+    def exits_of(self, location: int) -> Dict[str, int]:
+        """Returns a dictionary from each direction of the location at index location to the index of the
+        location in that direction."""
+        start, end = self.exit_offsets[location], self.exit_offsets[location + 1]
+        return {self.direction_names[self.exit_directions[exit]]: self.exit_targets[exit]
+                for exit in range(start, end)}
+
+    def new_state(self) -> 'WorldState':
+        """Returns a new, untouched WorldState for a game that uses this template."""
+        return WorldState(self)
+
+
+class StoredItem(Item):
+    """An Item whose data is read from the columns of a WorldTemplate.
+
+    Attributes:
+        template (WorldTemplate): The template the item's data is stored in.
+        index (int): The index of this item in the template.
+    """
+    __slots__ = ("_template", "_index")
+
+    def __init__(self, template: WorldTemplate, index: int):
+        """Initializes class StoredItem for the item at index. Nothing is copied from the template."""
+        self._template = template
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        """The name of this item."""
+        return self._template.item_names[self._index]
+
+    @property
+    def description(self) -> str:
+        """The description of this item."""
+        return self._template.item_descriptions[self._index]
+
+    @property
+    def num_calories(self) -> int:
+        """The number of calories this item has."""
+        return self._template.item_calories[self._index]
+
+    @property
+    def weight(self) -> int:
+        """The weight of this item."""
+        return self._template.item_weights[self._index]
+
+    @property
+    def tags(self) -> frozenset:
+        """The capabilities this item gives the player who carries it."""
+        return self._template.item_tags[self._index]
+
+    def __eq__(self, other: object) -> bool:
+        """Returns True if other is a view of the same item of the same template."""
+        return (isinstance(other, StoredItem) and other._index == self._index
+                and other._template is self._template)
+
+    def __hash__(self) -> int:
+        """Returns the hash of the item's index, so equal views are found in sets and dictionaries."""
+        return hash(self._index)
+
+    def get_index(self) -> int:
+        """Returns the index of this item in the template."""
+        return self._index
+
+
+class StateChanges:
+    """The parts of a WorldState that changed since the changes were last cleared, so they can be saved
+    without looking at the rest of the world.
+
+    Attributes:
+        locations (set[int]): The indexes of the locations whose items changed.
+        visited (set[int]): The indexes of the locations that were visited for the first time.
+        npcs (set[int]): The indexes of the NPCs whose message number, prize food, name or location changed.
+        exits (bool): If exits were added.
+        timers (set[int]): The keys of the timers that were scheduled, cancelled or went off.
+    """
+    __slots__ = ("locations", "visited", "npcs", "exits", "timers")
+
+    def __init__(self):
+        """Initializes class StateChanges with nothing changed."""
+        self.locations = set()
+        self.visited = set()
+        self.npcs = set()
+        self.exits = False
+        self.timers = set()
+
+    def clear(self) -> None:
+        """Forgets every change."""
+        self.locations.clear()
+        self.visited.clear()
+        self.npcs.clear()
+        self.exits = False
+        self.timers.clear()
+
+
+class WorldState:
+    """The part of a world that a single game changed.
+
+    Attributes:
+        template (WorldTemplate): The template this state is an overlay of.
+        visited (set[int]): The indexes of the locations the player has visited.
+        room_items (dict[int, ItemIndex]): The items of each location whose items were looked at or changed.
+            Locations that aren't in the dictionary still have the items they started with.
+        message_num (dict[int, int]): The current message number of each NPC that has talked.
+        high_value (dict[int, bool]): If an NPC still has its prize food, for NPCs that were robbed.
+        renamed (dict[int, dict[str, str]]): The name or description of each NPC that was changed for this game.
+        location_views (dict[int, SessionLocation]): The SessionLocation objects created so far.
+        npc_views (dict[int, SessionNPC]): The SessionNPC objects created so far.
+        extra_exits (dict[int, dict[str, int]]): Exits added by this game, keyed by the location they leave from.
+        routes (RouteGraph): This game's own copy of the template's RouteGraph, only once it has added exits.
+        timers (TimerWheel): The timers of this game's world clock, None if the world doesn't need one.
+        locations (LocationList): Every location of this game, as a list.
+        npcs (NpcRegistry): Every NPC of this game, keyed by the name players type, and where each one is.
+        changes (StateChanges): What changed since the changes were last saved, None if they aren't tracked.
+        versions (dict[int, int]): How many times the items, NPCs or exits of each watched location changed since
+            it was first watched, so text that describes a location can tell when it's out of date. Only the
+            locations whose text is kept are watched, so the dictionary doesn't grow with the world.
+        visits (int): How many locations set_visited visited for the first time.
+    """
+    def __init__(self, template: WorldTemplate):
+        """Initializes class WorldState with nothing changed yet."""
+        self.template = template
+        self.visited = set()
+        self.room_items = {}
+        self.message_num = {}
+        self.high_value = {}
+        self.renamed = {}
+        self.location_views = {}
+        self.npc_views = {}
+        self.extra_exits = {}
+        self.routes = None
+        self.timers = None
+        self.locations = LocationList(self)
+        self.npcs = NpcRegistry(self)
+        self.changes = None
+        self.versions = {}
+        self.visits = 0
+
+    def location(self, index: int) -> 'SessionLocation':
+        """Returns the SessionLocation for the location at index, creating it the first time it's needed."""
+        view = self.location_views.get(index)
+        if view is None:
+            view = self.location_views[index] = SessionLocation(self, index)
+        return view
+
+    def npc(self, index: int) -> 'SessionNPC':
+        """Returns the SessionNPC for the NPC at index, creating it the first time it's needed."""
+        view = self.npc_views.get(index)
+        if view is None:
+            view = self.npc_views[index] = SessionNPC(self, index)
+        return view
+
+    def exits_of(self, index: int) -> Dict[str, int]:
+        """Returns a new dictionary from each direction to the index of the location the location at index leads
+        to, including the exits this game added."""
+        exits = self.template.exits_of(index)
+        if index in self.extra_exits:
+            exits.update(self.extra_exits[index])
+        return exits
+
+    def touch(self, index: int) -> None:
+        """Records that the items, NPCs or exits of the location at index changed, if it is watched."""
+        if index in self.versions:
+            self.versions[index] += 1
+
+    def watch(self, index: int) -> int:
+        """Starts counting the changes of the location at index, if they aren't counted yet, and returns its
+        version."""
+        return self.versions.setdefault(index, 0)
+
+    def unwatch(self, index: int) -> None:
+        """Stops counting the changes of the location at index."""
+        self.versions.pop(index, None)
+
+    def simulates(self, location: int, here: int) -> bool:
+        """Returns True if the NPCs in the location at index location move on their own while the player is in
+        the location at index here. They always do, unless the world is too big to keep moving all of them."""
+        return True
+
+    def get_routes(self) -> RouteGraph:
+        """Returns the RouteGraph for this game, which is the template's graph unless this game added exits."""
+        if self.routes is None:
+            return self.template.get_routes()
+        return self.routes
+
+    def add_exit(self, source: int, direction: str, target: int) -> None:
+        """Adds an exit for this game only.
+
+        Params:
+            source (int): The index of the location the exit leaves from.
+            direction (str): The direction of the exit.
+            target (int): The index of the location the exit leads to."""
+        self.extra_exits.setdefault(source, {})[direction] = target
+        self.touch(source)
+        if self.changes is not None:
+            self.changes.exits = True
+        if self.routes is None:
+            self.routes = self.template.get_routes().copy()
+        self.routes.add_exit(source, direction, target)
+
+    def items_at(self, index: int) -> ItemIndex:
+        """Returns the ItemIndex of the items at the location at index that belongs to this game only.
+
+        The list is created from the template the first time the location's items are needed."""
+        items = self.room_items.get(index)
+        if items is None:
+            items = self.room_items[index] = ItemIndex(self.template.starting_items(index))
+        return items
+
+    def start_timers(self, now: int) -> None:
+        """Gives this game a world clock at tick now, if it doesn't have one yet."""
+        if self.timers is None:
+            self.timers = TimerWheel(now)
+
+    def schedule(self, key: int, tick: int) -> None:
+        """Schedules a timer of this game's world clock, which must have been started.
+
+        Params:
+            key (int): The key of the timer, from scheduler.timer_key.
+            tick (int): The tick the timer is due at."""
+        self.timers.schedule(key, tick)
+        if self.changes is not None:
+            self.changes.timers.add(key)
+
+    def advance_timers(self) -> List[int]:
+        """Moves this game's world clock on by one tick and returns the keys of the timers that went off."""
+        keys = self.timers.advance()
+        if keys and self.changes is not None:
+            self.changes.timers.update(keys)
+        return keys
+
+
+class LocationList(Sequence):
+    """A read-only list of every location of a game, that only creates the locations that are used."""
+    def __init__(self, state: WorldState):
+        """Initializes class LocationList for the given state."""
+        self._state = state
+
+    def __len__(self) -> int:
+        """Returns the number of locations in the world."""
+        return len(self._state.template.location_names)
+
+    def __getitem__(self, index: int) -> 'SessionLocation':
+        """Returns the location at index."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("location index out of range")
+        return self._state.location(index)
+
+
+class NpcRegistry(Mapping):
+    """A read-only dictionary from the name players type to the NPC, that only creates the NPCs that are used,
+    and that knows where every NPC of a game is.
+
+    The location of an NPC is looked up by its index and the NPCs of a location by the location's index, both
+    in constant time, so checking that an NPC is in the player's location never looks at the other NPCs
+    there. The NPCs of a location whose NPCs never changed are read from the template. Moving an NPC updates
+    the sorted list of the NPCs of the location it left and of the one it went to, so listing the NPCs of a
+    location never filters them, and a list is dropped once its location has the NPCs it started with again.
+
+    Attributes:
+        moved (dict[int, int]): The index of the location of each NPC that isn't in the location it started in.
+        rooms (dict[int, list[int]]): The indexes of the NPCs in each location whose NPCs aren't the ones it
+            started with, sorted.
+        keys (dict[int, TrigramIndex]): The keys of the NPCs in each location an NPC was looked for by a key that
+            isn't one, kept up to date as NPCs move.
+    """
+    def __init__(self, state: WorldState):
+        """Initializes class NpcRegistry for the given state, with every NPC where it starts."""
+        self._state = state
+        self.moved = {}
+        self.rooms = {}
+        self.keys = {}
+
+    def __getitem__(self, key: str) -> 'SessionNPC':
+        """Returns the NPC with the given key."""
+        return self._state.npc(self._state.template.npc_index[key])
+
+    def __contains__(self, key: object) -> bool:
+        """Returns True if there is an NPC with the given key."""
+        return key in self._state.template.npc_index
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the NPC keys."""
+        return iter(self._state.template.npc_index)
+
+    def __len__(self) -> int:
+        """Returns the number of NPCs."""
+        return len(self._state.template.npc_index)
+
+    def index_of(self, key: str) -> Optional[int]:
+        """Returns the index of the NPC with the given key, or None if there isn't one."""
+        npc_index = self._state.template.npc_index
+        return npc_index[key] if key in npc_index else None
+
+    def match(self, key: str, location: int) -> Optional[int]:
+        """Returns the index of the NPC with the given key, or if there is none, of the NPC in the location at index
+        location whose key best matches it. Returns None if no key matches.
+
+        Params:
+            key (str): What the player typed for the NPC. Ex: "elv"
+            location (int): The index of the location to look for a matching key in."""
+        index = self.index_of(key)
+        if index is not None:
+            return index
+        keys = self.keys.get(location)
+        if keys is None:
+            npc_keys = self._state.template.npc_keys
+            keys = self.keys[location] = TrigramIndex(npc_keys[npc] for npc in self.at(location))
+        best = keys.best(key)
+        return None if best is None else self._state.template.npc_index[best]
+
+    def location_of(self, npc: int) -> int:
+        """Returns the index of the location the NPC at index npc is in."""
+        location = self.moved.get(npc)
+        return self._state.template.npc_locations[npc] if location is None else location
+
+    def is_at(self, npc: int, location: int) -> bool:
+        """Returns True if the NPC at index npc is in the location at index location."""
+        return self.location_of(npc) == location
+
+    def at(self, location: int) -> Sequence[int]:
+        """Returns the indexes of the NPCs in the location at index location, in the order of their indexes."""
+        room = self.rooms.get(location)
+        return self._state.template.location_npcs.get(location, ()) if room is None else room
+
+    def first_at(self, location: int) -> Optional[int]:
+        """Returns the index of the first NPC in the location at index location, or None if it has none."""
+        npcs = self.at(location)
+        return npcs[0] if npcs else None
+
+    def move(self, npc: int, location: int) -> None:
+        """Moves the NPC at index npc to the location at index location, for this game only."""
+        source = self.location_of(npc)
+        if source == location:
+            return
+        room = self._room(source)
+        del room[bisect_left(room, npc)]
+        self._settle(source, room)
+        room = self._room(location)
+        insort(room, npc)
+        self._settle(location, room)
+        if location == self._state.template.npc_locations[npc]:
+            del self.moved[npc]
+        else:
+            self.moved[npc] = location
+        if source in self.keys:
+            self.keys[source].remove(self._state.template.npc_keys[npc])
+        if location in self.keys:
+            self.keys[location].add(self._state.template.npc_keys[npc])
+        self._state.touch(source)
+        self._state.touch(location)
+        if self._state.changes is not None:
+            self._state.changes.npcs.add(npc)
+
+    def _room(self, location: int) -> List[int]:
+        """Returns the list of the NPCs in the location at index location, copying the template's the first time
+        its NPCs change."""
+        room = self.rooms.get(location)
+        if room is None:
+            room = self.rooms[location] = list(self._state.template.location_npcs.get(location, ()))
+        return room
+
+    def _settle(self, location: int, room: List[int]) -> None:
+        """Drops the list of the NPCs in the location at index location if they are the ones it started with."""
+        home = self._state.template.location_npcs.get(location, ())
+        if len(room) == len(home) and room == list(home):
+            del self.rooms[location]
+
+
+class Exits(Mapping):
+    """A read-only dictionary from a direction to the neighboring SessionLocation in that direction."""
+    __slots__ = ("_state", "_exits")
+
+    def __init__(self, state: WorldState, index: int):
+        """Initializes class Exits for the location at index."""
+        self._state = state
+        self._exits = state.exits_of(index)
+
+    def __getitem__(self, direction: str) -> 'SessionLocation':
+        """Returns the location in the given direction."""
+        return self._state.location(self._exits[direction])
+
+    def __contains__(self, direction: object) -> bool:
+        """Returns True if there is an exit in the given direction."""
+        return direction in self._exits
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the directions."""
+        return iter(self._exits)
+
+    def __len__(self) -> int:
+        """Returns the number of exits."""
+        return len(self._exits)
+
+
+class SessionLocation(Location):
+    """A Location that reads its static data from a WorldTemplate and keeps its changes in a WorldState.
+
+    Attributes:
+        state (WorldState): The state of the game this location belongs to.
+        index (int): The index of this location in the template.
+    """
+    __slots__ = ("_state", "_index")
+
+    def __init__(self, state: WorldState, index: int):
+        """Initializes class SessionLocation for the location at index. Nothing is copied from the template."""
+        self._state = state
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        """The name of this location."""
+        return self._state.template.location_names[self._index]
+
+    @property
+    def description(self) -> str:
+        """The description of this location."""
+        return self._state.template.location_descriptions[self._index]
+
+    @property
+    def visited(self) -> bool:
+        """If the player has been to this location before."""
+        return self._index in self._state.visited
+
+    @property
+    def directions(self) -> Exits:
+        """The neighboring locations of this location."""
+        return Exits(self._state, self._index)
+
+    @property
+    def npc(self) -> List[NPC]:
+        """The NPCs at this location."""
+        return [self._state.npc(index) for index in self._state.npcs.at(self._index)]
+
+    @property
+    def items(self) -> ItemView:
+        """The items at this location, read only. They are changed with add_item and remove_item, which keep
+        the text that describes this location and the changes to save up to date."""
+        return ItemView(self._state.items_at(self._index))
+
+    def get_items(self) -> ItemView:
+        """Returns the items at this location, read only, in the order they were added."""
+        return self.items
+
+    def __eq__(self, other: object) -> bool:
+        """Returns True if other is a view of the same location of the same game."""
+        return isinstance(other, SessionLocation) and other._index == self._index and other._state is self._state
+
+    def __hash__(self) -> int:
+        """Returns the hash of the location's index, so equal views are found in sets and dictionaries."""
+        return hash(self._index)
+
+    def get_index(self) -> int:
+        """Returns the index of this location in the template."""
+        return self._index
+
+    def set_visited(self) -> None:
+        """Records that the player has been to this location."""
+        state = self._state
+        if self._index not in state.visited:
+            state.visits += 1
+            if state.changes is not None:
+                state.changes.visited.add(self._index)
+            state.visited.add(self._index)
+
+    def add_location(self, direction: str, location: 'SessionLocation') -> None:
+        """
+        Adds an exit from this location to another location of the same game, for this game only.
+
+        Params:
+            direction (str): A string representing which direction the location parameter is from this Location
+                instance.
+            location (SessionLocation): A location of the same game that is near this location instance.
+        """
+        if len(direction) == 0:
+            raise ValueError('Direction and/or Location cannot be blank')
+        if direction in self.directions:
+            raise KeyError("key is already in use")
+        self._state.add_exit(self._index, direction, location.get_index())
+
+    def add_npc(self, npc: NPC) -> None:
+        """NPCs come from the shared template, so they can't be added to a single game.
+
+        Raises:
+            TypeError: Always."""
+        raise TypeError("NPCs of a shared world can't be changed, add them to the world file instead")
+
+    def add_item(self, item: Item) -> None:
+        """Adds the item parameter to the items at this location, for this game only.
+
+        Params:
+            item (Item): an Item object.
+        """
+        self._state.items_at(self._index).add(item)
+        self._state.touch(self._index)
+        if self._state.changes is not None:
+            self._state.changes.locations.add(self._index)
+
+    def remove_item(self, item: Item) -> None:
+        """Removes the item parameter from this location, for this game only.
+
+        Parameters:
+            item (Item): An Item object.
+        """
+        self._state.items_at(self._index).remove(item)
+        self._state.touch(self._index)
+        if self._state.changes is not None:
+            self._state.changes.locations.add(self._index)
+
+
+class SessionNPC(NPC):
+    """An NPC that reads its static data from a WorldTemplate and keeps its changes in a WorldState.
+
+    Attributes:
+        state (WorldState): The state of the game this NPC belongs to.
+        index (int): The index of this NPC in the template.
+    """
+    __slots__ = ("_state", "_index")
+
+    def __init__(self, state: WorldState, index: int):
+        """Initializes class SessionNPC for the NPC at index. Nothing is copied from the template."""
+        self._state = state
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        """The name of this NPC."""
+        renamed = self._state.renamed.get(self._index)
+        if renamed and "name" in renamed:
+            return renamed["name"]
+        return self._state.template.npc_names[self._index]
+
+    @name.setter
+    def name(self, name: str) -> None:
+        self._state.renamed.setdefault(self._index, {})["name"] = name
+        self._state.touch(self._state.npcs.location_of(self._index))
+        self._changed()
+
+    @property
+    def description(self) -> str:
+        """The description of this NPC."""
+        renamed = self._state.renamed.get(self._index)
+        if renamed and "description" in renamed:
+            return renamed["description"]
+        return self._state.template.npc_descriptions[self._index]
+
+    @description.setter
+    def description(self, description: str) -> None:
+        self._state.renamed.setdefault(self._index, {})["description"] = description
+        self._changed()
+
+    @property
+    def message(self) -> List[str]:
+        """The messages this NPC can say."""
+        return self._state.template.npc_messages[self._index]
+
+    @property
+    def message_num(self) -> int:
+        """The current message number of this NPC."""
+        return self._state.message_num.get(self._index, 0)
+
+    @message_num.setter
+    def message_num(self, message_num: int) -> None:
+        self._state.message_num[self._index] = message_num
+        self._changed()
+
+    @property
+    def high_val(self) -> bool:
+        """If this NPC still has its high value food."""
+        return self._state.high_value.get(self._index, self._state.template.npc_high_value[self._index] == 1)
+
+    @high_val.setter
+    def high_val(self, high_val: bool) -> None:
+        self._state.high_value[self._index] = high_val
+        self._changed()
+
+    @property
+    def prize_food(self) -> Item:
+        """The high value food of this NPC."""
+        return self._state.template.item(self._state.template.npc_prize_ids[self._index])
+
+    def _changed(self) -> None:
+        """Records that this NPC changed, if the game's changes are tracked."""
+        if self._state.changes is not None:
+            self._state.changes.npcs.add(self._index)
+
+    def __eq__(self, other: object) -> bool:
+        """Returns True if other is a view of the same NPC of the same game."""
+        return isinstance(other, SessionNPC) and other._index == self._index and other._state is self._state
+
+    def __hash__(self) -> int:
+        """Returns the hash of the NPC's index, so equal views are found in sets and dictionaries."""
+        return hash(self._index)
+
+    def get_index(self) -> int:
+        """Returns the index of this NPC in the template."""
+        return self._index
+
+
+def image_path(path: str) -> str:
+    """Returns where the image of the world file at path is saved."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, world_loader.CACHE_DIR, os.path.splitext(name)[0] + IMAGE_SUFFIX)
+
+
+def _image_stamp(stat: os.stat_result) -> bytes:
+    """Returns the header of the image of a world file with the given stat."""
+    return IMAGE_HEADER.pack(IMAGE_MAGIC, IMAGE_VERSION, world_loader.FORMAT_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def has_image(path: str) -> bool:
+    """Returns True if the world file at path is a JSON world with an image of the file as it is now."""
+    if path.endswith(PAGED_SUFFIX):
+        return False
+    try:
+        with open(image_path(path), "rb") as file:
+            return file.read(IMAGE_HEADER.size) == _image_stamp(os.stat(path))
+    except OSError:
+        return False
+
+
+def read_image(path: str, stat: os.stat_result) -> Optional[WorldTemplate]:
+    """Returns the template saved in the image of the world file at path, or None if there is no image of the
+    file as it is now.
+
+    Params:
+        path (str): The path of a JSON world file.
+        stat (os.stat_result): The stat of the world file."""
+    try:
+        with open(image_path(path), "rb") as file:
+            if file.read(IMAGE_HEADER.size) != _image_stamp(stat):
+                return None
+            return WorldTemplate.from_image(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_image(path: str, stat: os.stat_result, template: WorldTemplate) -> None:
+    """Saves the image of the template of the world file at path. An image that can't be written is skipped.
+
+    Params:
+        path (str): The path of a JSON world file.
+        stat (os.stat_result): The stat of the world file when the template was built from it.
+        template (WorldTemplate): The template built from the world file."""
+    target = image_path(path)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(_image_stamp(stat))
+            file.write(template.to_image())
+        os.replace(temp_path, target)
+    except OSError:
+        pass
+
+
+def clear_cache() -> None:
+    """Forgets every template this process built or opened, so the next get_template builds it again or reads
+    its image like a new process does."""
+    _templates.clear()
+    if "world_pages" in sys.modules:
+        sys.modules["world_pages"].clear_cache()
+
+
+def get_template(path: str = world_loader.DEFAULT_WORLD, memory_budget: Optional[int] = None) -> WorldTemplate:
+    """Returns the shared WorldTemplate of the world file at path, building it if it wasn't built yet.
+
+    A JSON world is read from its image when there is one of the file as it is now. Otherwise it is built from
+    the compiled world and its image is saved for the next process.
+
+    Params:
+        path (str): The path of a JSON world file, or of a paged world written by world_pages.py.
+        memory_budget (int): For paged worlds, the most bytes of regions to keep in memory. None keeps the
+            budget the world already has, or the default one."""
+    if path.endswith(PAGED_SUFFIX):
+        # world_pages builds on the classes of this module, so it can only be imported once they exist.
+        import world_pages
+        return world_pages.get_paged_template(path, memory_budget)
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    template = _templates.get(key)
+    if template is None:
+        template = read_image(path, stat)
+        if template is None:
+            template = WorldTemplate(world_loader.load_world(path))
+            write_image(path, stat, template)
+        _templates[key] = template
+    return template
@@ -0,0 +1,221 @@
+"""Functions to load the game world from a declarative JSON file.
+
+The JSON file is validated and compiled once into a compact tuple form. The compiled form is cached
+in a __pycache__ folder next to the world file, named after the SHA-256 hash of the file, so the next
+launch only has to unmarshal it. Every Game then builds its objects straight from the compiled form.
+compile_item, compile_schedule and compile_events compile the parts of a world one at a time, so world_pages.py
+can compile worlds too large to parse whole with the same rules.
+
+World file format:
+    {"calories_needed": 500,
+     "elf_location": "<location id>",
+     "locations": [{"id": "...", "name": "...", "description": "...",
+                    "exits": {"<direction>": "<location id>"},
+                    "items": [{"name": "...", "description": "...", "calories": 0, "weight": 0, "tags": ["..."]}],
+                    "npcs": [{"key": "...", "name": "...", "description": "...", "messages": ["..."],
+                              "high_value": false, "prize_food": {<item>}, "wander_every": 0, "restock_after": 0}]}],
+     "events": [{"message": "...", "every": 0, "start": 1, "location": "<location id>"}]}
+    An NPC with wander_every moves to a random neighboring location every that many ticks, and one with
+    restock_after gets its prize food back that many ticks after it was robbed. An event is announced at tick
+    start, which is every by default, and again every that many ticks if every isn't 0. An event with a
+    location is only announced to a player in that location. There is one tick for every command.
+
+Compiled format:
+    (version, calories_needed, elf_location_index,
+     ((name, description, ((direction, location_index), ...)), ...),
+     ((name, description, calories, weight, location_index, (tag, ...)), ...),
+     ((key, name, description, (message, ...), high_value, prize_item_index, location_index, wander_every,
+       restock_after), ...),
+     ((start, every, message, location_index), ...))
+    Items that are an NPC's prize food have a location index of -1, and so do events without a location."""
+
+import marshal
+import os
+from typing import *
+from items_npc import Item, NPC
+from locations_zork import Location
+
+FORMAT_VERSION = 3
+DEFAULT_WORLD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "world.json")
+CACHE_DIR = "__pycache__"
+
+# Compiled worlds that were already loaded by this process, keyed by path, size and modification time.
+_loaded = {}
+
+
+def clear_cache() -> None:
+    """Forgets every compiled world this process loaded, so the next load_world reads its file or cache file
+    again like a new process does."""
+    _loaded.clear()
+
+
+def compile_world(source: dict) -> tuple:
+    """Validates a parsed world file and returns its compiled form.
+
+    Params:
+        source (dict): The parsed contents of a world file.
+
+    Raises:
+        ValueError: If the world is invalid, such as an exit leading to a location that doesn't exist,
+            a duplicate location id or NPC key, a missing elf location, an invalid item or an invalid number of
+            ticks."""
+    location_ids = {}
+    for index, location in enumerate(source["locations"]):
+        if location["id"] in location_ids:
+            raise ValueError(f"Duplicate location id {location['id']}")
+        location_ids[location["id"]] = index
+    if source.get("elf_location") not in location_ids:
+        raise ValueError("The elf location must be one of the locations")
+
+    locations = []
+    items = []
+    npcs = []
+    npc_keys = set()
+    for index, location in enumerate(source["locations"]):
+        if location["name"] == "" or location["description"] == "":
+            raise ValueError("Name and description cannot be blank!")
+        exits = []
+        for direction, target in location.get("exits", {}).items():
+            if direction == "" or target not in location_ids:
+                raise ValueError(f"Invalid exit {direction} from {location['id']} to {target}")
+            exits.append((direction, location_ids[target]))
+        locations.append((location["name"], location["description"], tuple(exits)))
+        for item in location.get("items", []):
+            items.append(compile_item(item, index))
+        for npc in location.get("npcs", []):
+            if npc["key"].lower() in npc_keys:
+                raise ValueError(f"Duplicate NPC key {npc['key']}")
+            npc_keys.add(npc["key"].lower())
+            items.append(compile_item(npc["prize_food"], -1))
+            npcs.append((npc["key"].lower(), npc["name"], npc["description"], tuple(npc["messages"]),
+                         bool(npc["high_value"]), len(items) - 1, index) + compile_schedule(npc))
+    return (FORMAT_VERSION, int(source.get("calories_needed", 500)), location_ids[source["elf_location"]],
+            tuple(locations), tuple(items), tuple(npcs), compile_events(source.get("events", []), location_ids))
+
+
+def compile_item(item: dict, location_index: int) -> tuple:
+    """Validates a single item with the same rules as the Item class and returns its compiled form."""
+    tags = tuple(item.get("tags", ()))
+    Item(item["name"], item["description"], item["calories"], item["weight"], tags)
+    return item["name"], item["description"], item["calories"], item["weight"], location_index, tags
+
+
+def _ticks(source: dict, key: str, default: int = 0) -> int:
+    """Returns the number of ticks at key in source, which must be a whole number that isn't negative."""
+    ticks = source.get(key, default)
+    if not isinstance(ticks, int) or isinstance(ticks, bool) or ticks < 0:
+        raise ValueError(f"{key} must be a whole number of ticks, not {ticks!r}")
+    return ticks
+
+
+def compile_schedule(npc: dict) -> Tuple[int, int]:
+    """Validates how often an NPC wanders and how long it takes to get its prize food back, and returns
+    them as a (wander_every, restock_after) tuple."""
+    return _ticks(npc, "wander_every"), _ticks(npc, "restock_after")
+
+
+def compile_events(events: List[dict], location_ids: Dict[str, int]) -> tuple:
+    """Validates the timed events of a world and returns their compiled form.
+
+    Params:
+        events (list[dict]): The events of the world file.
+        location_ids (dict[str, int]): The index of each location, keyed by its id."""
+    compiled = []
+    for event in events:
+        every = _ticks(event, "every")
+        start = _ticks(event, "start", every)
+        if start < 1:
+            raise ValueError("An event needs a start or every of at least 1 tick")
+        if event.get("message", "") == "":
+            raise ValueError("An event's message cannot be blank!")
+        location = event.get("location")
+        if location is not None and location not in location_ids:
+            raise ValueError(f"Invalid event location {location}")
+        compiled.append((start, every, event["message"], location_ids.get(location, -1)))
+    return tuple(compiled)
+
+
+def load_world(path: str = DEFAULT_WORLD) -> tuple:
+    """Returns the compiled form of the world file at path.
+
+    The world is compiled only if there is no cached copy for the current contents of the file.
+
+    Params:
+        path (str): The path of a JSON world file."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key in _loaded:
+        return _loaded[key]
+    # Only needed when there is no world image, so a process that plays from one doesn't import them.
+    import hashlib
+    import json
+    with open(path, "rb") as file:
+        data = file.read()
+    cache_path = _cache_path(path, hashlib.sha256(data).hexdigest())
+    compiled = _read_cache(cache_path)
+    if compiled is None:
+        compiled = compile_world(json.loads(data))
+        _write_cache(cache_path, compiled)
+    _loaded[key] = compiled
+    return compiled
+
+
+def _cache_path(path: str, digest: str) -> str:
+    """Returns where the compiled copy of a world file with the given hash is cached."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, f"{os.path.splitext(name)[0]}.{digest[:32]}.world")
+
+
+def _read_cache(cache_path: str) -> Optional[tuple]:
+    """Returns the compiled world in the cache file, or None if it is missing or from an older version."""
+    try:
+        with open(cache_path, "rb") as file:
+            compiled = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(compiled, tuple) or not compiled or compiled[0] != FORMAT_VERSION:
+        return None
+    return compiled
+
+
+def _write_cache(cache_path: str, compiled: tuple) -> None:
+    """Writes the compiled world to the cache file. A cache that can't be written is skipped."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(marshal.dumps(compiled))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+
+
+def build_world(compiled: tuple) -> Tuple[List[Location], Dict[str, NPC], Location, int]:
+    """Creates the Location, Item and NPC objects of a compiled world. These objects have no world clock, so
+    their NPCs never wander and the world's events are never announced.
+
+    Params:
+        compiled (tuple): A world returned by load_world or compile_world.
+
+    Returns:
+        locations (list[Location]): Every location, in the order of the world file.
+        npc_dict (dict[str, NPC]): The NPCs keyed by the lower case name players type.
+        elf_location (Location): The location where the elf is waiting for food.
+        calories_needed (int): The number of calories the elf needs to win the game."""
+    version, calories_needed, elf_index, location_table, item_table, npc_table, events = compiled
+    locations = [Location(name, description) for name, description, exits in location_table]
+    for location, (name, description, exits) in zip(locations, location_table):
+        for direction, target in exits:
+            location.add_location(direction, locations[target])
+    items = []
+    for name, description, calories, weight, location_index, tags in item_table:
+        item = Item(name, description, calories, weight, tags)
+        items.append(item)
+        if location_index >= 0:
+            locations[location_index].add_item(item)
+    npc_dict = {}
+    for key, name, description, messages, high_value, prize_index, location_index, *schedule in npc_table:
+        npc = NPC(name, description, list(messages), high_value, items[prize_index])
+        locations[location_index].add_npc(npc)
+        npc_dict[key] = npc
+    return locations, npc_dict, locations[elf_index], calories_needed
@@ -0,0 +1,926 @@
+"""Worlds that are split into regions and loaded a region at a time.
+
+A JSON world file is compiled into a paged world file: every region_size locations in a row, with their
+items and NPCs, are marshalled together into one region, so a region is read from disk with a single
+read. The location names and NPC keys players type are hashed into buckets that are read on their own.
+Compiling streams the JSON file a location at a time, so it never has to be parsed as a whole.
+
+PagedWorldTemplate is a WorldTemplate that reads regions the first time a location, item or NPC in
+them is needed and keeps the regions that were used most recently, as long as they fit in a memory
+budget. PagedWorldState keeps what a game changed in the same regions, and writes the changes of a
+region to a spill file before it is dropped from memory, so they can be read back the next time the
+game goes there. Memory use then depends on the budget and not on the size of the world. For the same reason
+the NPCs that wander only move while they are in the region the player is in, since moving the others would
+read their regions every few ticks.
+
+Paged world file format:
+    region, ..., name bucket, ..., NPC key bucket, ..., header, then 16 bytes: the offset of the header
+    as an 8 byte little endian integer and MAGIC.
+    region: marshal of (location_names, location_descriptions, exit_offsets, exit_directions, exit_targets,
+        location_item_offsets, location_item_ids, item_names, item_descriptions, item_calories,
+        item_weights, item_tags, npc_keys, npc_names, npc_descriptions, npc_messages, npc_high_value,
+        npc_prize_ids, npc_locations, npc_wander_every, npc_restock_after), where offsets are from the start of
+        the region and indexes of locations, items and NPCs are for the whole world.
+    bucket: marshal of {lower case name: index}.
+    header: marshal of (version, region_size, num_locations, num_items, num_npcs, calories_needed,
+        elf_index, direction_names, region_offsets, region_item_starts, region_npc_starts,
+        name_bucket_offsets, npc_bucket_offsets, num_names, num_npc_keys, wanderers, wanderer_locations,
+        restocking, events). Each offsets tuple has one more entry than there are regions or buckets, the end of
+        the last one. wanderers, restocking and events are the WorldTemplate attributes of the same names, and
+        wanderer_locations holds the location each of the wanderers starts in.
+
+Usage:
+    python world_pages.py WORLD_JSON OUTPUT.pages [--region-size N]"""
+
+import argparse
+import contextlib
+import json
+import marshal
+import os
+import re
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from typing import *
+from items_npc import Item, NO_TAGS
+from item_index import ItemIndex
+from routing import RouteGraph
+import world
+import world_loader
+
+PAGES_VERSION = 3
+MAGIC = b"ZORKPAGE"
+TRAILER = struct.Struct("<Q8s")
+DEFAULT_REGION_SIZE = 1024
+# The most bytes of regions, counted by their size in the paged world file, that a template keeps in memory.
+DEFAULT_MEMORY_BUDGET = 8 << 20
+# The number of regions of changes each game keeps in memory before writing the oldest to its spill file.
+DEFAULT_STATE_REGIONS = 32
+# The spill file of a game is compacted once it is bigger than this and more than half of it is old copies.
+SPILL_COMPACT_SIZE = 1 << 20
+# The average number of names in a lookup bucket.
+BUCKET_SIZE = 256
+LOOKUP_CACHE_SIZE = 8
+# Paged worlds are big, so each game keeps fewer shortest path trees than RouteGraph does by default.
+ROUTE_TREES = 2
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Paged templates already opened by this process, keyed by their absolute path.
+_paged_templates = {}
+
+
+class JsonStream:
+    """Reads the values of a JSON document one at a time from a file, holding only a chunk of it in memory."""
+    def __init__(self, file: TextIO, chunk_size: int = CHUNK_SIZE):
+        """Initializes class JsonStream at the start of file."""
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        """Reads the next chunk of the file into the buffer. Returns False at the end of the file."""
+        data = self._file.read(self._chunk_size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character without reading it.
+
+        Raises:
+            ValueError: If the file ends first."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("The world file ended too early")
+
+    def expect(self, character: str) -> None:
+        """Reads the next character, which must be character.
+
+        Raises:
+            ValueError: If the next character is something else."""
+        if self.peek() != character:
+            raise ValueError(f"Expected {character!r} in the world file at {self._buffer[self._pos:self._pos + 20]!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Reads the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number that runs to the end of the buffer may continue in the next chunk.
+            if end < len(self._buffer) or not self._fill():
+                self._pos = end
+                return value
+
+
+def iter_world(path: str) -> Iterator[Tuple[str, Any]]:
+    """Yields each top level key of a JSON world file with its value, except that every location in the
+    locations list is yielded on its own as ("locations", location).
+
+    Params:
+        path (str): The path of a JSON world file."""
+    with open(path, encoding="utf-8") as file:
+        stream = JsonStream(file)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "locations":
+                stream.expect("[")
+                if stream.peek() != "]":
+                    while True:
+                        yield key, stream.value()
+                        if stream.peek() != ",":
+                            break
+                        stream.expect(",")
+                stream.expect("]")
+            else:
+                yield key, stream.value()
+            if stream.peek() != ",":
+                break
+            stream.expect(",")
+        stream.expect("}")
+
+
+def _bucket_of(key: str, num_buckets: int) -> int:
+    """Returns the lookup bucket of a lower case name, which is the same in every process."""
+    return zlib.crc32(key.encode("utf-8")) % num_buckets
+
+
+def _write_buckets(out: BinaryIO, lookup: Dict[str, int]) -> List[int]:
+    """Writes a lookup dictionary split into buckets and returns the offset of each bucket, followed by the
+    end of the last one."""
+    num_buckets = max(1, len(lookup) // BUCKET_SIZE)
+    buckets = [{} for _ in range(num_buckets)]
+    for key, index in lookup.items():
+        buckets[_bucket_of(key, num_buckets)][key] = index
+    offsets = [out.tell()]
+    for bucket in buckets:
+        out.write(marshal.dumps(bucket))
+        offsets.append(out.tell())
+    return offsets
+
+
+def compile_pages(source_path: str, pages_path: str, region_size: int = DEFAULT_REGION_SIZE) -> Dict[str, int]:
+    """Compiles a JSON world file into a paged world file.
+
+    The JSON file is read twice, once to number the locations and once to compile them, and neither time
+    is it parsed as a whole. The location ids, location names and NPC keys are kept in memory while
+    compiling, everything else a region at a time. Locations, items and NPCs are numbered the same way
+    world_loader.compile_world numbers them.
+
+    Params:
+        source_path (str): The path of a JSON world file.
+        pages_path (str): Where the paged world file is written.
+        region_size (int): The number of locations in each region.
+
+    Returns:
+        summary (dict[str, int]): The number of locations, items, NPCs and regions written.
+
+    Raises:
+        ValueError: If the world is invalid, for the same reasons as world_loader.compile_world."""
+    if region_size < 1:
+        raise ValueError("A region needs at least one location")
+    location_ids = {}
+    settings = {}
+    for key, value in iter_world(source_path):
+        if key != "locations":
+            settings[key] = value
+        elif value["id"] in location_ids:
+            raise ValueError(f"Duplicate location id {value['id']}")
+        else:
+            location_ids[value["id"]] = len(location_ids)
+    if settings.get("elf_location") not in location_ids:
+        raise ValueError("The elf location must be one of the locations")
+    events = world_loader.compile_events(settings.get("events", []), location_ids)
+
+    direction_index = {}
+    name_lookup = {}
+    npc_lookup = {}
+    region_offsets = []
+    region_item_starts = []
+    region_npc_starts = []
+    wanderers = []
+    wanderer_locations = []
+    restocking = False
+    num_items = num_npcs = 0
+    region = None
+    temp_path = f"{pages_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as out:
+            for index, (key, location) in enumerate(item for item in iter_world(source_path) if item[0] == "locations"):
+                if index % region_size == 0:
+                    if region is not None:
+                        out.write(marshal.dumps(tuple(region)))
+                    region = ([], [], [0], [], [], [0], [], [], [], [], [], [], [], [], [], [], [], [], [], [], [])
+                    region_offsets.append(out.tell())
+                    region_item_starts.append(num_items)
+                    region_npc_starts.append(num_npcs)
+                (names, descriptions, exit_offsets, exit_directions, exit_targets, item_offsets, item_ids,
+                 item_names, item_descriptions, item_calories, item_weights, item_tags, npc_keys, npc_names,
+                 npc_descriptions, npc_messages, npc_high_value, npc_prize_ids, npc_locations, npc_wander_every,
+                 npc_restock_after) = region
+                if location["name"] == "" or location["description"] == "":
+                    raise ValueError("Name and description cannot be blank!")
+                names.append(location["name"])
+                descriptions.append(location["description"])
+                name_lookup.setdefault(location["name"].lower().rstrip("."), index)
+                for direction, target in location.get("exits", {}).items():
+                    if direction == "" or target not in location_ids:
+                        raise ValueError(f"Invalid exit {direction} from {location['id']} to {target}")
+                    exit_directions.append(direction_index.setdefault(direction, len(direction_index)))
+                    exit_targets.append(location_ids[target])
+                exit_offsets.append(len(exit_targets))
+                compiled_items = [(world_loader.compile_item(item, index), False) for item in location.get("items", [])]
+                for npc in location.get("npcs", []):
+                    compiled_items.append((world_loader.compile_item(npc["prize_food"], -1), npc))
+                for (name, description, calories, weight, item_location, tags), npc in compiled_items:
+                    item_names.append(name)
+                    item_descriptions.append(description)
+                    item_calories.append(calories)
+                    item_weights.append(weight)
+                    item_tags.append(tags)
+                    if npc:
+                        npc_keys.append(npc["key"].lower())
+                        npc_names.append(npc["name"])
+                        npc_descriptions.append(npc["description"])
+                        npc_messages.append(tuple(npc["messages"]))
+                        npc_high_value.append(bool(npc["high_value"]))
+                        npc_prize_ids.append(num_items)
+                        npc_locations.append(index)
+                        wander_every, restock_after = world_loader.compile_schedule(npc)
+                        npc_wander_every.append(wander_every)
+                        npc_restock_after.append(restock_after)
+                        if wander_every:
+                            wanderers.append((num_npcs, wander_every))
+                            wanderer_locations.append(index)
+                        restocking = restocking or restock_after > 0
+                        if npc["key"].lower() in npc_lookup:
+                            raise ValueError(f"Duplicate NPC key {npc['key']}")
+                        npc_lookup[npc["key"].lower()] = num_npcs
+                        num_npcs += 1
+                    else:
+                        item_ids.append(num_items)
+                    num_items += 1
+                item_offsets.append(len(item_ids))
+            out.write(marshal.dumps(tuple(region)))
+            region_offsets.append(out.tell())
+            name_bucket_offsets = _write_buckets(out, name_lookup)
+            npc_bucket_offsets = _write_buckets(out, npc_lookup)
+            header_offset = out.tell()
+            out.write(marshal.dumps((PAGES_VERSION, region_size, len(location_ids), num_items, num_npcs,
+                                     int(settings.get("calories_needed", 500)), location_ids[settings["elf_location"]],
+                                     tuple(direction_index), tuple(region_offsets), tuple(region_item_starts),
+                                     tuple(region_npc_starts), tuple(name_bucket_offsets), tuple(npc_bucket_offsets),
+                                     len(name_lookup), len(npc_lookup), tuple(wanderers), tuple(wanderer_locations),
+                                     restocking, events)))
+            out.write(TRAILER.pack(header_offset, MAGIC))
+    except Exception:
+        # A world that turned out to be invalid part way leaves no half written file behind.
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+    os.replace(temp_path, pages_path)
+    return {"locations": len(location_ids), "items": num_items, "npcs": num_npcs, "regions": len(region_item_starts)}
+
+
+class Region:
+    """The locations, items and NPCs of one region of a paged world, as they were read from the file.
+
+    Attributes:
+        number (int): The number of the region.
+        size (int): The number of bytes the region takes up in the paged world file.
+        location_start (int): The index of the first location in the region.
+        item_start (int): The index of the first item in the region.
+        npc_start (int): The index of the first NPC in the region.
+        location_npcs (dict[int, tuple[int]]): The indexes of the NPCs in each location of the region that has
+            any.
+        The other attributes are the columns of the region, named as in the paged world file format.
+    """
+    __slots__ = ("number", "size", "location_start", "item_start", "npc_start", "location_names",
+                 "location_descriptions", "exit_offsets", "exit_directions", "exit_targets", "location_item_offsets",
+                 "location_item_ids", "item_names", "item_descriptions", "item_calories", "item_weights", "item_tags",
+                 "npc_keys", "npc_names", "npc_descriptions", "npc_messages", "npc_high_value", "npc_prize_ids",
+                 "npc_locations", "npc_wander_every", "npc_restock_after", "location_npcs")
+
+    def __init__(self, number: int, size: int, location_start: int, item_start: int, npc_start: int,
+                 columns: tuple, tag_sets: Dict[tuple, frozenset]):
+        """Initializes class Region from the columns read from the file.
+
+        Params:
+            tag_sets (dict[tuple, frozenset]): The tag sets already made by the template, so items with the
+                same tags share one set."""
+        self.number = number
+        self.size = size
+        self.location_start = location_start
+        self.item_start = item_start
+        self.npc_start = npc_start
+        (self.location_names, self.location_descriptions, self.exit_offsets, self.exit_directions,
+         self.exit_targets, self.location_item_offsets, self.location_item_ids, self.item_names,
+         self.item_descriptions, self.item_calories, self.item_weights, item_tags, self.npc_keys, self.npc_names,
+         self.npc_descriptions, npc_messages, self.npc_high_value, self.npc_prize_ids, self.npc_locations,
+         self.npc_wander_every, self.npc_restock_after) = columns
+        self.item_tags = tuple(tag_sets.setdefault(tags, frozenset(tags)) if tags else NO_TAGS for tags in item_tags)
+        self.npc_messages = tuple(list(messages) for messages in npc_messages)
+        location_npcs = {}
+        for index, location in enumerate(self.npc_locations):
+            location_npcs.setdefault(location, []).append(npc_start + index)
+        self.location_npcs = {location: tuple(npcs) for location, npcs in location_npcs.items()}
+
+
+class PagedColumn:
+    """One column of a paged world, such as the location names, that reads the regions it needs."""
+    __slots__ = ("_template", "_kind", "_field", "_length", "_known")
+
+    def __init__(self, template: 'PagedWorldTemplate', kind: str, field: str, length: int,
+                 known: Optional[Dict[int, Any]] = None):
+        """Initializes class PagedColumn.
+
+        Params:
+            template (PagedWorldTemplate): The template whose regions the column reads.
+            kind (str): "location", "item" or "npc", what the column is indexed by.
+            field (str): The name of the column in a Region.
+            length (int): The number of values in the column.
+            known (dict[int, Any]): Values of the column that were read from the header, keyed by index, which
+                are returned without reading their region."""
+        self._template = template
+        self._kind = kind
+        self._field = field
+        self._length = length
+        self._known = known or {}
+
+    def __getitem__(self, index: int) -> Any:
+        """Returns the value at index, reading its region if it isn't in memory and the value isn't known."""
+        value = self._known.get(index)
+        if value is not None:
+            return value
+        region = self._template.region_of(self._kind, index)
+        return getattr(region, self._field)[index - getattr(region, f"{self._kind}_start")]
+
+    def __len__(self) -> int:
+        """Returns the number of values in the column."""
+        return self._length
+
+
+class PagedLocationNpcs:
+    """The NPCs of each location of a paged world, with the get method of the dictionary it stands in for."""
+    __slots__ = ("_template",)
+
+    def __init__(self, template: 'PagedWorldTemplate'):
+        """Initializes class PagedLocationNpcs."""
+        self._template = template
+
+    def get(self, location: int, default: Any = None) -> Any:
+        """Returns the indexes of the NPCs in the location at index location, or default if there are none."""
+        return self._template.region_of("location", location).location_npcs.get(location, default)
+
+
+class PagedLookup(Mapping):
+    """A dictionary from a lower case name to an index, stored in buckets in a paged world file."""
+    def __init__(self, template: 'PagedWorldTemplate', offsets: Sequence[int], length: int):
+        """Initializes class PagedLookup.
+
+        Params:
+            template (PagedWorldTemplate): The template whose file the buckets are read from.
+            offsets (Sequence[int]): The offset of each bucket, followed by the end of the last one.
+            length (int): The number of names."""
+        self._template = template
+        self._offsets = offsets
+        self._length = length
+
+    def bucket(self, number: int) -> Dict[str, int]:
+        """Returns the bucket with the given number."""
+        return self._template.read_lookup(self._offsets[number], self._offsets[number + 1])
+
+    def __getitem__(self, key: str) -> int:
+        """Returns the index for key."""
+        return self.bucket(_bucket_of(key, len(self._offsets) - 1))[key]
+
+    def __contains__(self, key: object) -> bool:
+        """Returns True if key is in the lookup."""
+        return isinstance(key, str) and key in self.bucket(_bucket_of(key, len(self._offsets) - 1))
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over every name, reading every bucket."""
+        for number in range(len(self._offsets) - 1):
+            yield from self.bucket(number)
+
+    def __len__(self) -> int:
+        """Returns the number of names."""
+        return self._length
+
+
+class PagedWorldTemplate(world.WorldTemplate):
+    """A WorldTemplate whose regions are read from a paged world file when they are needed.
+
+    The columns of a WorldTemplate are PagedColumn objects here, so SessionLocation, SessionNPC and
+    StoredItem read from it without knowing it is paged.
+
+    Attributes:
+        path (str): The path of the paged world file.
+        region_size (int): The number of locations in each region.
+        num_locations (int): The number of locations in the world.
+        region_offsets (array[int]): Where each region starts in the file, followed by the end of the last one.
+        region_item_starts (array[int]): The index of the first item in each region.
+        region_npc_starts (array[int]): The index of the first NPC in each region.
+        regions (OrderedDict[int, Region]): The regions in memory, least recently used first.
+        memory_budget (int): The most bytes of regions, counted by their size in the file, kept in memory.
+        resident_bytes (int): The bytes of the regions in memory, counted the same way.
+        state_regions (int): The number of regions of changes each game keeps in memory.
+        loads (int): The number of times a region was read from the file.
+        evictions (int): The number of times a region was dropped to stay within the budget.
+        The column attributes of WorldTemplate are PagedColumn objects.
+    """
+    def __init__(self, path: str, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 state_regions: int = DEFAULT_STATE_REGIONS, buffer: Optional[memoryview] = None):
+        """Initializes class PagedWorldTemplate from the header of a paged world file. No region is read yet.
+
+        Params:
+            path (str): The path of a paged world file.
+            memory_budget (int): The most bytes of regions, counted by their size in the file, kept in memory.
+            state_regions (int): The number of regions of changes each game keeps in memory.
+            buffer (memoryview): The whole paged world file already in memory, such as in a shared memory block,
+                to read regions from instead of the file. The file at path isn't opened then.
+
+        Raises:
+            ValueError: If the file isn't a paged world file of this version."""
+        self.path = os.path.abspath(path)
+        self._fd = None
+        self._buffer = buffer
+        if buffer is None:
+            self._fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            size = os.fstat(self._fd).st_size
+        else:
+            size = len(buffer)
+        header_offset, magic = TRAILER.unpack(self._read(size - TRAILER.size, size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a paged world file")
+        header = marshal.loads(self._read(header_offset, size - TRAILER.size))
+        if header[0] != PAGES_VERSION:
+            raise ValueError(f"{path} is a paged world file of another version, compile it again")
+        (version, self.region_size, self.num_locations, num_items, num_npcs, self.calories_needed, self.elf_index,
+         self.direction_names, region_offsets, region_item_starts, region_npc_starts, name_bucket_offsets,
+         npc_bucket_offsets, num_names, num_npc_keys, self.wanderers, wanderer_locations, self.restocking,
+         self.events) = header
+        self.region_offsets = array("q", region_offsets)
+        self.region_item_starts = array("l", region_item_starts)
+        self.region_npc_starts = array("l", region_npc_starts)
+        self.regions = OrderedDict()
+        self.memory_budget = memory_budget
+        self.resident_bytes = 0
+        self.state_regions = state_regions
+        self.loads = 0
+        self.evictions = 0
+        self._tag_sets = {}
+        self._lookups = OrderedDict()
+
+        self.location_names = PagedColumn(self, "location", "location_names", self.num_locations)
+        self.location_descriptions = PagedColumn(self, "location", "location_descriptions", self.num_locations)
+        self.item_names = PagedColumn(self, "item", "item_names", num_items)
+        self.item_descriptions = PagedColumn(self, "item", "item_descriptions", num_items)
+        self.item_calories = PagedColumn(self, "item", "item_calories", num_items)
+        self.item_weights = PagedColumn(self, "item", "item_weights", num_items)
+        self.item_tags = PagedColumn(self, "item", "item_tags", num_items)
+        self.npc_keys = PagedColumn(self, "npc", "npc_keys", num_npcs)
+        self.npc_names = PagedColumn(self, "npc", "npc_names", num_npcs)
+        self.npc_descriptions = PagedColumn(self, "npc", "npc_descriptions", num_npcs)
+        self.npc_messages = PagedColumn(self, "npc", "npc_messages", num_npcs)
+        self.npc_high_value = PagedColumn(self, "npc", "npc_high_value", num_npcs)
+        self.npc_prize_ids = PagedColumn(self, "npc", "npc_prize_ids", num_npcs)
+        # Every wanderer is looked up whenever its timer goes off, wherever it is, so where the wanderers start
+        # and how often they move are kept from the header.
+        self.npc_locations = PagedColumn(self, "npc", "npc_locations", num_npcs,
+                                         {npc: location for (npc, every), location in
+                                          zip(self.wanderers, wanderer_locations)})
+        self.npc_wander_every = PagedColumn(self, "npc", "npc_wander_every", num_npcs, dict(self.wanderers))
+        self.npc_restock_after = PagedColumn(self, "npc", "npc_restock_after", num_npcs)
+        self.location_npcs = PagedLocationNpcs(self)
+        self.npc_index = PagedLookup(self, npc_bucket_offsets, num_npc_keys)
+        self.location_lookup = PagedLookup(self, name_bucket_offsets, num_names)
+        self.routes = None
+
+    def _read(self, start: int, end: int) -> Union[bytes, memoryview]:
+        """Returns the bytes of the file between start and end, without copying them if they are in a buffer."""
+        if self._buffer is not None:
+            return self._buffer[start:end]
+        return os.pread(self._fd, end - start, start)
+
+    def wander_region(self) -> int:
+        """Returns the number of locations in each region if NPCs wander in this world, since they only wander
+        while the player is in their region, else 0."""
+        return self.region_size if self.wanderers else 0
+
+    def region_number(self, kind: str, index: int) -> int:
+        """Returns the number of the region that the location, item or NPC at index is in, without reading it.
+
+        Params:
+            kind (str): "location", "item" or "npc".
+            index (int): The index of the location, item or NPC."""
+        if kind == "location":
+            return index // self.region_size
+        starts = self.region_item_starts if kind == "item" else self.region_npc_starts
+        return bisect_right(starts, index) - 1
+
+    def region_of(self, kind: str, index: int) -> Region:
+        """Returns the region that the location, item or NPC at index is in, reading it if it isn't in memory."""
+        return self.region(self.region_number(kind, index))
+
+    def region(self, number: int) -> Region:
+        """Returns the region with the given number, reading it if it isn't in memory and dropping the least
+        recently used regions while the regions in memory are over the budget."""
+        region = self.regions.get(number)
+        if region is not None:
+            self.regions.move_to_end(number)
+            return region
+        start, end = self.region_offsets[number], self.region_offsets[number + 1]
+        region = Region(number, end - start, number * self.region_size, self.region_item_starts[number],
+                        self.region_npc_starts[number], marshal.loads(self._read(start, end)),
+                        self._tag_sets)
+        self.loads += 1
+        self.regions[number] = region
+        self.resident_bytes += region.size
+        self.trim()
+        return region
+
+    def read_lookup(self, start: int, end: int) -> Dict[str, int]:
+        """Returns the lookup bucket stored between start and end in the file, keeping a few in memory."""
+        bucket = self._lookups.get(start)
+        if bucket is not None:
+            self._lookups.move_to_end(start)
+            return bucket
+        bucket = self._lookups[start] = marshal.loads(self._read(start, end))
+        if len(self._lookups) > LOOKUP_CACHE_SIZE:
+            self._lookups.popitem(last=False)
+        return bucket
+
+    def get_routes(self) -> RouteGraph:
+        """Returns the RouteGraph of this world's exits, reading the exits of every region once, without
+        keeping the regions in memory, the first time it's needed."""
+        if self.routes is None:
+            offsets = array("l", [0])
+            targets = array("l")
+            directions = array("l")
+            for number in range(len(self.region_item_starts)):
+                start, end = self.region_offsets[number], self.region_offsets[number + 1]
+                columns = marshal.loads(self._read(start, end))
+                exit_offsets, exit_directions, exit_targets = columns[2], columns[3], columns[4]
+                for location in range(len(exit_offsets) - 1):
+                    offsets.append(offsets[-1] + exit_offsets[location + 1] - exit_offsets[location])
+                directions.extend(exit_directions)
+                targets.extend(exit_targets)
+            self.routes = RouteGraph(self.num_locations, offsets, targets, directions, self.direction_names,
+                                     ROUTE_TREES)
+        return self.routes
+
+    def item(self, index: int) -> world.StoredItem:
+        """Returns a StoredItem for the item at index. Views aren't kept, since equal views are interchangeable."""
+        return world.StoredItem(self, index)
+
+    def starting_items(self, location: int) -> Tuple[world.StoredItem, ...]:
+        """Returns the items the location at index location starts with."""
+        region = self.region_of("location", location)
+        local = location - region.location_start
+        offsets = region.location_item_offsets
+        return tuple(world.StoredItem(self, index)
+                     for index in region.location_item_ids[offsets[local]:offsets[local + 1]])
+
+    def exits_of(self, location: int) -> Dict[str, int]:
+        """Returns a dictionary from each direction of the location at index location to the index of the
+        location in that direction."""
+        region = self.region_of("location", location)
+        local = location - region.location_start
+        directions, targets = region.exit_directions, region.exit_targets
+        return {self.direction_names[directions[exit]]: targets[exit]
+                for exit in range(region.exit_offsets[local], region.exit_offsets[local + 1])}
+
+    def new_state(self) -> 'PagedWorldState':
+        """Returns a new, untouched PagedWorldState for a game that uses this template."""
+        return PagedWorldState(self, self.state_regions)
+
+    def __del__(self):
+        """Closes the paged world file, if it was opened."""
+        if getattr(self, "_fd", None) is not None:
+            os.close(self._fd)
+
+    def trim(self) -> None:
+        """Drops the least recently used regions until the regions in memory fit in the budget."""
+        while self.resident_bytes > self.memory_budget and len(self.regions) > 1:
+            number, evicted = self.regions.popitem(last=False)
+            self.resident_bytes -= evicted.size
+            self.evictions += 1
+
+
+class RegionState:
+    """What a game changed in one region of a paged world.
+
+    Attributes:
+        visited (set[int]): The indexes of the visited locations of the region.
+        room_items (dict[int, ItemIndex]): The items of each location of the region whose items were looked
+            at or changed.
+        message_num (dict[int, int]): The current message number of each NPC of the region that has talked.
+        high_value (dict[int, bool]): If an NPC of the region still has its prize food, for NPCs that were
+            robbed.
+        dirty (bool): If anything changed since the region was last written to the spill file.
+    """
+    __slots__ = ("visited", "room_items", "message_num", "high_value", "dirty")
+
+    def __init__(self, visited: Iterable[int] = (), room_items: Optional[Dict[int, ItemIndex]] = None,
+                 message_num: Optional[Dict[int, int]] = None, high_value: Optional[Dict[int, bool]] = None):
+        """Initializes class RegionState with the values from the input parameters."""
+        self.visited = set(visited)
+        self.room_items = room_items or {}
+        self.message_num = message_num or {}
+        self.high_value = high_value or {}
+        self.dirty = False
+
+
+class RegionSet:
+    """The visited locations of a PagedWorldState, with the methods of the set it stands in for."""
+    __slots__ = ("_state",)
+
+    def __init__(self, state: 'PagedWorldState'):
+        """Initializes class RegionSet."""
+        self._state = state
+
+    def add(self, location: int) -> None:
+        """Records that the location at index location was visited."""
+        region = self._state.region_state("location", location)
+        if location not in region.visited:
+            region.visited.add(location)
+            region.dirty = True
+
+    def update(self, locations: Iterable[int]) -> None:
+        """Records that every location in locations was visited."""
+        for location in locations:
+            self.add(location)
+
+    def __contains__(self, location: object) -> bool:
+        """Returns True if the location at index location was visited."""
+        return location in self._state.region_state("location", location).visited
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterates over every visited location, including the ones written to the spill file."""
+        for region in self._state.all_region_states():
+            yield from region.visited
+
+    def __len__(self) -> int:
+        """Returns the number of visited locations."""
+        return sum(len(region.visited) for region in self._state.all_region_states())
+
+
+class RegionDict(MutableMapping):
+    """One of the dictionaries of a PagedWorldState, such as the message number of each NPC, that keeps its
+    entries in the region states."""
+    def __init__(self, state: 'PagedWorldState', kind: str, field: str):
+        """Initializes class RegionDict.
+
+        Params:
+            state (PagedWorldState): The state the entries are kept in.
+            kind (str): "location" or "npc", what the dictionary is keyed by.
+            field (str): The name of the dictionary in a RegionState."""
+        self._state = state
+        self._kind = kind
+        self._field = field
+
+    def __getitem__(self, index: int) -> Any:
+        """Returns the value for the location or NPC at index."""
+        return getattr(self._state.region_state(self._kind, index), self._field)[index]
+
+    def get(self, index: int, default: Any = None) -> Any:
+        """Returns the value for the location or NPC at index, or default if it has none."""
+        return getattr(self._state.region_state(self._kind, index), self._field).get(index, default)
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        """Sets the value for the location or NPC at index."""
+        region = self._state.region_state(self._kind, index)
+        getattr(region, self._field)[index] = value
+        region.dirty = True
+
+    def __delitem__(self, index: int) -> None:
+        """Removes the value for the location or NPC at index."""
+        region = self._state.region_state(self._kind, index)
+        del getattr(region, self._field)[index]
+        region.dirty = True
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterates over every key, including the ones written to the spill file."""
+        for region in self._state.all_region_states():
+            yield from getattr(region, self._field)
+
+    def __len__(self) -> int:
+        """Returns the number of keys."""
+        return sum(len(getattr(region, self._field)) for region in self._state.all_region_states())
+
+
+class PagedWorldState(world.WorldState):
+    """A WorldState that keeps what a game changed in regions, and writes the least recently used regions to
+    a spill file so only a few of them are in memory.
+
+    Session views aren't kept, since a region can be dropped while a view of it is still in use, and two
+    views of the same location or NPC are equal.
+
+    Attributes:
+        region_states (OrderedDict[int, RegionState]): The region states in memory, least recently used first.
+        max_regions (int): The number of region states kept in memory.
+        spilled (dict[int, tuple[int, int]]): The offset and length in the spill file of the last copy of
+            each region state that was written there.
+        spill_file (BinaryIO): The temporary file region states are written to, None until one is written.
+        write_backs (int): The number of region states written to the spill file.
+        The visited, room_items, message_num and high_value attributes of WorldState are RegionSet and
+        RegionDict objects.
+    """
+    def __init__(self, template: PagedWorldTemplate, max_regions: int = DEFAULT_STATE_REGIONS):
+        """Initializes class PagedWorldState with nothing changed yet."""
+        super().__init__(template)
+        self.visited = RegionSet(self)
+        self.room_items = RegionDict(self, "location", "room_items")
+        self.message_num = RegionDict(self, "npc", "message_num")
+        self.high_value = RegionDict(self, "npc", "high_value")
+        self.region_states = OrderedDict()
+        self.max_regions = max(1, max_regions)
+        self.spilled = {}
+        self.spill_file = None
+        self.write_backs = 0
+
+    def location(self, index: int) -> world.SessionLocation:
+        """Returns a SessionLocation for the location at index."""
+        return world.SessionLocation(self, index)
+
+    def npc(self, index: int) -> world.SessionNPC:
+        """Returns a SessionNPC for the NPC at index."""
+        return world.SessionNPC(self, index)
+
+    def simulates(self, location: int, here: int) -> bool:
+        """Returns True if the location at index location is in the same region as the location at index here,
+        the only region whose NPCs move on their own."""
+        return location // self.template.region_size == here // self.template.region_size
+
+    def items_at(self, index: int) -> ItemIndex:
+        """Returns the ItemIndex of the items at the location at index that belongs to this game only."""
+        region = self.region_state("location", index)
+        items = region.room_items.get(index)
+        if items is None:
+            items = region.room_items[index] = ItemIndex(self.template.starting_items(index))
+        return items
+
+    def touch(self, index: int) -> None:
+        """Records that the items, NPCs or exits of the location at index changed, and counts its region as
+        changed so it is written to the spill file when it is dropped. Reading a location's items doesn't."""
+        super().touch(index)
+        self.region_state("location", index).dirty = True
+
+    def region_state(self, kind: str, index: int) -> RegionState:
+        """Returns the state of the region that the location or NPC at index is in, reading it from the spill
+        file if it was written there, and writing the least recently used region states there while there
+        are too many in memory."""
+        number = self.template.region_number(kind, index)
+        region = self.region_states.get(number)
+        if region is not None:
+            self.region_states.move_to_end(number)
+            return region
+        region = self.region_states[number] = self._read_region(number)
+        while len(self.region_states) > self.max_regions:
+            evicted_number, evicted = self.region_states.popitem(last=False)
+            if evicted.dirty:
+                self._write_region(evicted_number, evicted)
+        return region
+
+    def all_region_states(self) -> Iterator[RegionState]:
+        """Yields the state of every region this game changed, reading the ones in the spill file without
+        keeping them in memory."""
+        yield from list(self.region_states.values())
+        for number in list(self.spilled):
+            if number not in self.region_states:
+                yield self._read_region(number)
+
+    def flush(self) -> None:
+        """Writes every changed region state in memory to the spill file."""
+        for number, region in self.region_states.items():
+            if region.dirty:
+                self._write_region(number, region)
+
+    def _encode_item(self, item: Item) -> Union[int, tuple]:
+        """Returns an item as the index of its StoredItem, or its values if it isn't one."""
+        if isinstance(item, world.StoredItem) and item._template is self.template:
+            return item.get_index()
+        return item.get_name(), item.description, item.get_calories(), item.get_weight(), tuple(item.get_tags())
+
+    def _decode_item(self, item: Union[int, tuple]) -> Item:
+        """Returns the item that _encode_item encoded."""
+        if isinstance(item, int):
+            return world.StoredItem(self.template, item)
+        return Item(*item)
+
+    def _write_region(self, number: int, region: RegionState) -> None:
+        """Writes a region state to the end of the spill file. Rooms whose items are the ones they started with
+        aren't written, since they can be made again from the template."""
+        room_items = {}
+        for location, items in region.room_items.items():
+            if list(items) != list(self.template.starting_items(location)):
+                room_items[location] = [self._encode_item(item) for item in items]
+        record = (sorted(region.visited), room_items, region.message_num, region.high_value)
+        region.dirty = False
+        if not any(record) and number not in self.spilled:
+            return
+        data = marshal.dumps(record)
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        old = self.spilled.get(number)
+        if old is not None and len(data) <= old[1]:
+            # The new copy fits where the old one was, so the file doesn't grow.
+            self.spill_file.seek(old[0])
+            self.spill_file.write(data)
+            self.spilled[number] = (old[0], len(data))
+        else:
+            end = self.spill_file.seek(0, os.SEEK_END)
+            if end > SPILL_COMPACT_SIZE and end > 2 * sum(length for offset, length in self.spilled.values()):
+                end = self._compact_spill()
+            self.spilled[number] = (end, len(data))
+            self.spill_file.write(data)
+        self.write_backs += 1
+
+    def _compact_spill(self) -> int:
+        """Copies the current copy of every region state into a new spill file, dropping the old copies, and
+        returns the end of the new file."""
+        compacted = tempfile.TemporaryFile()
+        for number, (offset, length) in self.spilled.items():
+            self.spill_file.seek(offset)
+            self.spilled[number] = (compacted.tell(), length)
+            compacted.write(self.spill_file.read(length))
+        self.spill_file.close()
+        self.spill_file = compacted
+        return compacted.tell()
+
+    def _read_region(self, number: int) -> RegionState:
+        """Returns the region state in the spill file, or an empty one if it was never written there."""
+        if number not in self.spilled:
+            return RegionState()
+        offset, length = self.spilled[number]
+        self.spill_file.seek(offset)
+        visited, room_items, message_num, high_value = marshal.loads(self.spill_file.read(length))
+        return RegionState(visited, {location: ItemIndex(self._decode_item(item) for item in items)
+                                     for location, items in room_items.items()}, message_num, high_value)
+
+
+def get_paged_template(path: str, memory_budget: Optional[int] = None) -> PagedWorldTemplate:
+    """Returns the shared PagedWorldTemplate of the paged world file at path, opening it if it wasn't yet.
+
+    Params:
+        path (str): The path of a paged world file.
+        memory_budget (int): The most bytes of regions to keep in memory. None keeps the budget the template
+            already has, or DEFAULT_MEMORY_BUDGET for a new one."""
+    key = os.path.abspath(path)
+    template = _paged_templates.get(key)
+    if template is None:
+        template = _paged_templates[key] = PagedWorldTemplate(key, memory_budget or DEFAULT_MEMORY_BUDGET)
+    elif memory_budget is not None:
+        template.memory_budget = memory_budget
+        template.trim()
+    return template
+
+
+def add_paged_template(template: PagedWorldTemplate) -> None:
+    """Makes template the shared template of its path in this process, so games started with that path play in it
+    even if there is no file there, such as a template that reads its regions from shared memory."""
+    _paged_templates[template.path] = template
+
+
+def clear_cache() -> None:
+    """Forgets every paged template this process opened, including the ones given to add_paged_template."""
+    _paged_templates.clear()
+
+
+def main():
+    """Function that parses the command line and compiles a JSON world file into a paged world file."""
+    parser = argparse.ArgumentParser(description="Compile a world file into regions that are loaded on demand.")
+    parser.add_argument("source", help="the JSON world file")
+    parser.add_argument("output", help=f"the paged world file to write, ending in {world.PAGED_SUFFIX}")
+    parser.add_argument("--region-size", type=int, default=DEFAULT_REGION_SIZE, help="locations per region")
+    args = parser.parse_args()
+    if not args.output.endswith(world.PAGED_SUFFIX):
+        parser.error(f"the output file must end in {world.PAGED_SUFFIX}")
+    summary = compile_pages(args.source, args.output, args.region_size)
+    print(", ".join(f"{key}: {value:,}" for key, value in summary.items()))
+
+
+if __name__ == "__main__":
+    main()
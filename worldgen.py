@@ -0,0 +1,282 @@
+"""Seeded procedural generator for world files of any size.
+
+Locations are laid out on a square grid and can have exits to their eight neighbors. Every location
+has an exit to its west neighbor, or to its north neighbor if it starts a row, which makes a spanning
+tree of the grid, so every location can reach every other one. Each other pair of neighbors is joined
+with a probability chosen so locations have the requested number of exits on average. Every exit
+also has one leading back the other way.
+
+Whether two neighbors are joined is decided by hashing the seed and the pair of locations, so the
+exits of a location can be worked out from either side without remembering anything about the
+locations already written. Items and NPCs are drawn from one seeded random generator in location
+order, and with --wanderers some of the NPCs wander around the world and get their prize food back
+a while after they were robbed. The world is written one location at a time, so memory use doesn't
+grow with its size, and calories_needed and elf_location are written after the locations, once the
+calories of every item are known.
+
+Usage:
+    python worldgen.py OUTPUT [--locations N] [--seed N] [--degree EXITS] [--items PER_LOCATION]
+                              [--npcs PER_LOCATION] [--wanderers FRACTION] [--calories N]"""
+
+import argparse
+import json
+import math
+import random
+import sys
+from typing import *
+
+DEFAULT_DEGREE = 3.0
+DEFAULT_ITEM_DENSITY = 1.5
+DEFAULT_NPC_DENSITY = 0.02
+DEFAULT_CALORIES = 500
+# The fewest and most ticks between the moves of an NPC that wanders, and before it gets its prize food back.
+WANDER_TICKS = (3, 30)
+RESTOCK_TICKS = (20, 200)
+# The most exits a location can have, one to each of its eight neighbors.
+MAX_DEGREE = 8
+MASK = (1 << 64) - 1
+
+# Each direction as a (name, row step, column step) tuple.
+NEIGHBORS = (("north", -1, 0), ("south", 1, 0), ("east", 0, 1), ("west", 0, -1),
+             ("northeast", -1, 1), ("northwest", -1, -1), ("southeast", 1, 1), ("southwest", 1, -1))
+
+ADJECTIVES = ("Quiet", "Misty", "Dusty", "Sunken", "Windy", "Golden", "Crooked", "Frozen", "Hidden", "Ancient",
+              "Muddy", "Silent", "Burning", "Mossy", "Shady", "Rocky")
+PLACES = ("Town", "Lake", "Forest", "Cave", "Meadow", "Bridge", "Tower", "Swamp", "Hill", "Ruins", "Market",
+          "Harbor", "Valley", "Chapel", "Farm", "Mine")
+DETAILS = ("The wind smells of rain.", "Footprints lead off in every direction.", "Something rustles nearby.",
+           "It is strangely quiet here.", "A faded sign points somewhere else.", "Crows watch you from above.",
+           "The ground is soft underfoot.", "Smoke rises in the distance.")
+
+# Each item as a (name, description, lowest calories, highest calories, lowest weight, highest weight,
+# tags) tuple.
+ITEMS = (("apple", "A crisp red apple.", 50, 120, 1, 1, ()),
+         ("loaf of bread", "A loaf of slightly stale bread.", 150, 300, 2, 3, ()),
+         ("wheel of cheese", "A small wheel of very strong cheese.", 200, 400, 4, 6, ()),
+         ("meat pie", "A pie that is probably meat.", 250, 500, 2, 3, ()),
+         ("mushrooms", "A handful of mushrooms. Probably safe.", 10, 40, 1, 1, ()),
+         ("fish", "A fish that was caught recently enough.", 80, 200, 2, 4, ()),
+         ("candle", "A half melted candle.", 0, 0, 1, 1, ()),
+         ("rope", "A coil of sturdy rope.", 0, 0, 4, 6, ()),
+         ("old boot", "A single boot, far too big for you.", 0, 0, 2, 3, ()),
+         ("rusty sword", "A sword that has seen better days.", 0, 0, 6, 9, ("armed",)))
+NPC_KINDS = ("goblin", "merchant", "hermit", "troll", "bard", "ghost", "miner", "witch")
+MESSAGES = ("Who goes there?", "Leave me alone.", "Have you seen the elf?", "The roads shift at night.",
+            "I'm hungry.", "Nice weather, isn't it?", "Don't go into the caves.", "I used to be an adventurer.",
+            "Buy something or get out.", "Shh, I'm listening.")
+ELF_MESSAGES = ("Gwt me somrthkng fof this hangoger dude", "Uah, H-hey thefe...", "Ugh, my head",
+                "I don't feel so good")
+
+
+def _mix(value: int) -> int:
+    """Returns the SplitMix64 hash of a 64 bit integer."""
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+def grid_width(num_locations: int) -> int:
+    """Returns the number of locations in each row of the grid a world of num_locations locations is laid
+    out on."""
+    return math.isqrt(num_locations - 1) + 1
+
+
+def extra_exit_chance(degree: float) -> float:
+    """Returns the chance that two neighbors that aren't joined by the spanning tree get exits to each other,
+    so that a location has degree exits on average."""
+    # The tree gives about one pair of exits per location and each location has about three more
+    # neighbors it could be joined to that aren't already counted by another location.
+    return min(1.0, max(0.0, (degree / 2 - 1) / 3))
+
+
+class WorldGenerator:
+    """Streams the locations of a generated world.
+
+    Attributes:
+        num_locations (int): The number of locations in the world.
+        seed (int): The seed every random choice is made from.
+        width (int): The number of locations in each row of the grid.
+        extra_chance (float): The chance two neighbors that aren't joined by the spanning tree are joined.
+        item_density (float): The average number of items in a location.
+        npc_density (float): The chance a location has an NPC.
+        wander_chance (float): The chance an NPC wanders.
+        elf_index (int): The index of the location where the elf is.
+        total_calories (int): The calories of every item in the locations generated so far.
+        num_exits (int): The number of exits generated so far.
+        num_items (int): The number of items generated so far, not counting prize food.
+        num_npcs (int): The number of NPCs generated so far, counting the elf.
+    """
+    def __init__(self, num_locations: int, seed: int = 0, degree: float = DEFAULT_DEGREE,
+                 item_density: float = DEFAULT_ITEM_DENSITY, npc_density: float = DEFAULT_NPC_DENSITY,
+                 wander_chance: float = 0.0):
+        """Initializes class WorldGenerator with the values from the input parameters.
+
+        Params:
+            num_locations (int): The number of locations in the world.
+            seed (int): The seed every random choice is made from.
+            degree (float): The average number of exits from a location, between 2 and 8.
+            item_density (float): The average number of items in a location.
+            npc_density (float): The chance a location has an NPC, between 0 and 1.
+            wander_chance (float): The chance an NPC wanders and gets its prize food back, between 0 and 1.
+
+        Raises:
+            ValueError: If there are no locations or a parameter is out of range."""
+        if num_locations < 1:
+            raise ValueError("A world needs at least one location")
+        if not 2 <= degree <= MAX_DEGREE:
+            raise ValueError(f"The exit degree must be between 2 and {MAX_DEGREE}")
+        if item_density < 0 or not 0 <= npc_density <= 1:
+            raise ValueError("The item density must be positive and the NPC density between 0 and 1")
+        if not 0 <= wander_chance <= 1:
+            raise ValueError("The chance an NPC wanders must be between 0 and 1")
+        self.num_locations = num_locations
+        self.seed = seed
+        self.width = grid_width(num_locations)
+        self.extra_chance = extra_exit_chance(degree)
+        self.item_density = item_density
+        self.npc_density = npc_density
+        self.wander_chance = wander_chance
+        self._rng = random.Random(seed)
+        self._seed_hash = _mix(seed & MASK)
+        self._threshold = int(self.extra_chance * MASK)
+        self.elf_index = self._rng.randrange(num_locations)
+        self.total_calories = 0
+        self.num_exits = 0
+        self.num_items = 0
+        self.num_npcs = 0
+
+    def location_id(self, index: int) -> str:
+        """Returns the id of the location at index in the world file."""
+        return f"r{index}"
+
+    def joined(self, first: int, second: int) -> bool:
+        """Returns if the neighboring locations at indexes first and second have exits to each other."""
+        low, high = min(first, second), max(first, second)
+        width = self.width
+        if (high == low + 1 and high % width != 0) or (high == low + width and high % width == 0):
+            return True
+        return _mix(self._seed_hash ^ (low << 32 | high)) < self._threshold
+
+    def exits_of(self, index: int) -> Dict[str, str]:
+        """Returns a dictionary from each direction of the location at index to the id of the location in that
+        direction."""
+        width = self.width
+        row, column = divmod(index, width)
+        exits = {}
+        for direction, row_step, column_step in NEIGHBORS:
+            neighbor_row, neighbor_column = row + row_step, column + column_step
+            if neighbor_row < 0 or not 0 <= neighbor_column < width:
+                continue
+            neighbor = neighbor_row * width + neighbor_column
+            if neighbor < self.num_locations and self.joined(index, neighbor):
+                exits[direction] = self.location_id(neighbor)
+        return exits
+
+    def item(self) -> dict:
+        """Returns a random item for the world file."""
+        name, description, low_calories, high_calories, low_weight, high_weight, tags = self._rng.choice(ITEMS)
+        item = {"name": name, "description": description, "calories": self._rng.randint(low_calories, high_calories),
+                "weight": self._rng.randint(low_weight, high_weight)}
+        if tags:
+            item["tags"] = list(tags)
+        return item
+
+    def npc(self, index: int) -> dict:
+        """Returns a random NPC for the location at index, with its own table of messages."""
+        kind = self._rng.choice(NPC_KINDS)
+        name = f"{kind.capitalize()} {index}"
+        npc = {"key": name.lower(), "name": name, "description": f"A {kind} who lives around here.",
+               "messages": self._rng.sample(MESSAGES, self._rng.randint(2, 5)),
+               "high_value": self._rng.random() < 0.25, "prize_food": self.item()}
+        # Only drawn for worlds with wanderers, so other worlds stay the same for the same seed.
+        if self.wander_chance and self._rng.random() < self.wander_chance:
+            npc["wander_every"] = self._rng.randint(*WANDER_TICKS)
+            npc["restock_after"] = self._rng.randint(*RESTOCK_TICKS)
+        return npc
+
+    def location(self, index: int) -> dict:
+        """Returns the location at index. Locations must be asked for in order, since they draw their items
+        and NPCs from the same random generator."""
+        rng = self._rng
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(PLACES)} {index}"
+        location = {"id": self.location_id(index), "name": name,
+                    "description": f"A place called {name}. {rng.choice(DETAILS)}", "exits": self.exits_of(index)}
+        # The number of items is geometric, which has item_density as its average.
+        items = []
+        more = self.item_density / (1 + self.item_density)
+        while rng.random() < more:
+            items.append(self.item())
+        npcs = [self.npc(index)] if rng.random() < self.npc_density else []
+        if index == self.elf_index:
+            npcs.append({"key": "elf", "name": "elf",
+                         "description": "A funny looking elf who could definitely use a bath.",
+                         "messages": list(ELF_MESSAGES), "high_value": False,
+                         "prize_food": {"name": "holder", "description": "This is a holder for the elf",
+                                        "calories": 10, "weight": 1}})
+        if items:
+            location["items"] = items
+        if npcs:
+            location["npcs"] = npcs
+        self.total_calories += sum(item["calories"] for item in items)
+        self.num_exits += len(location["exits"])
+        self.num_items += len(items)
+        self.num_npcs += len(npcs)
+        return location
+
+    def locations(self) -> Iterator[dict]:
+        """Yields every location of the world in order."""
+        for index in range(self.num_locations):
+            yield self.location(index)
+
+
+def write_world(out: TextIO, generator: WorldGenerator, calories_needed: int = DEFAULT_CALORIES) -> Dict[str, int]:
+    """Writes a generated world to out in the world file format, one location at a time.
+
+    Params:
+        out (TextIO): Where the world file is written.
+        generator (WorldGenerator): The generator of the world's locations.
+        calories_needed (int): The calories the elf needs, lowered to the calories of every item in the world
+            if there aren't that many, so the game can always be won.
+
+    Returns:
+        summary (dict[str, int]): The number of locations, exits, items and NPCs written, and the calories
+            the elf needs."""
+    out.write('{"locations": [\n')
+    for index, location in enumerate(generator.locations()):
+        if index:
+            out.write(",\n")
+        out.write(json.dumps(location))
+    calories_needed = min(calories_needed, generator.total_calories)
+    out.write(f'\n],\n"calories_needed": {calories_needed},\n'
+              f'"elf_location": {json.dumps(generator.location_id(generator.elf_index))}}}\n')
+    return {"locations": generator.num_locations, "exits": generator.num_exits, "items": generator.num_items,
+            "npcs": generator.num_npcs, "calories_needed": calories_needed}
+
+
+def main():
+    """Function that parses the command line and writes a generated world file."""
+    parser = argparse.ArgumentParser(description="Generate a world file of any size.")
+    parser.add_argument("output", help="the world file to write, - for standard output")
+    parser.add_argument("--locations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--degree", type=float, default=DEFAULT_DEGREE, help="average exits per location")
+    parser.add_argument("--items", type=float, default=DEFAULT_ITEM_DENSITY, help="average items per location")
+    parser.add_argument("--npcs", type=float, default=DEFAULT_NPC_DENSITY, help="chance a location has an NPC")
+    parser.add_argument("--wanderers", type=float, default=0.0, help="chance an NPC wanders")
+    parser.add_argument("--calories", type=int, default=DEFAULT_CALORIES, help="calories the elf needs")
+    args = parser.parse_args()
+    try:
+        generator = WorldGenerator(args.locations, args.seed, args.degree, args.items, args.npcs, args.wanderers)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.output == "-":
+        summary = write_world(sys.stdout, generator, args.calories)
+    else:
+        with open(args.output, "w") as file:
+            summary = write_world(file, generator, args.calories)
+    print(", ".join(f"{key}: {value:,}" for key, value in summary.items()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()